@@ -2,22 +2,30 @@ import streamlit as st
 import pandas as pd
 from PIL import Image
 import requests
-import asyncio
-import nest_asyncio
+import time
 import os
 
 from audio_recorder_streamlit import audio_recorder
 import tempfile
-from openai import OpenAI
+from openai_clients import get_client
 
-from insights_utils import display_insights, extract_research_insights_from_docs, generate_insights_with_gpt4o
-from visualization_utils import display_publication_distribution
+from insights_utils import display_insights, generate_tab_insights, parse_insight_bullets, render_insights_html
+from visualization_utils import display_publication_distribution, CHART_AGGREGATES
 from visualization_utils import render_harmful_ingredients_visualization, render_research_trends_visualization
 from visualization_utils import render_bias_visualization, render_publication_level_visualization
 from visualization_utils import display_sankey_dropdown, display_main_category_sankey
 from trending_research import display_trending_research
 
 from RAG_architecture import initialize_rag_system, process_question, get_relevant_documents
+from corpus_store import CorpusSnapshot
+from corpus_watcher import CorpusWatcher, invalidate_insights, record_insight_sources
+from filter_engine import FilterEngine, FilterPipeline, canonical_filter_state, criteria_from_state
+from filter_query import FilterQueryError, QueryPlan
+from result_cache import FilterResult, FilterResultCache, MatchingDocs
+from filter_presets import PresetMaterializer, PresetStore
+from llm_scheduler import LLMScheduler
+from async_runtime import run_streaming
+from country_index import country_name
 
 # Import all prompts and categories
 from prompts_and_categories import (
@@ -43,12 +51,13 @@ from prompts_and_categories import (
     research_trends_categories,
     contradictions_categories,
     bias_categories,
-    publication_categories
+    publication_categories,
+    
+    # Insight tab configurations
+    INSIGHT_TABS
 )
 
 
-nest_asyncio.apply()
-
 # Page config
 st.set_page_config(
     page_title="IB GenAI R&D Tool",
@@ -61,224 +70,180 @@ tab_names = ["Overview", "Q&A Bot", "Adverse Events", "Perceived Benefits", "Hea
              "Contradictions & Conflicts", "Bias in Research", "Publication Level"]              
       
           
-# Load the Excel file
-@st.cache_data
-def load_data():
+# Load the research metadata once per process (compiled snapshot, falling back to the Excel file when stale).
+# cache_resource hands every session the same watcher, which serves one read-only CorpusSnapshot and
+# hot-reloads it when the workbook changes on disk.
+@st.cache_resource
+def load_corpus_watcher():
     try:
-        df = pd.read_excel('E_Cigarette_Research_Metadata_Consolidated.xlsx')
-        return df
+        return CorpusWatcher('E_Cigarette_Research_Metadata_Consolidated.xlsx')
     except Exception as e:
         st.error(f"Error loading data: {e}")
-        return pd.DataFrame()
+        return None
+
+corpus_watcher = load_corpus_watcher()
+
+def load_corpus():
+    if corpus_watcher is None:
+        return CorpusSnapshot(pd.DataFrame(columns=["Main Category", "Category", "SubCategory"]))
+    return corpus_watcher.refresh()
+
+# Generation read before the snapshot: a reload swapped in between only makes the next rerun
+# invalidate more insights than needed, never fewer
+corpus_generation = corpus_watcher.generation if corpus_watcher is not None else 0
+corpus = load_corpus()
+filter_engine = FilterEngine.for_corpus(corpus)
+
+# Option of the field + term filter that searches every field
+ANY_FIELD = "Any field"
+
+
+# On reload, keep the cached filter results whose documents did not change
+def carry_over_filter_results(cache, diff, old_corpus, new_corpus):
+    engine = FilterEngine.for_corpus(new_corpus)
+
+    def still_valid(filter_state, result):
+        if diff.affected_docs.intersection(result.docs):
+            return False
+        # Added documents or changed facets of other documents can change the match
+        docs = engine.docs_for(engine.match(**criteria_from_state(filter_state)))
+        return tuple(docs) == result.docs
+
+    kept = cache.carry_over(old_corpus.content_hash, new_corpus.content_hash, still_valid)
+    print(f"Filter cache: carried over {kept} results after corpus reload")
+
+
+# Process-wide LRU of filter state -> matching documents and chart aggregates, shared by all sessions
+@st.cache_resource
+def load_filter_cache():
+    cache = FilterResultCache()
+    if corpus_watcher is not None:
+        corpus_watcher.subscribe(lambda diff, old, new: carry_over_filter_results(cache, diff, old, new))
+    return cache
+
+filter_cache = load_filter_cache()
+
+# Default OpenAI API key from Streamlit secrets, falling back to the environment
+def get_default_api_key():
+    try:
+        if hasattr(st, 'secrets') and 'OPENAI_API_KEY' in st.secrets:
+            return st.secrets["OPENAI_API_KEY"]
+    except Exception:
+        pass
+    return os.environ.get("OPENAI_API_KEY", "")
+
+# Saved filter presets, materialized (documents, chart aggregates, insights) by a background thread
+@st.cache_resource
+def load_preset_materializer():
+    materializer = PresetMaterializer(PresetStore(), corpus, api_key=get_default_api_key(),
+                                      tabs=INSIGHT_TABS, aggregates=CHART_AGGREGATES)
+    if corpus_watcher is not None:
+        corpus_watcher.subscribe(materializer.on_reload)
+    materializer.start()
+    return materializer
 
-df = load_data()
+preset_materializer = load_preset_materializer()
+preset_store = preset_materializer.store
 
-# Extract years from the dataframe - find rows where Category is 'publication_year'
+# Publication year bounds, precomputed in the year range index
 def get_publication_years():
-    if 'Category' in df.columns and 'publication_year' in df['Category'].values:
-        # Get all rows where Category is 'publication_year'
-        year_rows = df[df['Category'] == 'publication_year']
-        # Extract years from all document columns (starting from column index 3)
-        years = []
-        doc_columns = df.columns[3:]
-        for doc_col in doc_columns:
-            year_values = year_rows[doc_col].dropna().astype(str)
-            for year in year_values:
-                try:
-                    years.append(int(float(year)))
-                except (ValueError, TypeError):
-                    continue
-        return years
+    years = filter_engine.range_indexes['year']
+    if corpus.has_category('publication_year') and years.count:
+        return [years.min, years.max]
     return [2011, 2025]  # Default range if data not found
 
 # Get sample sizes
 def get_sample_sizes():
-    if 'Category' in df.columns and 'SubCategory' in df.columns:
-        # Get all rows where SubCategory is 'total_size'
-        size_rows = df[(df['SubCategory'] == 'total_size')]
-        # Extract sizes from all document columns
-        sizes = []
-        doc_columns = df.columns[3:]
-        for doc_col in doc_columns:
-            size_values = size_rows[doc_col].dropna().astype(str)
-            for size in size_values:
-                try:
-                    sizes.append(int(float(size)))
-                except (ValueError, TypeError):
-                    continue
-        if sizes:
-            min_size = min(sizes)
+    if 'Category' in corpus.labels.columns and 'SubCategory' in corpus.labels.columns:
+        # Bounds precomputed in the sample size range index
+        sizes = filter_engine.range_indexes['sample_size']
+        if sizes.count:
             # Set max_size to 10000 for the slider, but keep track of the actual max
-            actual_max = max(sizes)
-            return [min_size, min(10000, actual_max), actual_max]
+            return [sizes.min, min(10000, sizes.max), sizes.max]
     return [50, 10000, 15000]  # Default range if data not found
 
-# Extract unique values for a given Category or SubCategory with their occurrence counts
-def get_unique_values_filtered(category_name, subcategory_name=None, matching_docs=None):
-    """
-    Get unique values with occurrence counts based on filtered documents
-    """
-    value_counts = {}
-    
-    # If no matching docs provided, return just "All"
-    if not matching_docs:
-        return ["All"]
-    
-    # Handle different conditions based on what we're looking for
-    if subcategory_name:
-        # Looking for values in rows where SubCategory equals subcategory_name
-        if 'SubCategory' in df.columns and subcategory_name in df['SubCategory'].values:
-            rows = df[df['SubCategory'] == subcategory_name]
-            
-            # Extract values from matching document columns only
-            for doc_col in matching_docs:
-                col_values = rows[doc_col].dropna().astype(str)
-                for value in col_values:
-                    if value and value != "nan":
-                        if value in value_counts:
-                            value_counts[value] += 1
-                        else:
-                            value_counts[value] = 1
-    else:
-        # Looking for values in rows where Category equals category_name
-        if 'Category' in df.columns and category_name in df['Category'].values:
-            rows = df[df['Category'] == category_name]
-            
-            # Extract values from matching document columns only
-            for doc_col in matching_docs:
-                col_values = rows[doc_col].dropna().astype(str)
-                for value in col_values:
-                    if value and value != "nan":
-                        if value in value_counts:
-                            value_counts[value] += 1
-                        else:
-                            value_counts[value] = 1
-    
-    # Sort values by their occurrence count in decreasing order
-    sorted_values = sorted(value_counts.items(), key=lambda x: x[1], reverse=True)
-    
-    # Format values with their counts in curly braces
-    formatted_values = [f"{value} {{{count}}}" for value, count in sorted_values]
-    
-    # Add "All" as the first option
-    return ["All"] + formatted_values
+# Field + term filter from the sidebar, as FilterEngine (field path, term) pairs
+def get_field_terms():
+    term = st.session_state.get('term_filter_term', '').strip()
+    if not term:
+        return None
+    field = st.session_state.get('term_filter_field', ANY_FIELD)
+    return [(None if field == ANY_FIELD else field, term)]
+
+# Boolean filter query from the sidebar (None when empty or invalid); compiled against the corpus so
+# unknown fields are rejected here too, not only syntax errors (the sidebar shows the error)
+def get_filter_query():
+    query = st.session_state.get('filter_query', '').strip()
+    if not query:
+        return None
+    try:
+        return QueryPlan(filter_engine, query).text
+    except FilterQueryError:
+        return None
+
+# Translate the sidebar filter state into FilterEngine criteria
+def get_filter_criteria(year_range, sample_size_range=None, publication_type=None, 
+                        funding_source=None, study_design=None, country=None, field_terms=None, query=None):
+    def selected_values(selected):
+        # "All" (or nothing) selected means the facet does not filter
+        if not selected or "All" in selected:
+            return None
+        return list(selected)
+    
+    return {
+        'year_range': year_range,
+        'sample_size_range': sample_size_range or None,
+        'publication_type': selected_values(publication_type),
+        'funding_type': selected_values(funding_source),
+        'study_design': selected_values(study_design),
+        'country': selected_values(country),
+        'field_terms': field_terms or None,
+        'query': query or None
+    }
 
 
 # Count documents that match the current filter criteria
 def count_matching_documents(year_range, sample_size_range=None, publication_type=None, 
-                            funding_source=None, study_design=None):
-    # Start with all document columns
-    doc_columns = df.columns[3:]
-    matching_docs = []
-    
-    for doc_col in doc_columns:
-        matches_all_criteria = True
-        
-        # Check year criteria
-        if 'publication_year' in df['Category'].values:
-            year_row = df[df['Category'] == 'publication_year']
-            year_value = year_row[doc_col].iloc[0] if not year_row.empty else None
-            
-            if year_value:
-                try:
-                    year = int(float(year_value))
-                    if year < year_range[0] or year > year_range[1]:
-                        matches_all_criteria = False
-                except (ValueError, TypeError):
-                    matches_all_criteria = False
-        
-        # Check sample size criteria if enabled
-        if sample_size_range and 'total_size' in df['SubCategory'].values:
-            size_row = df[df['SubCategory'] == 'total_size']
-            size_value = size_row[doc_col].iloc[0] if not size_row.empty else None
-            
-            if size_value:
-                try:
-                    size = int(float(size_value))
-                    if size < sample_size_range[0] or size > sample_size_range[1]:
-                        matches_all_criteria = False
-                except (ValueError, TypeError):
-                    matches_all_criteria = False
-        
-        
-        # Check publication type criteria - handle values with counts in curly braces
-        if publication_type and "All" not in publication_type and 'publication_type' in df['Category'].values:
-            pub_row = df[df['Category'] == 'publication_type']
-            pub_value = pub_row[doc_col].iloc[0] if not pub_row.empty else None
-            
-            if pub_value:
-                # Extract just the value part before any curly braces for comparison
-                pub_matches = False
-                for selected_type in publication_type:
-                    # Extract the base value without the count in curly braces
-                    base_type = selected_type.split(' {')[0] if ' {' in selected_type else selected_type
-                    if str(pub_value) == base_type:
-                        pub_matches = True
-                        break
-                
-                if not pub_matches:
-                    matches_all_criteria = False
-        
-        # Check funding source criteria - handle values with counts in curly braces
-        if funding_source and "All" not in funding_source and 'type' in df['SubCategory'].values:
-            fund_row = df[df['SubCategory'] == 'type']
-            fund_value = fund_row[doc_col].iloc[0] if not fund_row.empty else None
-            
-            if fund_value:
-                # Extract just the value part before any curly braces for comparison
-                fund_matches = False
-                for selected_source in funding_source:
-                    # Extract the base value without the count in curly braces
-                    base_source = selected_source.split(' {')[0] if ' {' in selected_source else selected_source
-                    if str(fund_value) == base_source:
-                        fund_matches = True
-                        break
-                
-                if not fund_matches:
-                    matches_all_criteria = False
-        
-        # Check study design criteria - handle values with counts in curly braces
-        if study_design and "All" not in study_design and 'primary_type' in df['SubCategory'].values:
-            design_row = df[df['SubCategory'] == 'primary_type']
-            design_value = design_row[doc_col].iloc[0] if not design_row.empty else None
-            
-            if design_value:
-                # Extract just the value part before any curly braces for comparison
-                design_matches = False
-                for selected_design in study_design:
-                    # Extract the base value without the count in curly braces
-                    base_design = selected_design.split(' {')[0] if ' {' in selected_design else selected_design
-                    if str(design_value) == base_design:
-                        design_matches = True
-                        break
-                
-                if not design_matches:
-                    matches_all_criteria = False
-        
-        # If document matched all criteria, add to the list
-        if matches_all_criteria:
-            matching_docs.append(doc_col)
+                            funding_source=None, study_design=None, country=None, field_terms=None, query=None):
+    criteria = get_filter_criteria(year_range, sample_size_range, publication_type, funding_source, study_design,
+                                   country, field_terms, query)
+    
+    # Sessions with identical filters share one cached result (and its aggregates)
+    key = (corpus.content_hash, canonical_filter_state(criteria))
+    result = filter_cache.get_or_compute(key, lambda: st.session_state.filter_pipeline.matching_docs(**criteria))
+    return MatchingDocs(result.docs, result)
+
+
+# Multiselect over plain facet values, labelled with their faceted counts
+def facet_multiselect(label, state_key, facet_counts, on_change, format_value=str):
+    count_by_value = {value: count for value, count in facet_counts}
+    
+    # Keep selections that are still available, otherwise reset to "All"
+    valid_values = [value for value in st.session_state[state_key] if value == "All" or value in count_by_value]
+    st.session_state[state_key] = valid_values or ["All"]
     
-    return matching_docs
+    st.multiselect(
+        label, 
+        ["All"] + list(count_by_value), 
+        key=f"{state_key}_select",
+        default=st.session_state[state_key],
+        on_change=on_change,
+        format_func=lambda value: value if value == "All" else f"{format_value(value)} {{{count_by_value[value]}}}"
+    )
 
 # Get filtered data for specific fields
 def get_filtered_data(field_category, field_subcategory=None, matching_docs=None):
     if not matching_docs:
         return pd.DataFrame()
         
-    if field_subcategory:
-        rows = df[(df['Category'] == field_category) & (df['SubCategory'] == field_subcategory)]
-    else:
-        rows = df[df['Category'] == field_category]
-    
-    if rows.empty:
+    if not corpus.field_index.positions(field_category, field_subcategory or None):
         return pd.DataFrame()
     
     # Extract data from matching document columns
     result_data = {}
     for doc_col in matching_docs:
         doc_name = doc_col  # Could use doc_col as the document name or extract a more readable name
-        value = rows[doc_col].iloc[0] if not rows.empty else None
+        value = corpus.value(doc_col, field_category, field_subcategory or None)
         if value and not pd.isna(value):
             result_data[doc_name] = value
     
@@ -288,7 +253,7 @@ def get_filtered_data(field_category, field_subcategory=None, matching_docs=None
 def transcribe_audio(audio_file_path, api_key):
     """Transcribe audio file using OpenAI Whisper API."""
     try:
-        client = OpenAI(api_key=api_key)
+        client = get_client(api_key)
         with open(audio_file_path, "rb") as audio_file:
             transcript = client.audio.transcriptions.create(
                 model="whisper-1",
@@ -311,13 +276,24 @@ except:
 # Title
 st.title("IB NGP Harm Reduction Insights")
 
+# After a corpus reload, drop only the generated insights whose source documents changed
+if corpus_watcher is not None:
+    if st.session_state.get('corpus_generation', corpus_generation) != corpus_generation:
+        invalidate_insights(st.session_state, corpus_watcher.affected_docs_since(st.session_state.corpus_generation))
+    st.session_state.corpus_generation = corpus_generation
+
 # Initialize session state for filters if they don't exist
+# Per-session memo of the filter stages, so reruns from unrelated widgets recompute nothing
+if 'filter_pipeline' not in st.session_state or st.session_state.filter_pipeline.engine is not filter_engine:
+    st.session_state.filter_pipeline = FilterPipeline(filter_engine)
 if 'publication_type' not in st.session_state:
     st.session_state.publication_type = ["All"]
 if 'funding_source' not in st.session_state:
     st.session_state.funding_source = ["All"]
 if 'study_design' not in st.session_state:
     st.session_state.study_design = ["All"]
+if 'country' not in st.session_state:
+    st.session_state.country = ["All"]
 if 'year_range' not in st.session_state:
     # Get publication years
     years = get_publication_years()
@@ -326,6 +302,12 @@ if 'year_range' not in st.session_state:
     else:
         min_year, max_year = 2011, 2025
     st.session_state.year_range = (min_year, max_year)
+if 'term_filter_field' not in st.session_state:
+    st.session_state.term_filter_field = ANY_FIELD
+if 'term_filter_term' not in st.session_state:
+    st.session_state.term_filter_term = ""
+if 'filter_query' not in st.session_state:
+    st.session_state.filter_query = ""
 if 'enable_sample_size' not in st.session_state:
     st.session_state.enable_sample_size = False
 if 'sample_size_filter' not in st.session_state:
@@ -343,135 +325,90 @@ if 'last_audio_bytes' not in st.session_state:
     st.session_state.last_audio_bytes = None
     
 
-async def process_all_tabs_async(matching_docs):
+# Minimum seconds between two re-renders of an insights box or answer while it streams in
+STREAM_RENDER_SECONDS = 0.1
+
+
+def process_all_tabs(matching_docs, status):
     """
-    Process all tabs in parallel using async OpenAI calls
+    Process all tabs concurrently using async OpenAI calls
+    
+    Requests run on the shared background event loop, paced by one
+    LLMScheduler (concurrency cap, request and token rate limits, retries with
+    backoff). Completions are streamed: the text of every tab and its final
+    result are handed back to this script thread (Streamlit calls only render
+    from here) and drawn into the insights boxes already rendered in this run,
+    so bullets appear as they are generated. Each tab's result and timing
+    (time to first token, total time) are saved as they land; a failing tab
+    is reported without cancelling the others.
+    
+    Args:
+        matching_docs (list): Documents to generate the insights for
+        status: Sidebar container for the progress bar and errors
     """
-    # Define all tab configurations
-    tab_configs = [
-        # Tab 0 - Overview
-        {
-            "topic_name": "Overall",
-            "categories": categories_to_extract,
-            "prompt": overview_prompt,
-            "insights_key": "generated_overall_insights",
-            "index": 0
-        },
-        # Tab 1 - Adverse Events
-        {
-            "topic_name": "Adverse Events",
-            "categories": adverse_events_categories,
-            "prompt": adverse_events_prompt,
-            "insights_key": "generated_adverse_events_insights",
-            "index": 2
-        },
-        # Tab 2 - Perceived Benefits
-        {
-            "topic_name": "Perceived Benefits",
-            "categories": perceived_benefits_categories,
-            "prompt": perceived_benefits_prompt,
-            "insights_key": "generated_perceived_benefits_insights",
-            "index": 3
-        },
-        # Tab 3 Health Outcomes subtabs
-        {
-            "topic_name": "Oral Health",
-            "categories": oral_health_categories,
-            "prompt": oral_health_prompt,
-            "insights_key": "generated_oral_health_insights",
-            "index": 4,
-            "subtab": "oral"
-        },
-        {
-            "topic_name": "Respiratory Health",
-            "categories": respiratory_categories,
-            "prompt": respiratory_prompt,
-            "insights_key": "generated_respiratory_health_insights",
-            "index": 4,
-            "subtab": "respiratory"
-        },
-        {
-            "topic_name": "Cardiovascular Health",
-            "categories": cardiovascular_categories,
-            "prompt": cardiovascular_prompt,
-            "insights_key": "generated_cardiovascular_health_insights",
-            "index": 4,
-            "subtab": "cardiovascular"
-        },
-        # Tab 4 - Research Trends
-        {
-            "topic_name": "Research Trends",
-            "categories": research_trends_categories,
-            "prompt": research_trends_prompt,
-            "insights_key": "generated_research_trends_insights",
-            "index": 5
-        },
-        # Tab 5 - Contradictions
-        {
-            "topic_name": "Contradictions and Conflicts",
-            "categories": contradictions_categories,
-            "prompt": contradictions_prompt,
-            "insights_key": "generated_contradictions_and_conflicts_insights",
-            "index": 6
-        },
-        # Tab 6 - Bias
-        {
-            "topic_name": "Research Bias",
-            "categories": bias_categories,
-            "prompt": bias_prompt,
-            "insights_key": "generated_research_bias_insights",
-            "index": 7
-        },
-        # Tab 7 - Publication Level
-        {
-            "topic_name": "Publication Metrics",
-            "categories": publication_categories,
-            "prompt": publication_prompt,
-            "insights_key": "generated_publication_metrics_insights",
-            "index": 8
-        }
-    ]
-    
-    async def process_single_tab(config):
-        """Process insights for a single tab/subtab"""
-        topic_name = config["topic_name"]
-        categories = config["categories"]
-        prompt = config["prompt"]
-        insights_key = config["insights_key"]
-        token_usage_key = f"{insights_key}_token_usage"
-        
-        try:
-            # Extract research insights
-            research_insights = extract_research_insights_from_docs(df, matching_docs, categories)
-            
-            if not research_insights:
-                insights = [f"No {topic_name.lower()} insights found in the filtered documents."]
-                token_usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
-            else:
-                # Use async function to generate insights
-                insights, token_usage = await generate_insights_with_gpt4o(
-                    research_insights, 
-                    st.session_state.openai_api_key, 
-                    topic_name, 
-                    prompt
-                )
-            
-            # Save results to session state
+    scheduler = LLMScheduler()
+    configs = {config["insights_key"]: config for config in INSIGHT_TABS}
+    placeholders = st.session_state.get("insight_placeholders", {})
+    progress = status.progress(0.0, text="Generating insights...")
+    finished = []
+    streamed = {}
+    first_token = {}
+    rendered = {}
+    start = time.perf_counter()
+    
+    def on_tab_delta(insights_key, delta):
+        if delta is None:
+            # The request (re)started: drop the text of a failed attempt
+            streamed[insights_key] = []
+            return
+        now = time.perf_counter()
+        first_token.setdefault(insights_key, now - start)
+        streamed[insights_key].append(delta)
+        if insights_key in placeholders and now - rendered.get(insights_key, 0) >= STREAM_RENDER_SECONDS:
+            placeholder, height = placeholders[insights_key]
+            text = "".join(streamed[insights_key])
+            placeholder.markdown(render_insights_html(parse_insight_bullets(text), height=height),
+                                 unsafe_allow_html=True)
+            rendered[insights_key] = now
+    
+    def on_tab_done(insights_key, result):
+        config = configs[insights_key]
+        if result.error is not None:
+            status.error(f"Error processing {config['topic_name']}: {str(result.error)}")
+        else:
+            insights, token_usage = result.value
+            timing = {"ttft_seconds": first_token.get(insights_key), "seconds": result.seconds}
+            # Save results to session state, with the documents they depend on
             st.session_state[insights_key] = insights
-            st.session_state[token_usage_key] = token_usage
-            
-            # Trigger UI update by forcing a rerun
-            st.rerun()
-            
-        except Exception as e:
-            st.error(f"Error processing {topic_name}: {str(e)}")
-            st.rerun()
-    
-    # Create tasks for all tabs
-    tasks = [process_single_tab(config) for config in tab_configs]
-    
-    # Process all tabs concurrently
-    await asyncio.gather(*tasks, return_exceptions=True)
+            st.session_state[f"{insights_key}_token_usage"] = token_usage
+            st.session_state[f"{insights_key}_timing"] = timing
+            record_insight_sources(st.session_state, insights_key, matching_docs, cohort=True)
+            if insights_key in placeholders:
+                placeholder, height = placeholders[insights_key]
+                placeholder.markdown(render_insights_html(insights, token_usage, timing, height),
+                                     unsafe_allow_html=True)
+        
+        finished.append(insights_key)
+        progress.progress(len(finished) / len(configs),
+                          text=f"{config['topic_name']} ready ({len(finished)}/{len(configs)})")
+    
+    def on_update(insights_key, delta, result=None):
+        if result is None:
+            on_tab_delta(insights_key, delta)
+        else:
+            on_tab_done(insights_key, result)
+    
+    run_streaming(
+        lambda emit: scheduler.gather(
+            {insights_key: generate_tab_insights(
+                corpus, matching_docs, config, st.session_state.openai_api_key, scheduler,
+                on_delta=lambda delta, insights_key=insights_key: emit(insights_key, delta))
+             for insights_key, config in configs.items()},
+            on_result=lambda insights_key, result: emit(insights_key, None, result)
+        ),
+        on_update
+    )
+    progress.empty()
     
 
 # Define callback functions for each multiselect to handle the "All" selection logic
@@ -502,6 +439,15 @@ def on_study_design_change():
     else:
         st.session_state.study_design = st.session_state.study_design_select
 
+def on_country_change():
+    if "All" in st.session_state.country_select and len(st.session_state.country_select) > 1:
+        if "All" not in st.session_state.country:
+            st.session_state.country = ["All"]
+        else:
+            st.session_state.country = [opt for opt in st.session_state.country_select if opt != "All"]
+    else:
+        st.session_state.country = st.session_state.country_select
+
 def on_year_range_change():
     st.session_state.year_range = st.session_state.year_range_slider
     
@@ -519,6 +465,74 @@ def on_sample_size_change():
 def on_enable_sample_size_change():
     st.session_state.enable_sample_size = st.session_state.enable_sample_size_checkbox
 
+def on_sample_size_log_change():
+    st.session_state.sample_size_filter = st.session_state.sample_size_log_slider
+
+# Current sidebar filter state as FilterEngine criteria
+def get_current_criteria():
+    return get_filter_criteria(
+        year_range=st.session_state.year_range,
+        sample_size_range=st.session_state.sample_size_filter if st.session_state.enable_sample_size else None,
+        publication_type=st.session_state.publication_type,
+        funding_source=st.session_state.funding_source,
+        study_design=st.session_state.study_design,
+        country=st.session_state.country,
+        field_terms=get_field_terms(),
+        query=get_filter_query()
+    )
+
+# Load a preset: set the sidebar filters to its criteria and serve its materialized results
+def on_filter_preset_change():
+    name = st.session_state.filter_preset_select
+    criteria = preset_store.presets().get(name)
+    if criteria is None:
+        return
+    
+    # Clamp to the years of the current corpus, which the slider cannot go beyond
+    years = get_publication_years()
+    low, high = criteria.get('year_range') or (min(years), max(years))
+    st.session_state.year_range = (max(low, min(years)), min(high, max(years)))
+    st.session_state.enable_sample_size = criteria.get('sample_size_range') is not None
+    if st.session_state.enable_sample_size:
+        st.session_state.sample_size_filter = tuple(criteria['sample_size_range'])
+    st.session_state.publication_type = criteria.get('publication_type') or ["All"]
+    st.session_state.funding_source = criteria.get('funding_type') or ["All"]
+    st.session_state.study_design = criteria.get('study_design') or ["All"]
+    st.session_state.country = criteria.get('country') or ["All"]
+    field, term = (criteria.get('field_terms') or [(None, "")])[0]
+    st.session_state.term_filter_field = field or ANY_FIELD
+    st.session_state.term_filter_term = term
+    st.session_state.filter_query = criteria.get('query') or ""
+    # Let the widgets pick up the new values instead of their previous ones
+    for key in ("year_range_slider", "publication_type_select", "funding_source_select", "study_design_select",
+                "country_select", "enable_sample_size_checkbox", "sample_size_slider", "sample_size_log_slider"):
+        st.session_state.pop(key, None)
+    
+    results = preset_store.results(name, corpus.content_hash)
+    if results is None:
+        return
+    key = (corpus.content_hash, canonical_filter_state(get_current_criteria()))
+    filter_cache.put(key, FilterResult(results['docs'], results['aggregates']))
+    for insights_key, entry in results['insights'].items():
+        st.session_state[insights_key] = entry['insights']
+        st.session_state[f"{insights_key}_token_usage"] = entry['token_usage']
+        st.session_state.pop(f"{insights_key}_timing", None)
+        record_insight_sources(st.session_state, insights_key, results['docs'], cohort=True)
+
+def on_save_preset():
+    name = st.session_state.preset_name_input.strip()
+    if name:
+        preset_store.save(name, get_current_criteria())
+        preset_materializer.wake()
+        st.session_state.filter_preset_select = name
+        st.session_state.preset_name_input = ""
+
+def on_delete_preset():
+    name = st.session_state.get('filter_preset_select')
+    if name in preset_store.presets():
+        preset_store.delete(name)
+        st.session_state.pop('filter_preset_select', None)
+
 
 # Add a sidebar with filters
 with st.sidebar:
@@ -541,17 +555,7 @@ with st.sidebar:
         st.session_state.previous_api_option = ""
     
     # Check if default API key exists in Streamlit secrets or environment
-    default_api_key = ""
-    try:
-        # Try to get from Streamlit secrets first
-        if hasattr(st, 'secrets') and 'OPENAI_API_KEY' in st.secrets:
-            default_api_key = st.secrets["OPENAI_API_KEY"]
-        # Fallback to environment variable
-        elif 'OPENAI_API_KEY' in os.environ:
-            import os
-            default_api_key = os.environ.get("OPENAI_API_KEY", "")
-    except Exception:
-        default_api_key = ""
+    default_api_key = get_default_api_key()
     
     # Add radio button to choose between default and custom API key
     api_option = st.radio(
@@ -639,26 +643,44 @@ with st.sidebar:
     # Generate Insights button in sidebar with the custom styling applied
     generate_button = st.button("Generate Insights") and st.session_state.openai_api_key
     
-    # Display progress bar with custom styling
+    # Progress bar and errors of the insights generation
+    insights_status = st.container()
+    insights_request = None
     if generate_button:
-        # Show spinner while processing
-        with st.spinner("Generating Insights..."):
-            
-            # Calculate matching documents first
-            matching_docs = count_matching_documents(
-                year_range=st.session_state.year_range,
-                sample_size_range=st.session_state.sample_size_filter if st.session_state.enable_sample_size else None,
-                publication_type=st.session_state.publication_type,
-                funding_source=st.session_state.funding_source,
-                study_design=st.session_state.study_design
-            )
-            
-            # Run async processing - pass matching_docs
-            asyncio.run(process_all_tabs_async(matching_docs))
+        # Calculate matching documents first; the insights are generated once the tab boxes
+        # are rendered (end of the script), so they can be streamed into them
+        insights_request = count_matching_documents(
+            year_range=st.session_state.year_range,
+            sample_size_range=st.session_state.sample_size_filter if st.session_state.enable_sample_size else None,
+            publication_type=st.session_state.publication_type,
+            funding_source=st.session_state.funding_source,
+            study_design=st.session_state.study_design,
+            country=st.session_state.country,
+            field_terms=get_field_terms(),
+            query=get_filter_query()
+        )
     
     
     st.subheader("Filters")
     
+    # Saved filter presets; materialized ones load their documents, charts and insights instantly
+    presets = preset_store.presets()
+    if presets:
+        st.selectbox("Filter Presets", list(presets), index=None, placeholder="Load a saved preset",
+                     key="filter_preset_select", on_change=on_filter_preset_change)
+    with st.expander("Save or delete presets"):
+        st.text_input("Preset Name", key="preset_name_input")
+        col1, col2 = st.columns(2)
+        col1.button("Save current filters", on_click=on_save_preset)
+        col2.button("Delete selected", on_click=on_delete_preset,
+                    disabled=st.session_state.get('filter_preset_select') not in presets)
+    selected_preset = st.session_state.get('filter_preset_select')
+    if selected_preset in presets:
+        if preset_store.results(selected_preset, corpus.content_hash) is not None:
+            st.caption(f"Preset '{selected_preset}': results ready")
+        else:
+            st.caption(f"Preset '{selected_preset}': results are being prepared in the background")
+    
     # Get publication years
     years = get_publication_years()
     if years:
@@ -677,144 +699,50 @@ with st.sidebar:
         on_change=on_year_range_change
     )
     
-    # First, filter by year range to get initial matching documents
-    initial_docs = count_matching_documents(
-        year_range=st.session_state.year_range,
-        sample_size_range=None,
-        publication_type=["All"],
-        funding_source=["All"],
-        study_design=["All"]
-    )
-    
-    
-    # First filter: Publication Type with updated counts
-    publication_types = get_unique_values_filtered(category_name="publication_type", 
-                                                matching_docs=initial_docs)
-    
-    # Extract base values (without counts) from available options
-    base_pub_types = ["All"] + [opt.split(" {")[0] for opt in publication_types if opt != "All"]
-    
-    # Check if current selected values' base names are in available options, otherwise reset to "All"
-    base_selected_pub_types = [val.split(" {")[0] if " {" in val else val for val in st.session_state.publication_type]
-    
-    # Keep selections whose base values are in the available options
-    valid_pub_types = []
-    for i, base_val in enumerate(base_selected_pub_types):
-        if base_val in base_pub_types or base_val == "All":
-            # Find the matching option with updated count
-            if base_val == "All":
-                valid_pub_types.append("All")
-            else:
-                # Find the option in publication_types that has the same base value
-                matching_options = [opt for opt in publication_types if opt.split(" {")[0] == base_val]
-                if matching_options:
-                    valid_pub_types.append(matching_options[0])  # Use the option with updated count
-    
-    if not valid_pub_types:
-        st.session_state.publication_type = ["All"]
-    else:
-        st.session_state.publication_type = valid_pub_types
-    
-    # Apply Publication Type filter
-    st.multiselect(
-        "Publication Type", 
-        publication_types, 
-        key="publication_type_select",
-        default=st.session_state.publication_type,
-        on_change=on_publication_type_change
-    )
-    
-    # Filter docs after applying publication type
-    docs_after_pub_type = count_matching_documents(
+    # Counts for every facet in one pass; each facet's counts apply all other active filters
+    facet_counts = st.session_state.filter_pipeline.facet_counts(**get_filter_criteria(
         year_range=st.session_state.year_range,
-        sample_size_range=None,
-        publication_type=st.session_state.publication_type,
-        funding_source=["All"],
-        study_design=["All"]
-    )
-    
-    # Second filter: Funding Source with updated counts
-    funding_sources = get_unique_values_filtered(category_name=None, subcategory_name="type", 
-                                             matching_docs=docs_after_pub_type)
-    
-    # Extract base values (without counts) from available options
-    base_funding_sources = ["All"] + [opt.split(" {")[0] for opt in funding_sources if opt != "All"]
-    
-    # Check if current selected values' base names are in available options, otherwise reset to "All"
-    base_selected_funding_sources = [val.split(" {")[0] if " {" in val else val for val in st.session_state.funding_source]
-    
-    # Keep selections whose base values are in the available options
-    valid_funding_sources = []
-    for i, base_val in enumerate(base_selected_funding_sources):
-        if base_val in base_funding_sources or base_val == "All":
-            # Find the matching option with updated count
-            if base_val == "All":
-                valid_funding_sources.append("All")
-            else:
-                # Find the option in funding_sources that has the same base value
-                matching_options = [opt for opt in funding_sources if opt.split(" {")[0] == base_val]
-                if matching_options:
-                    valid_funding_sources.append(matching_options[0])  # Use the option with updated count
-    
-    if not valid_funding_sources:
-        st.session_state.funding_source = ["All"]
-    else:
-        st.session_state.funding_source = valid_funding_sources
-    
-    # Apply Funding Source filter
-    st.multiselect(
-        "Funding Source", 
-        funding_sources, 
-        key="funding_source_select",
-        default=st.session_state.funding_source,
-        on_change=on_funding_source_change
-    )
-    
-    # Filter docs after applying funding source
-    docs_after_funding = count_matching_documents(
-        year_range=st.session_state.year_range,
-        sample_size_range=None,
+        sample_size_range=st.session_state.sample_size_filter if st.session_state.enable_sample_size else None,
         publication_type=st.session_state.publication_type,
         funding_source=st.session_state.funding_source,
-        study_design=["All"]
-    )
-    
-    # Third filter: Study Design with updated counts
-    study_designs = get_unique_values_filtered(category_name=None, subcategory_name="primary_type", 
-                                          matching_docs=docs_after_funding)
-    
-    # Extract base values (without counts) from available options
-    base_study_designs = ["All"] + [opt.split(" {")[0] for opt in study_designs if opt != "All"]
-    
-    # Check if current selected values' base names are in available options, otherwise reset to "All"
-    base_selected_study_designs = [val.split(" {")[0] if " {" in val else val for val in st.session_state.study_design]
-    
-    # Keep selections whose base values are in the available options
-    valid_study_designs = []
-    for i, base_val in enumerate(base_selected_study_designs):
-        if base_val in base_study_designs or base_val == "All":
-            # Find the matching option with updated count
-            if base_val == "All":
-                valid_study_designs.append("All")
-            else:
-                # Find the option in study_designs that has the same base value
-                matching_options = [opt for opt in study_designs if opt.split(" {")[0] == base_val]
-                if matching_options:
-                    valid_study_designs.append(matching_options[0])  # Use the option with updated count
-    
-    if not valid_study_designs:
-        st.session_state.study_design = ["All"]
-    else:
-        st.session_state.study_design = valid_study_designs
-    
-    # Apply Study Design filter
-    st.multiselect(
-        "Study Design", 
-        study_designs, 
-        key="study_design_select",
-        default=st.session_state.study_design,
-        on_change=on_study_design_change
+        study_design=st.session_state.study_design,
+        country=st.session_state.country,
+        field_terms=get_field_terms(),
+        query=get_filter_query()
+    ))
+    
+    # Publication Type, Funding Source and Study Design filters with updated counts
+    facet_multiselect("Publication Type", "publication_type", facet_counts["publication_type"],
+                      on_publication_type_change)
+    facet_multiselect("Funding Source", "funding_source", facet_counts["funding_type"],
+                      on_funding_source_change)
+    facet_multiselect("Study Design", "study_design", facet_counts["study_design"],
+                      on_study_design_change)
+    facet_multiselect("Country", "country", facet_counts["country"],
+                      on_country_change, format_value=country_name)
+    
+    # Field + term filter, answered from the inverted index of the cell text
+    term_fields = [ANY_FIELD] + filter_engine.term_fields
+    if st.session_state.term_filter_field not in term_fields:
+        st.session_state.term_filter_field = ANY_FIELD
+    st.selectbox("Search Field", term_fields, key="term_filter_field")
+    st.text_input("Field Contains", key="term_filter_term",
+                  placeholder="e.g. formaldehyde, Korea")
+    
+    # Boolean filter query, ANDed with the filters above
+    st.text_input(
+        "Filter Query",
+        key="filter_query",
+        placeholder='e.g. study_design:"In vitro" AND year>=2022',
+        help='Combine terms with AND, OR, NOT and parentheses. Terms: year>=2022, year:2019..2023, '
+             'sample_size<500, publication_type:Review, funding:Industry, study_design:"In vitro", country:Germany, '
+             'any field path (harmful_ingredients.name:formaldehyde) or a bare word to search every field.'
     )
+    if st.session_state.filter_query.strip():
+        try:
+            filter_engine.query_bits(st.session_state.filter_query)
+        except FilterQueryError as e:
+            st.error(f"Invalid filter query (ignored): {e}")
     
     # Checkbox to enable/disable sample size range
     enable_sample_size = st.checkbox(
@@ -825,7 +753,24 @@ with st.sidebar:
     )
     
     # Sample size range - only shown if checkbox is enabled
-    if enable_sample_size:
+    log_edges = filter_engine.range_indexes['sample_size'].log_edges() if enable_sample_size else []
+    if enable_sample_size and len(log_edges) > 1 and st.checkbox("Log-scale sample sizes", key="sample_size_log_scale"):
+        # 1-2-5 log buckets up to the true maximum, instead of the 10000+ catch-all
+        current_min, current_max = st.session_state.sample_size_filter[:2]
+        low = max([edge for edge in log_edges if edge <= current_min], default=log_edges[0])
+        high = min([edge for edge in log_edges if edge >= current_max], default=log_edges[-1])
+        sample_size_values = st.select_slider(
+            "Sample Size Range",
+            options=log_edges,
+            value=(low, high),
+            key="sample_size_log_slider",
+            on_change=on_sample_size_log_change,
+            format_func=lambda size: f"{size:,}"
+        )
+        st.session_state.sample_size_filter = sample_size_values
+        in_range = filter_engine.range_indexes['sample_size'].range_count(*sample_size_values)
+        st.text(f"{in_range} documents with a sample size in this range")
+    elif enable_sample_size:
         sample_size_range = get_sample_sizes()
         min_size = sample_size_range[0]
         slider_max = sample_size_range[1]  # This is either the actual max or 10000
@@ -870,13 +815,24 @@ matching_docs = count_matching_documents(
     sample_size_range=st.session_state.sample_size_filter if st.session_state.enable_sample_size else None,
     publication_type=st.session_state.publication_type,
     funding_source=st.session_state.funding_source,
-    study_design=st.session_state.study_design
+    study_design=st.session_state.study_design,
+    country=st.session_state.country,
+    field_terms=get_field_terms(),
+    query=get_filter_query()
 )
 
 # Display total number of documents selected in the sidebar
 with st.sidebar:
     st.subheader(f"Total Documents: {len(matching_docs)}")
+    
+    # Hit/miss counters of the memoized filter stages and the shared result cache
+    with st.expander("Filter cache stats"):
+        st.dataframe(pd.DataFrame(st.session_state.filter_pipeline.stats()).T)
+        st.write(filter_cache.stats())
+
 
+# Insights boxes rendered in this run register their placeholders here (see display_insights)
+st.session_state.insight_placeholders = {}
 
 # Tabs
 tabs = st.tabs(tab_names)
@@ -890,7 +846,7 @@ with tabs[0]:
         with col1:
             
             display_insights(
-                df, 
+                corpus, 
                 matching_docs,
                 section_title="Research Insights",
                 topic_name="Overall",
@@ -902,13 +858,13 @@ with tabs[0]:
         
         with col2:
             # Use the imported function to display visualizations
-            display_publication_distribution(df, matching_docs)
+            display_publication_distribution(corpus, matching_docs)
             
         display_sankey_dropdown(categories_to_extract, "Overview")
         
         # Display trending research in the Overview tab
         st.markdown("---")
-        display_trending_research(df, df.columns[3:])
+        display_trending_research(corpus, corpus.doc_columns)
         
     else:
         st.warning("No documents match the selected filters. Please adjust your filter criteria.")
@@ -922,7 +878,7 @@ with tabs[2]:
         with col1:
         
             display_insights(
-                df, 
+                corpus, 
                 matching_docs,
                 section_title="Adverse Events Analysis",
                 topic_name="Adverse Events",
@@ -932,7 +888,7 @@ with tabs[2]:
             )
             
         with col2:
-            render_harmful_ingredients_visualization(df, matching_docs)
+            render_harmful_ingredients_visualization(corpus, matching_docs)
     
         display_sankey_dropdown(adverse_events_categories, "Adverse Events", height = 400)
         
@@ -948,7 +904,7 @@ with tabs[3]:
         with col1:
              
             display_insights(
-                df, 
+                corpus, 
                 matching_docs,
                 section_title="Perceived Benefits Analysis",
                 topic_name="Perceived Benefits",
@@ -958,7 +914,7 @@ with tabs[3]:
             )
             
         # with col2:
-        #     render_perceived_benefits_visualization(df, matching_docs)
+        #     render_perceived_benefits_visualization(corpus, matching_docs)
 
         display_sankey_dropdown(perceived_benefits_categories, "Perceived Benefits", height=350)
         
@@ -1062,7 +1018,7 @@ with tabs[4]:
                 
                 # Display insights for oral health
                 display_insights(
-                    df, 
+                    corpus, 
                     matching_docs,
                     section_title="Oral Health Findings",
                     topic_name="Oral Health",
@@ -1077,7 +1033,7 @@ with tabs[4]:
                 
                 # Display insights for respiratory health
                 display_insights(
-                    df, 
+                    corpus, 
                     matching_docs,
                     section_title="Respiratory Health Findings",
                     topic_name="Respiratory Health",
@@ -1092,7 +1048,7 @@ with tabs[4]:
                 
                 # Display insights for cardiovascular health
                 display_insights(
-                    df, 
+                    corpus, 
                     matching_docs,
                     section_title="Cardiovascular Health Findings",
                     topic_name="Cardiovascular Health",
@@ -1244,7 +1200,7 @@ with tabs[5]:
         with col1:
             
             display_insights(
-                df, 
+                corpus, 
                 matching_docs,
                 section_title="Research Trends Analysis",
                 topic_name="Research Trends",
@@ -1254,7 +1210,7 @@ with tabs[5]:
             )
                         
         with col2:
-            render_research_trends_visualization(df, matching_docs)
+            render_research_trends_visualization(corpus, matching_docs)
             
         display_sankey_dropdown(research_trends_categories, "Research Trends", height=350)
 
@@ -1270,7 +1226,7 @@ with tabs[6]:
         with col1:
             
             display_insights(
-                df, 
+                corpus, 
                 matching_docs,
                 section_title="Contradictions & Conflicts Analysis",
                 topic_name="Contradictions and Conflicts",
@@ -1280,7 +1236,7 @@ with tabs[6]:
             )
                         
         # with col2:
-            # render_contradictions_visualization(df, matching_docs)
+            # render_contradictions_visualization(corpus, matching_docs)
         
         display_sankey_dropdown(contradictions_categories, "Contradictions & Conflicts", height=350)
 
@@ -1296,7 +1252,7 @@ with tabs[7]:
         with col1:
                 
             display_insights(
-                df, 
+                corpus, 
                 matching_docs,
                 section_title="Bias in Research Analysis",
                 topic_name="Research Bias",
@@ -1306,7 +1262,7 @@ with tabs[7]:
             )
                         
         with col2:
-            render_bias_visualization(df, matching_docs)
+            render_bias_visualization(corpus, matching_docs)
         
         display_sankey_dropdown(bias_categories, "Bias in Research", height=350)
     
@@ -1322,7 +1278,7 @@ with tabs[8]:
         with col1:
              
             display_insights(
-                df, 
+                corpus, 
                 matching_docs,
                 section_title="Publication Level Analysis",
                 topic_name="Publication Metrics",
@@ -1333,7 +1289,7 @@ with tabs[8]:
             )
             
         with col2:
-            render_publication_level_visualization(df, matching_docs)
+            render_publication_level_visualization(corpus, matching_docs)
     
         display_sankey_dropdown(publication_categories, "Publication Level", height=350)
 
@@ -1458,6 +1414,15 @@ with tabs[1]:
                     with st.expander(f"🤖 Research Bot Response #{i//2 + 1}", expanded=True):
                         st.markdown(message['content'])
                         
+                        # Time from submitting the question to the first streamed token and to the full answer
+                        timing = message.get("timing")
+                        if timing:
+                            if timing.get("ttft_seconds") is not None:
+                                st.caption(f"First token after {timing['ttft_seconds']:.1f}s, "
+                                           f"complete after {timing['seconds']:.1f}s")
+                            else:
+                                st.caption(f"Answered after {timing['seconds']:.1f}s")
+                        
                         # FIXED: Check if this specific message has source documents stored with it
                         if "sources" in message and message["sources"]:
                             st.markdown("---")
@@ -1571,6 +1536,7 @@ with tabs[1]:
         if submit_btn and (user_question.strip() or st.session_state.current_question.strip()):
             # Use either the text input or the session state question
             question_to_use = user_question.strip() if user_question.strip() else st.session_state.current_question.strip()
+            asked_at = time.perf_counter()
             
             # Add user message to chat history
             st.session_state.chat_history.append({"role": "user", "content": question_to_use})
@@ -1589,19 +1555,41 @@ with tabs[1]:
                             top_k=num_sources
                         )
                         
-                        # Process question and generate answer
+                        # Show the question and a response box the answer is streamed into
+                        with chat_container:
+                            st.markdown(f"<div style='background-color: #f0f2f6; padding: 10px; border-radius: 10px; margin-bottom: 10px;'><strong>You:</strong> {question_to_use}</div>", unsafe_allow_html=True)
+                            with st.expander(f"🤖 Research Bot Response #{len(st.session_state.chat_history)//2 + 1}", expanded=True):
+                                answer_box = st.empty()
+                        
+                        streamed = {"parts": [], "rendered": 0.0}
+                        
+                        def on_answer_delta(delta):
+                            if delta is None:
+                                streamed["parts"] = []
+                                return
+                            now = time.perf_counter()
+                            streamed.setdefault("ttft_seconds", now - asked_at)
+                            streamed["parts"].append(delta)
+                            if now - streamed["rendered"] >= STREAM_RENDER_SECONDS:
+                                answer_box.markdown("".join(streamed["parts"]))
+                                streamed["rendered"] = now
+                        
+                        # Process question and generate answer, streaming it into the response box
                         answer = process_question(
                             question=question_to_use,
                             rag_system=st.session_state.rag_system,
                             relevant_documents=relevant_docs,
-                            api_key=st.session_state.openai_api_key
+                            api_key=st.session_state.openai_api_key,
+                            on_delta=on_answer_delta
                         )
                         
                         # Add bot response to chat history WITH the sources for this specific response
                         st.session_state.chat_history.append({
                             "role": "assistant", 
                             "content": answer,
-                            "sources": relevant_docs  # Store sources with this specific response
+                            "sources": relevant_docs,  # Store sources with this specific response
+                            "timing": {"ttft_seconds": streamed.get("ttft_seconds"),
+                                       "seconds": time.perf_counter() - asked_at}
                         })
                         
                         # Update current relevant documents for the sidebar display
@@ -1746,6 +1734,10 @@ with tabs[1]:
         else:
             st.info("Ask a question to see relevant source documents here.")
             
+
+# Generate the requested insights now that every tab's insights box is on the page
+if insights_request is not None:
+    process_all_tabs(insights_request, insights_status)
             
 st.markdown("---")
 
@@ -1753,12 +1745,12 @@ st.markdown("---")
 if st.checkbox("Show E-Cigarette Research Data Structure"):
     # Load the categories data from Excel file
     @st.cache_data
-    def load_categories_data():
+    def load_categories_data(content_hash):
         try:
-            # Use the same Excel file that's already being loaded
-            categories_df = pd.read_excel('E_Cigarette_Research_Metadata_Consolidated.xlsx')
+            # Reuse the already loaded corpus instead of parsing the workbook again (content_hash
+            # keys the cache so a reloaded workbook is picked up)
             # Take only the first 3 columns which contain Main Category, Category, and SubCategory
-            categories_df = categories_df[["Main Category", "Category", "SubCategory"]]
+            categories_df = corpus.labels[["Main Category", "Category", "SubCategory"]]
             # Drop any rows where Main Category is NA
             categories_df = categories_df.dropna(subset=["Main Category"])
             
@@ -1772,7 +1764,7 @@ if st.checkbox("Show E-Cigarette Research Data Structure"):
             st.error(f"Error loading categories data: {e}")
             return pd.DataFrame()
     
-    categories_df = load_categories_data()
+    categories_df = load_categories_data(corpus.content_hash)
     
     if not categories_df.empty:
         # Get unique main categories
@@ -1794,11 +1786,11 @@ if st.checkbox("Show E-Cigarette Research Data Structure"):
 # Show document details for debugging
 if st.checkbox("Show Document Details"):
     from data_display_utils import display_document_details
-    display_document_details(df, matching_docs)
+    display_document_details(corpus, matching_docs)
 
 # Show raw data if needed
 if st.checkbox("Show Sample Document Data"):
     from data_display_utils import display_raw_data
-    display_raw_data(df)
+    display_raw_data(corpus)
     
     
\ No newline at end of file
@@ -4,15 +4,11 @@ import io
 import faiss
 import pickle
 import os
-import asyncio
 from typing import List, Dict, Any
 import openai
-from openai import AsyncOpenAI
+from openai_clients import get_async_client, complete_chat_streaming
+from async_runtime import run, run_streaming
 import streamlit as st
-import nest_asyncio
-
-# Enable nested asyncio for environments like Jupyter/Spyder
-nest_asyncio.apply()
 
 # Define RAG system class to store embeddings, vector database, and other components
 class RAGSystem:
@@ -64,19 +60,16 @@ async def get_query_embedding_async(openai_api_key: str, query: str, embedding_m
     Returns:
         np.ndarray: Query embedding vector
     """
-    client = AsyncOpenAI(api_key=openai_api_key)
-    
-    try:
-        response = await client.embeddings.create(
-            input=query,
-            model=embedding_model
-        )
-        embedding = np.array(response.data[0].embedding, dtype=np.float32)
-        # Normalize for cosine similarity
-        embedding = embedding / np.linalg.norm(embedding)
-        return embedding
-    finally:
-        await client.close()
+    client = get_async_client(openai_api_key)
+    
+    response = await client.embeddings.create(
+        input=query,
+        model=embedding_model
+    )
+    embedding = np.array(response.data[0].embedding, dtype=np.float32)
+    # Normalize for cosine similarity
+    embedding = embedding / np.linalg.norm(embedding)
+    return embedding
 
 def get_query_embedding(openai_api_key: str, query: str, embedding_model: str) -> np.ndarray:
     """
@@ -90,14 +83,8 @@ def get_query_embedding(openai_api_key: str, query: str, embedding_model: str) -
     Returns:
         np.ndarray: Query embedding vector
     """
-    try:
-        return asyncio.run(get_query_embedding_async(openai_api_key, query, embedding_model))
-    except RuntimeError as e:
-        if "cannot be called from a running event loop" in str(e):
-            loop = asyncio.get_event_loop()
-            return loop.run_until_complete(get_query_embedding_async(openai_api_key, query, embedding_model))
-        else:
-            raise e
+    # Runs on the shared background event loop
+    return run(get_query_embedding_async(openai_api_key, query, embedding_model))
 
 def initialize_rag_system(api_key: str, document_data: pd.DataFrame = None, index_path: str = "faiss_index") -> RAGSystem:
     """
@@ -263,7 +250,8 @@ def get_relevant_documents(question: str, rag_system: RAGSystem, top_k: int = 8)
     
     return formatted_results
 
-async def generate_answer_async(question: str, relevant_documents: List[Dict[str, Any]], api_key: str) -> str:
+async def generate_answer_async(question: str, relevant_documents: List[Dict[str, Any]], api_key: str,
+                                on_delta=None) -> str:
     """
     Generate an answer using OpenAI API with relevant document context.
     
@@ -275,6 +263,8 @@ async def generate_answer_async(question: str, relevant_documents: List[Dict[str
         List of relevant documents
     api_key : str
         OpenAI API key
+    on_delta : callable, optional
+        Streams the completion: called with None, then with every text delta
     
     Returns:
     --------
@@ -317,28 +307,32 @@ Instructions:
 
 Answer:"""
 
-    client = AsyncOpenAI(api_key=api_key)
+    client = get_async_client(api_key)
+    
+    request = {
+        "model": "gpt-4.1",
+        "messages": [
+            {"role": "system", "content": "You are a helpful research assistant specializing in e-cigarette and vaping research. Provide accurate, evidence-based answers based on the provided research documents."},
+            {"role": "user", "content": prompt}
+        ],
+        "max_tokens": 4096,
+        "temperature": 0.1
+    }
     
     try:
-        response = await client.chat.completions.create(
-            model="gpt-4.1",
-            messages=[
-                {"role": "system", "content": "You are a helpful research assistant specializing in e-cigarette and vaping research. Provide accurate, evidence-based answers based on the provided research documents."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=4096,
-            temperature=0.1
-        )
+        if on_delta is not None:
+            response = await complete_chat_streaming(client, on_delta, **request)
+            return response.text
+        
+        response = await client.chat.completions.create(**request)
         
         return response.choices[0].message.content
     
     except Exception as e:
         return f"Error generating answer: {str(e)}"
-    
-    finally:
-        await client.close()
 
-def process_question(question: str, rag_system: RAGSystem, relevant_documents: List[Dict[str, Any]], api_key: str) -> str:
+def process_question(question: str, rag_system: RAGSystem, relevant_documents: List[Dict[str, Any]], api_key: str,
+                     on_delta=None) -> str:
     """
     Process a question using the RAG system with OpenAI API
     
@@ -352,21 +346,19 @@ def process_question(question: str, rag_system: RAGSystem, relevant_documents: L
         List of relevant documents
     api_key : str
         OpenAI API key
+    on_delta : callable, optional
+        Streams the answer: called on the calling thread with None, then with every text delta
     
     Returns:
     --------
     str
         Generated answer
     """
-    try:
-        # Use asyncio to run the async function
-        return asyncio.run(generate_answer_async(question, relevant_documents, api_key))
-    except RuntimeError as e:
-        if "cannot be called from a running event loop" in str(e):
-            loop = asyncio.get_event_loop()
-            return loop.run_until_complete(generate_answer_async(question, relevant_documents, api_key))
-        else:
-            raise e
+    # Run the async function on the shared background event loop
+    if on_delta is None:
+        return run(generate_answer_async(question, relevant_documents, api_key))
+    return run_streaming(lambda emit: generate_answer_async(question, relevant_documents, api_key, on_delta=emit),
+                         on_delta)
 
 
 def export_chat_to_docx(chat_history: List[Dict[str, str]]) -> io.BytesIO:
@@ -0,0 +1,123 @@
+import queue
+import asyncio
+import threading
+import concurrent.futures
+
+
+class BackgroundLoop:
+    """
+    One long-lived asyncio event loop running in a daemon thread.
+
+    Synchronous code (the Streamlit script thread, the preset materializer)
+    hands coroutines to the loop with submit() and waits on the returned
+    concurrent.futures.Future. Every session shares the loop, so the pooled
+    async OpenAI clients (bound to their loop) and their open connections
+    live for the whole process instead of one asyncio.run() call.
+
+    Coroutines run on the loop thread: they must not call Streamlit, whose
+    calls only render from the script thread of their session.
+    """
+
+    def __init__(self, name: str = "async-runtime"):
+        self.name = name
+        self.loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self) -> asyncio.AbstractEventLoop:
+        """Start the loop thread if it is not running yet and return the loop."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                ready = threading.Event()
+                self._thread = threading.Thread(target=self._run, args=(ready,), name=self.name, daemon=True)
+                self._thread.start()
+                ready.wait()
+            return self.loop
+
+    def _run(self, ready: threading.Event):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(ready.set)
+        self.loop.run_forever()
+
+    def submit(self, coroutine):
+        """
+        Schedule a coroutine on the loop from any other thread.
+
+        Args:
+            coroutine: Coroutine object to run
+
+        Returns:
+            concurrent.futures.Future: Resolves to the coroutine's result or exception
+        """
+        loop = self.start()
+        if threading.current_thread() is self._thread:
+            coroutine.close()
+            raise RuntimeError("submit() called from the event loop thread; await the coroutine instead")
+        return asyncio.run_coroutine_threadsafe(coroutine, loop)
+
+    def run(self, coroutine, timeout: float = None):
+        """
+        Run a coroutine on the loop and block until it finishes.
+
+        Args:
+            coroutine: Coroutine object to run
+            timeout (float, optional): Seconds to wait; the coroutine is
+                cancelled if it takes longer
+
+        Returns:
+            The coroutine's result (its exception is raised)
+        """
+        future = self.submit(coroutine)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def run_streaming(self, make_coroutine, on_update):
+        """
+        Run a coroutine on the loop, handling its progress updates on the calling thread.
+
+        make_coroutine receives an emit(*args) function that is safe to call
+        from the loop; every emit is handed back through a queue and passed to
+        on_update(*args) on the calling thread, in order, while the coroutine
+        runs. This is how coroutines report to Streamlit, which only renders
+        from the script thread. If the caller is interrupted (e.g. a Streamlit
+        rerun), the coroutine is cancelled.
+
+        Args:
+            make_coroutine (callable): emit -> coroutine object to run
+            on_update (callable): Called with the arguments of every emit
+
+        Returns:
+            The coroutine's result (its exception is raised)
+        """
+        updates = queue.Queue()
+        future = self.submit(make_coroutine(lambda *args: updates.put(args)))
+        # None marks the end of the updates (also if the coroutine failed)
+        future.add_done_callback(lambda _: updates.put(None))
+        try:
+            while (update := updates.get()) is not None:
+                on_update(*update)
+            return future.result()
+        finally:
+            future.cancel()
+
+
+_background_loop = BackgroundLoop()
+
+
+def submit(coroutine):
+    """Schedule a coroutine on the process-wide background loop; returns a concurrent.futures.Future."""
+    return _background_loop.submit(coroutine)
+
+
+def run(coroutine, timeout: float = None):
+    """Run a coroutine on the process-wide background loop and return its result."""
+    return _background_loop.run(coroutine, timeout)
+
+
+def run_streaming(make_coroutine, on_update):
+    """Run make_coroutine(emit) on the process-wide background loop, passing its emits to on_update here."""
+    return _background_loop.run_streaming(make_coroutine, on_update)
@@ -0,0 +1,692 @@
+import os
+import sys
+import json
+import sqlite3
+import tempfile
+import threading
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+# Leading label columns of the wide frame; every later column is a document
+LABEL_COLUMNS = 3
+
+# Default location of the SQLite corpus database (override with CORPUS_DB_PATH)
+CORPUS_DB_PATH = os.environ.get("CORPUS_DB_PATH", os.path.join("corpus_snapshot", "corpus.sqlite"))
+
+# Bump whenever the database schema changes so stale files are rebuilt
+SQLITE_FORMAT_VERSION = "1"
+
+# Bytes of the database file memory-mapped per connection; the mapped pages
+# live in the OS page cache and are shared by every worker process
+SQLITE_MMAP_BYTES = 1 << 30
+
+_SQLITE_SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE docs (doc_id INTEGER PRIMARY KEY, name);
+CREATE TABLE fields (field_id INTEGER PRIMARY KEY, main_category, category, subcategory);
+CREATE TABLE cells (cell_id INTEGER PRIMARY KEY, doc_id INTEGER NOT NULL, field_id INTEGER NOT NULL,
+                    value, kind TEXT);
+"""
+
+_SQLITE_INDEXES = """
+CREATE INDEX cells_by_field ON cells (field_id, doc_id);
+CREATE INDEX cells_by_doc ON cells (doc_id, field_id);
+CREATE VIRTUAL TABLE cells_fts USING fts5 (value, content='cells', content_rowid='cell_id',
+                                           tokenize='unicode61 remove_diacritics 2', prefix='3');
+INSERT INTO cells_fts (rowid, value) SELECT cell_id, value FROM cells WHERE kind = 'str';
+"""
+
+
+class DenseCells:
+    """
+    Cell storage backed by the wide field x paper frame.
+
+    Keeps the frame as loaded plus an object value matrix for O(1) access.
+    Memory grows with fields x papers, populated or not.
+
+    Args:
+        df (DataFrame): Wide frame (label columns followed by document columns)
+    """
+
+    storage = "dense"
+
+    def __init__(self, df: pd.DataFrame):
+        self.frame = df
+        self.labels = df.iloc[:, :LABEL_COLUMNS]
+        self.doc_columns = tuple(df.columns[LABEL_COLUMNS:])
+        self._values = df.to_numpy(dtype=object)
+        self._columns = {column: pos for pos, column in enumerate(df.columns)}
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "DenseCells":
+        return cls(df)
+
+    def get(self, position: int, doc):
+        """Return the raw cell of one document at a row position (NaN if empty)."""
+        return self._values[position, self._columns[doc]]
+
+    def gather(self, doc, positions) -> list:
+        """Non-missing cells of one document at the given row positions, in order."""
+        col = self._columns[doc]
+        result = []
+        for pos in positions:
+            value = self._values[pos, col]
+            if not pd.isna(value):
+                result.append(value)
+        return result
+
+    def triples(self) -> tuple:
+        """(field_ids, doc_ids, values) arrays of the populated cells."""
+        cells = self._values[:, LABEL_COLUMNS:]
+        field_ids, doc_ids = np.nonzero(pd.notna(cells))
+        return field_ids, doc_ids, cells[field_ids, doc_ids]
+
+    def text_values(self):
+        """Yield every string cell value (repeated values included)."""
+        for value in self._values[:, LABEL_COLUMNS:].ravel().tolist():
+            if isinstance(value, str):
+                yield value
+
+    def row_items(self, position: int):
+        """Yield (doc, value) for the non-missing cells of one row, in corpus order."""
+        row = self._values[position]
+        for doc in self.doc_columns:
+            value = row[self._columns[doc]]
+            if not pd.isna(value):
+                yield doc, value
+
+    def row(self, position: int) -> pd.Series:
+        """One field row as an object Series indexed by document."""
+        return self.frame.iloc[position][list(self.doc_columns)].astype(object)
+
+    def column(self, doc) -> pd.Series:
+        """One document column, indexed like the frame."""
+        return self.frame[doc]
+
+    def count(self, doc) -> int:
+        """Number of non-missing cells of one document."""
+        return int(self.frame[doc].count())
+
+    def to_frame(self, positions=None, docs=None) -> pd.DataFrame:
+        """
+        Wide frame of the given rows and documents (all by default).
+
+        Args:
+            positions (list, optional): Row positions
+            docs (list, optional): Document columns
+
+        Returns:
+            DataFrame: Label columns followed by the document columns
+        """
+        frame = self.frame
+        if docs is not None:
+            frame = frame[list(self.labels.columns) + list(docs)]
+        if positions is not None:
+            frame = frame.iloc[list(positions)]
+        return frame
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the cell values (pointers plus objects)."""
+        return self._values.size * 8 + _object_bytes(self._values.ravel())
+
+
+class SparseCells:
+    """
+    Cell storage holding only the populated cells of the wide frame.
+
+    The workbook is mostly empty, so instead of one Python object per cell
+    the non-missing cells are kept as (field_id, doc_id, value) triples in
+    compact arrays, with every string interned once:
+
+        doc_indptr, field_ids   cells grouped by document (CSC), each group
+                                sorted by field row, for cell/column lookups
+        row_indptr, row_order   permutation of the same cells grouped by field
+                                row (CSR), for row slices
+
+    Memory grows with the number of populated cells. The API matches
+    DenseCells, so CorpusSnapshot can use either.
+
+    Build it with from_frame (from a parsed wide frame) or from_rows (straight
+    from a row iterator, without ever holding the wide frame).
+
+    Args:
+        labels (DataFrame): Label columns of every field row
+        doc_columns (sequence): Document column names
+        field_ids, doc_ids (array-like): Row position and document number of
+            each populated cell, in any order
+        values (array-like): Cell values (interned strings or typed values)
+    """
+
+    storage = "sparse"
+
+    def __init__(self, labels: pd.DataFrame, doc_columns, field_ids, doc_ids, values):
+        self.labels = labels
+        self.doc_columns = tuple(doc_columns)
+        self._doc_ids = {doc: doc_id for doc_id, doc in enumerate(self.doc_columns)}
+
+        field_ids = np.asarray(field_ids, dtype=np.int32)
+        doc_ids = np.asarray(doc_ids, dtype=np.int32)
+        values = np.asarray(values, dtype=object)
+
+        # Group the cells by document, each group sorted by field row
+        order = np.lexsort((field_ids, doc_ids))
+        if (np.diff(order) != 1).any():
+            field_ids, doc_ids, values = field_ids[order], doc_ids[order], values[order]
+
+        self.field_ids = field_ids
+        self.values = values
+        self.doc_indptr = np.searchsorted(doc_ids, np.arange(len(self.doc_columns) + 1)).astype(np.int64)
+
+        self.row_order = np.argsort(self.field_ids, kind="stable").astype(np.int32)
+        self.row_indptr = np.searchsorted(self.field_ids[self.row_order],
+                                          np.arange(len(self.labels) + 1)).astype(np.int64)
+        self._cell_docs = doc_ids
+        self._indptr_list = self.doc_indptr.tolist()
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "SparseCells":
+        """
+        Build the store from a wide frame.
+
+        Args:
+            df (DataFrame): Wide frame (label columns followed by document columns)
+        """
+        cells = df.iloc[:, LABEL_COLUMNS:].to_numpy(dtype=object)
+        # Column-major scan: cells come out grouped by document, sorted by row
+        doc_ids, field_ids = np.nonzero(pd.notna(cells).T)
+
+        values = np.empty(len(field_ids), dtype=object)
+        for i, value in enumerate(cells[field_ids, doc_ids].tolist()):
+            # Repeated strings ("Moderate", "Yes", ...) share one object
+            values[i] = sys.intern(value) if type(value) is str else value
+
+        return cls(df.iloc[:, :LABEL_COLUMNS].copy(), df.columns[LABEL_COLUMNS:], field_ids, doc_ids, values)
+
+    @classmethod
+    def from_rows(cls, columns, rows) -> "SparseCells":
+        """
+        Build the store from field rows as they are read, one row at a time.
+
+        Only the populated cells of a row are kept (as compact int32 ids plus
+        interned values), so peak memory follows the populated cells rather
+        than fields x papers.
+
+        Args:
+            columns (sequence): Column names (label columns, then documents)
+            rows (iterable): Row value sequences aligned with columns, with
+                None for missing cells
+
+        Returns:
+            SparseCells: The store; field row positions follow the row order
+        """
+        columns = list(columns)
+        label_rows = []
+        field_ids = array("i")
+        doc_ids = array("i")
+        values = []
+
+        for position, row in enumerate(rows):
+            label_rows.append(tuple(row[:LABEL_COLUMNS]))
+            for doc_id, value in enumerate(row[LABEL_COLUMNS:]):
+                if value is None:
+                    continue
+                field_ids.append(position)
+                doc_ids.append(doc_id)
+                values.append(sys.intern(value) if type(value) is str else value)
+
+        labels = pd.DataFrame(label_rows, columns=columns[:LABEL_COLUMNS], dtype=object)
+        labels = labels.where(labels.notna(), np.nan)
+
+        value_array = np.empty(len(values), dtype=object)
+        value_array[:] = values
+        del values
+
+        return cls(labels, columns[LABEL_COLUMNS:], np.frombuffer(field_ids, dtype=np.int32),
+                   np.frombuffer(doc_ids, dtype=np.int32), value_array)
+
+    def _find(self, position: int, doc_id: int) -> int:
+        """Index of the cell (position, doc_id) in the cell arrays, or -1."""
+        lo = self._indptr_list[doc_id]
+        hi = self._indptr_list[doc_id + 1]
+        index = bisect_left(self.field_ids, position, lo, hi)
+        if index < hi and self.field_ids[index] == position:
+            return index
+        return -1
+
+    def get(self, position: int, doc):
+        """Return the raw cell of one document at a row position (NaN if empty)."""
+        index = self._find(position, self._doc_ids[doc])
+        return self.values[index] if index >= 0 else np.nan
+
+    def gather(self, doc, positions) -> list:
+        """Non-missing cells of one document at the given row positions, in order."""
+        doc_id = self._doc_ids[doc]
+        result = []
+        for pos in positions:
+            index = self._find(pos, doc_id)
+            if index >= 0:
+                result.append(self.values[index])
+        return result
+
+    def triples(self) -> tuple:
+        """(field_ids, doc_ids, values) arrays of the populated cells."""
+        return self.field_ids, self._cell_docs, self.values
+
+    def text_values(self):
+        """Yield every string cell value (repeated values included)."""
+        for value in self.values.tolist():
+            if isinstance(value, str):
+                yield value
+
+    def row_items(self, position: int):
+        """Yield (doc, value) for the non-missing cells of one row, in corpus order."""
+        for index in self.row_order[self.row_indptr[position]:self.row_indptr[position + 1]].tolist():
+            yield self.doc_columns[self._cell_docs[index]], self.values[index]
+
+    def row(self, position: int) -> pd.Series:
+        """One field row as an object Series indexed by document."""
+        indexes = self.row_order[self.row_indptr[position]:self.row_indptr[position + 1]]
+        row = np.full(len(self.doc_columns), np.nan, dtype=object)
+        row[self._cell_docs[indexes]] = self.values[indexes]
+        return pd.Series(row, index=list(self.doc_columns), dtype=object)
+
+    def column(self, doc) -> pd.Series:
+        """One document column, indexed like the frame."""
+        doc_id = self._doc_ids[doc]
+        lo, hi = self._indptr_list[doc_id], self._indptr_list[doc_id + 1]
+        column = np.full(len(self.labels), np.nan, dtype=object)
+        column[self.field_ids[lo:hi]] = self.values[lo:hi]
+        return pd.Series(column, index=self.labels.index, name=doc, dtype=object)
+
+    def count(self, doc) -> int:
+        """Number of non-missing cells of one document."""
+        doc_id = self._doc_ids[doc]
+        return int(self.doc_indptr[doc_id + 1] - self.doc_indptr[doc_id])
+
+    def to_frame(self, positions=None, docs=None) -> pd.DataFrame:
+        """
+        Materialize a wide frame of the given rows and documents (all by default).
+
+        Args:
+            positions (list, optional): Row positions
+            docs (list, optional): Document columns
+
+        Returns:
+            DataFrame: Label columns followed by the document columns
+        """
+        positions = list(range(len(self.labels))) if positions is None else list(positions)
+        docs = list(self.doc_columns) if docs is None else list(docs)
+
+        frame = self.labels.iloc[positions].copy()
+
+        # Field row -> output row (-1 when the row is not selected)
+        output_rows = np.full(len(self.labels), -1, dtype=np.int64)
+        output_rows[positions] = np.arange(len(positions))
+
+        columns = {}
+        for doc in docs:
+            doc_id = self._doc_ids[doc]
+            lo, hi = self._indptr_list[doc_id], self._indptr_list[doc_id + 1]
+            rows = output_rows[self.field_ids[lo:hi]]
+            selected = rows >= 0
+            column = np.full(len(positions), np.nan, dtype=object)
+            column[rows[selected]] = self.values[lo:hi][selected]
+            columns[doc] = column
+        return pd.concat([frame, pd.DataFrame(columns, index=frame.index, dtype=object)], axis=1)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the cell arrays and their (interned) values."""
+        arrays = (self.field_ids, self.doc_indptr, self.row_order, self.row_indptr, self._cell_docs)
+        return (sum(array.nbytes for array in arrays) + self.values.size * 8
+                + _object_bytes(self.values))
+
+
+def _object_bytes(values) -> int:
+    """Size of the distinct non-missing objects referenced by an object array."""
+    seen = set()
+    total = 0
+    for value in values:
+        if id(value) in seen or (not isinstance(value, str) and pd.isna(value)):
+            continue
+        seen.add(id(value))
+        total += sys.getsizeof(value)
+    return total
+
+
+def _sqlite_value(value) -> tuple:
+    """(stored value, kind) of one cell; kind tells how to read it back."""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, str):
+        return value, "str"
+    if isinstance(value, bool):
+        return int(value), "bool"
+    if isinstance(value, datetime):
+        return value.isoformat(), "datetime"
+    return value, None
+
+
+def _python_value(value, kind):
+    """Inverse of _sqlite_value."""
+    if kind == "bool":
+        return bool(value)
+    if kind == "datetime":
+        return pd.Timestamp(value).to_pydatetime()
+    return value
+
+
+def fts_literal_query(query: str) -> str:
+    """
+    FTS5 query matching the words of free text literally (all of them, in any order).
+
+    Every whitespace-separated token becomes a quoted FTS5 string, so
+    characters such as '-', ':' or '*' are not read as query syntax.
+    """
+    return " ".join('"' + token.replace('"', '""') + '"' for token in query.split())
+
+
+class SqliteCells:
+    """
+    Cell storage in a SQLite database, with full-text search over every cell.
+
+    The populated cells are kept in a normalized table
+
+        cells (cell_id, doc_id, field_id, value, kind)
+
+    indexed by (field_id, doc_id) and (doc_id, field_id), next to the docs
+    and fields tables and an FTS5 index over the text cells. Only the field
+    labels and document names are held in Python; cell lookups are SQL
+    queries against a read-only, memory-mapped file, so worker processes
+    serving the same database share its pages instead of each holding a
+    copy of the corpus.
+
+    The API matches DenseCells plus search/search_cells, so CorpusSnapshot
+    can use it as a storage backend. Build the database with build (or
+    from_frame) and reopen it with open.
+
+    Args:
+        db_path (str): Path of an existing corpus database
+    """
+
+    storage = "sqlite"
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        # One connection per store: it pins the file it was opened on, so a
+        # database rebuilt by a reload never leaks into an older snapshot
+        uri = f"{Path(db_path).resolve().as_uri()}?mode=ro"
+        self._connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        self._connection.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_BYTES}")
+        self._lock = threading.Lock()
+
+        meta = dict(self._query("SELECT key, value FROM meta"))
+        self.content_hash = meta.get("content_hash") or None
+        self.format_version = meta.get("format_version")
+
+        label_rows = self._query("SELECT main_category, category, subcategory FROM fields ORDER BY field_id")
+        labels = pd.DataFrame(label_rows, columns=json.loads(meta.get("label_columns", "[]")) or None,
+                              dtype=object)
+        self.labels = labels.where(labels.notna(), np.nan)
+        self.doc_columns = tuple(name for name, in self._query("SELECT name FROM docs ORDER BY doc_id"))
+        self._doc_ids = {doc: doc_id for doc_id, doc in enumerate(self.doc_columns)}
+
+    @classmethod
+    def open(cls, db_path: str = CORPUS_DB_PATH, expected_hash: str = None):
+        """
+        Open a corpus database if it exists and matches the workbook.
+
+        Returns:
+            SqliteCells or None: None if the database is missing, stale or unreadable
+        """
+        if not os.path.exists(db_path):
+            return None
+        try:
+            cells = cls(db_path)
+        except sqlite3.Error as e:
+            print(f"Warning: could not read corpus database '{db_path}': {e}")
+            return None
+        if cells.format_version != SQLITE_FORMAT_VERSION or (expected_hash and cells.content_hash != expected_hash):
+            cells.close()
+            return None
+        return cells
+
+    @classmethod
+    def build(cls, source, db_path: str = CORPUS_DB_PATH, content_hash: str = None) -> "SqliteCells":
+        """
+        Write a cell store to a fresh corpus database and open it.
+
+        The database is written to a temporary file and swapped in, so
+        readers (other processes included) never see a half-written file.
+
+        Args:
+            source: Cell store to copy (DenseCells or SparseCells)
+            db_path (str): Destination of the database
+            content_hash (str, optional): Workbook hash recorded for staleness checks
+
+        Returns:
+            SqliteCells: The new database
+        """
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        tmp_path = f"{db_path}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+        labels = source.labels.astype(object)
+        labels = labels.where(labels.notna(), None)
+        field_ids, doc_ids, values = source.triples()
+
+        connection = sqlite3.connect(tmp_path)
+        try:
+            connection.executescript(_SQLITE_SCHEMA)
+            connection.executemany("INSERT INTO meta VALUES (?, ?)", [
+                ("format_version", SQLITE_FORMAT_VERSION),
+                ("content_hash", content_hash or ""),
+                ("label_columns", json.dumps([str(column) for column in labels.columns])),
+            ])
+            connection.executemany("INSERT INTO docs VALUES (?, ?)", enumerate(source.doc_columns))
+            connection.executemany("INSERT INTO fields VALUES (?, ?, ?, ?)",
+                                   ((position, *row) for position, row in enumerate(labels.values.tolist())))
+            connection.executemany(
+                "INSERT INTO cells (doc_id, field_id, value, kind) VALUES (?, ?, ?, ?)",
+                ((doc_id, field_id, *_sqlite_value(value))
+                 for field_id, doc_id, value in zip(field_ids.tolist(), doc_ids.tolist(), values.tolist())),
+            )
+            # Indexes after the bulk insert: one sort instead of per-row updates
+            connection.executescript(_SQLITE_INDEXES)
+            connection.commit()
+        finally:
+            connection.close()
+
+        os.replace(tmp_path, db_path)
+        return cls(db_path)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, db_path: str = None, content_hash: str = None) -> "SqliteCells":
+        """
+        Build a corpus database from a wide frame.
+
+        Without db_path the database goes to a private temporary file: a
+        frame of unknown origin must never replace the shared database at
+        CORPUS_DB_PATH, whose content hash the other processes trust.
+
+        Args:
+            df (DataFrame): Wide field x paper frame
+            db_path (str, optional): Destination of the database
+            content_hash (str, optional): Workbook hash recorded for staleness checks
+
+        Returns:
+            SqliteCells: The new database
+        """
+        if db_path is None:
+            fd, db_path = tempfile.mkstemp(suffix=".sqlite")
+            os.close(fd)
+        return cls.build(DenseCells(df), db_path, content_hash)
+
+    def close(self):
+        self._connection.close()
+
+    def _query(self, sql: str, parameters=()) -> list:
+        with self._lock:
+            return self._connection.execute(sql, parameters).fetchall()
+
+    def get(self, position: int, doc):
+        """Return the raw cell of one document at a row position (NaN if empty)."""
+        rows = self._query("SELECT value, kind FROM cells WHERE doc_id = ? AND field_id = ?",
+                           (self._doc_ids[doc], position))
+        return _python_value(*rows[0]) if rows else np.nan
+
+    def gather(self, doc, positions) -> list:
+        """Non-missing cells of one document at the given row positions, in order."""
+        positions = list(positions)
+        if not positions:
+            return []
+        cells = dict(
+            (field_id, _python_value(value, kind))
+            for field_id, value, kind in self._query(
+                f"SELECT field_id, value, kind FROM cells WHERE doc_id = ? "
+                f"AND field_id IN ({','.join('?' * len(set(positions)))})",
+                (self._doc_ids[doc], *set(positions)))
+        )
+        return [cells[pos] for pos in positions if pos in cells]
+
+    def triples(self) -> tuple:
+        """(field_ids, doc_ids, values) arrays of the populated cells."""
+        rows = self._query("SELECT field_id, doc_id, value, kind FROM cells ORDER BY doc_id, field_id")
+        values = np.empty(len(rows), dtype=object)
+        values[:] = [_python_value(value, kind) for _, _, value, kind in rows]
+        field_ids = np.fromiter((row[0] for row in rows), dtype=np.int32, count=len(rows))
+        doc_ids = np.fromiter((row[1] for row in rows), dtype=np.int32, count=len(rows))
+        return field_ids, doc_ids, values
+
+    def text_values(self):
+        """Yield every string cell value (repeated values included)."""
+        for value, in self._query("SELECT value FROM cells WHERE kind = 'str'"):
+            yield value
+
+    def row_items(self, position: int):
+        """Yield (doc, value) for the non-missing cells of one row, in corpus order."""
+        rows = self._query("SELECT doc_id, value, kind FROM cells WHERE field_id = ? ORDER BY doc_id", (position,))
+        for doc_id, value, kind in rows:
+            yield self.doc_columns[doc_id], _python_value(value, kind)
+
+    def row(self, position: int) -> pd.Series:
+        """One field row as an object Series indexed by document."""
+        row = np.full(len(self.doc_columns), np.nan, dtype=object)
+        for doc, value in self.row_items(position):
+            row[self._doc_ids[doc]] = value
+        return pd.Series(row, index=list(self.doc_columns), dtype=object)
+
+    def column(self, doc) -> pd.Series:
+        """One document column, indexed like the frame."""
+        column = np.full(len(self.labels), np.nan, dtype=object)
+        for field_id, value, kind in self._query("SELECT field_id, value, kind FROM cells WHERE doc_id = ?",
+                                                 (self._doc_ids[doc],)):
+            column[field_id] = _python_value(value, kind)
+        return pd.Series(column, index=self.labels.index, name=doc, dtype=object)
+
+    def count(self, doc) -> int:
+        """Number of non-missing cells of one document."""
+        return self._query("SELECT COUNT(*) FROM cells WHERE doc_id = ?", (self._doc_ids[doc],))[0][0]
+
+    def populated_rows(self) -> list:
+        """Row positions with at least one non-missing cell, in order."""
+        return [field_id for field_id, in self._query("SELECT DISTINCT field_id FROM cells ORDER BY field_id")]
+
+    def to_frame(self, positions=None, docs=None) -> pd.DataFrame:
+        """
+        Materialize a wide frame of the given rows and documents (all by default).
+
+        Args:
+            positions (list, optional): Row positions
+            docs (list, optional): Document columns
+
+        Returns:
+            DataFrame: Label columns followed by the document columns
+        """
+        positions = list(range(len(self.labels))) if positions is None else list(positions)
+        docs = list(self.doc_columns) if docs is None else list(docs)
+
+        frame = self.labels.iloc[positions].copy()
+        columns = {doc: self.column(doc).to_numpy()[positions] for doc in docs}
+        return pd.concat([frame, pd.DataFrame(columns, index=frame.index, dtype=object)], axis=1)
+
+    def search_cells(self, query: str, positions=None, limit: int = None) -> list:
+        """
+        Text cells matching a full-text query, best match first.
+
+        Args:
+            query (str): FTS5 query, e.g. 'acrolein', '"vitamin e"', 'formald*',
+                'nicotine NOT menthol'; text that is not valid FTS5 syntax
+                (e.g. 'vitamin-e') is searched word by word (see fts_literal_query)
+            positions (iterable, optional): Only search these field rows
+            limit (int, optional): Maximum number of hits
+
+        Returns:
+            list: (doc, row position, value) tuples ordered by bm25 rank
+
+        Raises:
+            ValueError: If the query matches nothing searchable even as plain words
+        """
+        sql = ("SELECT cells.doc_id, cells.field_id, cells.value FROM cells_fts "
+               "JOIN cells ON cells.cell_id = cells_fts.rowid WHERE cells_fts MATCH ?")
+        parameters = []
+        if positions is not None:
+            positions = sorted(set(positions))
+            if not positions:
+                return []
+            sql += f" AND cells.field_id IN ({','.join('?' * len(positions))})"
+            parameters.extend(positions)
+        sql += " ORDER BY bm25(cells_fts)"
+        if limit is not None:
+            sql += " LIMIT ?"
+            parameters.append(int(limit))
+
+        try:
+            rows = self._query(sql, [query] + parameters)
+        except sqlite3.OperationalError:
+            literal = fts_literal_query(query)
+            if not literal:
+                return []
+            try:
+                rows = self._query(sql, [literal] + parameters)
+            except sqlite3.OperationalError as e:
+                raise ValueError(f"invalid search query {query!r}: {e}") from e
+
+        return [(self.doc_columns[doc_id], field_id, value) for doc_id, field_id, value in rows]
+
+    def search(self, query: str, positions=None) -> list:
+        """
+        Documents with at least one text cell matching a full-text query.
+
+        Args:
+            query (str): FTS5 query (see search_cells)
+            positions (iterable, optional): Only search these field rows
+
+        Returns:
+            list: Document column names in corpus order
+        """
+        docs = {doc for doc, _, _ in self.search_cells(query, positions)}
+        return [doc for doc in self.doc_columns if doc in docs]
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the database file (mapped and shared, not held per process)."""
+        return os.path.getsize(self.db_path)
+
+
+# Storage backend name -> cell store class (see CorpusSnapshot)
+CELL_STORES = {
+    "dense": DenseCells,
+    "sparse": SparseCells,
+    "sqlite": SqliteCells,
+}
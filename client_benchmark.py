@@ -0,0 +1,133 @@
+"""
+Benchmark OpenAI client reuse: a new client per request vs. the pooled clients.
+
+Starts a local stub of the chat completions endpoint that answers every
+request with a canned completion after --latency-ms, and charges every new
+connection --handshake-ms before it is served (standing in for the TCP and
+TLS handshakes to api.openai.com). Sends the same requests through both
+client modes, one at a time and --concurrency at a time, and reports wall
+time, mean latency and connections opened.
+
+    python client_benchmark.py [--requests N] [--concurrency C] [--handshake-ms MS] [--latency-ms MS]
+
+Modes:
+    per-call   AsyncOpenAI created for every request and closed afterwards
+    pooled     openai_clients.get_async_client (shared keep-alive pool)
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MODES = ("per-call", "pooled")
+
+COMPLETION = {
+    "id": "chatcmpl-stub",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "gpt-4.1",
+    "choices": [{"index": 0, "finish_reason": "stop",
+                 "message": {"role": "assistant", "content": "- Stub insight"}}],
+    "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Keep-alive HTTP/1.1 stub of POST /v1/chat/completions."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+        time.sleep(self.server.handshake_seconds)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.server.latency_seconds)
+        body = json.dumps(COMPLETION).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(handshake_ms: float, latency_ms: float) -> ThreadingHTTPServer:
+    """Serve the stub on a free local port from a daemon thread."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.connections = 0
+    server.handshake_seconds = handshake_ms / 1000
+    server.latency_seconds = latency_ms / 1000
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def request(mode: str, api_key: str) -> float:
+    """Send one chat completion request and return its latency in seconds."""
+    from openai import AsyncOpenAI
+    from openai_clients import get_async_client
+
+    start = time.perf_counter()
+    if mode == "pooled":
+        await get_async_client(api_key).chat.completions.create(
+            model="gpt-4.1", messages=[{"role": "user", "content": "ping"}])
+    else:
+        client = AsyncOpenAI(api_key=api_key)
+        try:
+            await client.chat.completions.create(model="gpt-4.1", messages=[{"role": "user", "content": "ping"}])
+        finally:
+            await client.close()
+    return time.perf_counter() - start
+
+
+async def run(mode: str, requests: int, concurrency: int) -> tuple:
+    """Send requests at most concurrency at a time; returns (wall seconds, latencies)."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited():
+        async with semaphore:
+            return await request(mode, "sk-benchmark")
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(limited() for _ in range(requests)))
+    return time.perf_counter() - start, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=100, help="requests per mode and run")
+    parser.add_argument("--concurrency", type=int, default=8, help="requests in flight in the concurrent run")
+    parser.add_argument("--handshake-ms", type=float, default=30,
+                        help="delay charged to every new connection")
+    parser.add_argument("--latency-ms", type=float, default=5, help="server time of every request")
+    args = parser.parse_args()
+
+    server = start_stub_server(args.handshake_ms, args.latency_ms)
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    try:
+        for concurrency in (1, args.concurrency):
+            for mode in MODES:
+                # Fresh event loop per run, so the pooled run starts without open connections
+                connections = server.connections
+                seconds, latencies = asyncio.run(run(mode, args.requests, concurrency))
+                print(f"{mode:<9} concurrency {concurrency:>3}  {seconds:>7.2f}s"
+                      f"  mean {1000 * sum(latencies) / len(latencies):>7.1f} ms/request"
+                      f"  {server.connections - connections:>4} connections")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1235 @@
+import os
+import sys
+import re
+import json
+import hashlib
+import tempfile
+import threading
+from collections import defaultdict
+from functools import wraps
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from cell_store import CELL_STORES, CORPUS_DB_PATH, LABEL_COLUMNS, SparseCells, SqliteCells
+from country_index import COUNTRY_FIELD, parse_country_codes
+
+
+# Default locations of the metadata workbook and its compiled snapshot
+WORKBOOK_PATH = "E_Cigarette_Research_Metadata_Consolidated.xlsx"
+SNAPSHOT_PATH = os.path.join("corpus_snapshot", "corpus.arrow")
+
+# Bump whenever the on-disk snapshot layout changes so stale files are rebuilt
+SNAPSHOT_FORMAT_VERSION = "1"
+
+# Cell storage: "dense" (wide frame), "sparse" (populated cells only) or
+# "sqlite" (SQLite database at CORPUS_DB_PATH, shared by worker processes)
+CORPUS_STORAGE = os.environ.get("CORPUS_STORAGE", "dense")
+
+# Workbook parser used on a snapshot miss: "pandas" (pd.read_excel into a wide
+# frame) or "streaming" (openpyxl read-only, row by row into sparse cells)
+WORKBOOK_READER = os.environ.get("WORKBOOK_READER", "pandas")
+
+# Strings pd.read_excel reads as missing cells by default
+EXCEL_NA_VALUES = frozenset([
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+])
+
+# Excel error values, read as missing cells like pd.read_excel does
+EXCEL_ERROR_VALUES = frozenset(["#NULL!", "#DIV/0!", "#VALUE!", "#REF!", "#NAME?", "#NUM!", "#N/A"])
+
+
+def compute_workbook_hash(workbook_path: str = WORKBOOK_PATH) -> str:
+    """
+    Compute the SHA-256 content hash of the metadata workbook.
+
+    Args:
+        workbook_path (str): Path to the Excel workbook
+
+    Returns:
+        str: Hex digest of the workbook bytes
+    """
+    digest = hashlib.sha256()
+    with open(workbook_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _encode_cells(df: pd.DataFrame):
+    """
+    Split the wide frame into an all-string frame plus the few typed cells.
+
+    Arrow columns must have a single type, but the workbook mixes strings with
+    the odd int, float or date. Every cell is stored as a string and the
+    non-string cells are recorded separately so they can be restored on load.
+
+    Returns:
+        tuple: (string-only DataFrame, list of [row, col, kind, value])
+    """
+    values = df.to_numpy(dtype=object, copy=True)
+    typed_cells = []
+
+    for row_idx, col_idx in zip(*np.nonzero(pd.notna(values))):
+        value = values[row_idx, col_idx]
+        if isinstance(value, str):
+            continue
+        _record_typed_cell(typed_cells, row_idx, col_idx, value)
+        values[row_idx, col_idx] = str(value)
+
+    string_df = pd.DataFrame(values, columns=[str(col) for col in df.columns])
+    return string_df, typed_cells
+
+
+def _record_typed_cell(typed_cells: list, row_idx, col_idx, value):
+    """Append a non-string cell as [row, col, kind, JSON value]."""
+    if isinstance(value, (bool, np.bool_)):
+        typed_cells.append([int(row_idx), int(col_idx), "bool", bool(value)])
+    elif isinstance(value, (int, np.integer)):
+        typed_cells.append([int(row_idx), int(col_idx), "int", int(value)])
+    elif isinstance(value, (float, np.floating)):
+        typed_cells.append([int(row_idx), int(col_idx), "float", float(value)])
+    elif isinstance(value, datetime):
+        typed_cells.append([int(row_idx), int(col_idx), "datetime", value.isoformat()])
+
+
+def _encode_store(cells):
+    """
+    Same encoding as _encode_cells, built column by column from a cell store.
+
+    Only one column is materialized at a time, so the wide frame is never
+    held in memory.
+
+    Returns:
+        tuple: (pyarrow Table of string columns, list of [row, col, kind, value])
+    """
+    import pyarrow as pa
+
+    columns = list(cells.labels.columns) + list(cells.doc_columns)
+    arrays = []
+    typed_cells = []
+
+    for col_idx, column in enumerate(columns):
+        if col_idx < LABEL_COLUMNS:
+            values = cells.labels[column].tolist()
+        else:
+            values = cells.column(column).tolist()
+
+        strings = []
+        for row_idx, value in enumerate(values):
+            if isinstance(value, str):
+                strings.append(value)
+            elif value is None or pd.isna(value):
+                strings.append(None)
+            else:
+                _record_typed_cell(typed_cells, row_idx, col_idx, value)
+                strings.append(str(value))
+        arrays.append(pa.array(strings, type=pa.string()))
+
+    table = pa.Table.from_arrays(arrays, names=[str(column) for column in columns])
+    return table, typed_cells
+
+
+def _decode_cells(df: pd.DataFrame, typed_cells):
+    """Restore missing values as NaN and put typed cells back in place."""
+    df = df.astype(object)
+    df = df.where(df.notna(), np.nan)
+
+    for row_idx, col_idx, kind, value in typed_cells:
+        if kind == "datetime":
+            value = pd.Timestamp(value).to_pydatetime()
+        elif kind == "int":
+            value = int(value)
+        elif kind == "float":
+            value = float(value)
+        elif kind == "bool":
+            value = bool(value)
+        df.iat[row_idx, col_idx] = value
+
+    return df
+
+
+def _excel_column_names(header) -> list:
+    """Column names of a header row, filled in and de-duplicated like pd.read_excel."""
+    names = []
+    counts = defaultdict(int)
+    for i, name in enumerate(header):
+        if name is None or name == "":
+            name = f"Unnamed: {i}"
+        elif isinstance(name, float) and name.is_integer():
+            name = int(name)
+
+        # "Paper", "Paper" -> "Paper", "Paper.1"
+        count = counts[name]
+        while count > 0:
+            counts[name] = count + 1
+            name = f"{name}.{count}"
+            count = counts[name]
+        names.append(name)
+        counts[name] = count + 1
+    return names
+
+
+def _excel_value(value):
+    """Convert one raw openpyxl value the way pd.read_excel does (None if missing)."""
+    if isinstance(value, str):
+        if value in EXCEL_NA_VALUES or value in EXCEL_ERROR_VALUES:
+            return None
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _excel_rows(rows, width: int):
+    """Converted data rows of width cells; fully blank rows are skipped."""
+    dropped = False
+    for row in rows:
+        if all(value is None or value == "" for value in row):
+            continue
+        if not dropped and any(value is not None for value in row[width:]):
+            print(f"Warning: ignoring workbook cells beyond the {width} header columns")
+            dropped = True
+
+        values = [_excel_value(value) for value in row[:width]]
+        if len(values) < width:
+            values.extend([None] * (width - len(values)))
+        yield values
+
+
+def stream_workbook_cells(workbook_path: str = WORKBOOK_PATH) -> SparseCells:
+    """
+    Read the first sheet of the workbook row by row into sparse cell storage.
+
+    Uses openpyxl in read-only mode, so rows are parsed from the sheet XML
+    one at a time and only the populated cells are kept. Unlike
+    pd.read_excel, no list-of-rows copy of the sheet and no wide frame are
+    ever built. Cells come out like pd.read_excel reads them: blank rows are
+    skipped, the default NA strings and Excel errors become missing cells,
+    integral numbers become ints and header names are made unique.
+
+    Args:
+        workbook_path (str): Path to the Excel workbook
+
+    Returns:
+        SparseCells: The corpus cells
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(workbook_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+
+        header = ()
+        for row in rows:
+            if any(value is not None and value != "" for value in row):
+                header = row
+                break
+        # Trailing empty header cells are not columns
+        width = len(header)
+        while width and (header[width - 1] is None or header[width - 1] == ""):
+            width -= 1
+
+        return SparseCells.from_rows(_excel_column_names(header[:width]), _excel_rows(rows, width))
+    finally:
+        workbook.close()
+
+
+def build_snapshot(workbook_path: str = WORKBOOK_PATH, snapshot_path: str = SNAPSHOT_PATH,
+                   df: pd.DataFrame = None, workbook_hash: str = None, cells=None) -> str:
+    """
+    Compile the metadata workbook into a columnar Arrow snapshot.
+
+    The snapshot is an uncompressed Arrow IPC file so it can be memory-mapped
+    on load. The workbook content hash is stored in the schema metadata and
+    used to detect stale snapshots.
+
+    Args:
+        workbook_path (str): Path to the Excel workbook
+        snapshot_path (str): Destination of the compiled snapshot
+        df (DataFrame, optional): Already parsed workbook, to avoid a second parse
+        workbook_hash (str, optional): Precomputed workbook hash
+        cells (optional): Already parsed workbook as a cell store (written
+            column by column instead of through a wide frame)
+
+    Returns:
+        str: The workbook hash the snapshot was built from
+    """
+    import pyarrow as pa
+    import pyarrow.ipc
+
+    if workbook_hash is None:
+        workbook_hash = compute_workbook_hash(workbook_path)
+    if df is None and cells is None:
+        if WORKBOOK_READER == "streaming":
+            cells = stream_workbook_cells(workbook_path)
+        else:
+            df = pd.read_excel(workbook_path)
+
+    if df is not None:
+        string_df, typed_cells = _encode_cells(df)
+        table = pa.Table.from_pandas(string_df, preserve_index=False)
+    else:
+        table, typed_cells = _encode_store(cells)
+
+    metadata = dict(table.schema.metadata or {})
+    metadata.update({
+        b"workbook_sha256": workbook_hash.encode(),
+        b"format_version": SNAPSHOT_FORMAT_VERSION.encode(),
+        b"typed_cells": json.dumps(typed_cells).encode(),
+    })
+    table = table.replace_schema_metadata(metadata)
+
+    snapshot_dir = os.path.dirname(snapshot_path)
+    if snapshot_dir:
+        os.makedirs(snapshot_dir, exist_ok=True)
+
+    # Write to a temporary file first so readers never see a half-written snapshot
+    tmp_path = f"{snapshot_path}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, snapshot_path)
+
+    return workbook_hash
+
+
+def load_snapshot(snapshot_path: str = SNAPSHOT_PATH, expected_hash: str = None):
+    """
+    Memory-map a compiled snapshot and return it as a DataFrame.
+
+    Args:
+        snapshot_path (str): Path to the compiled snapshot
+        expected_hash (str, optional): Workbook hash the snapshot must match
+
+    Returns:
+        DataFrame or None: The corpus frame, or None if the snapshot is missing,
+        stale, or pyarrow is not installed
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc
+    except ImportError:
+        return None
+
+    if not os.path.exists(snapshot_path):
+        return None
+
+    try:
+        with pa.memory_map(snapshot_path, "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+
+            metadata = table.schema.metadata or {}
+            if metadata.get(b"format_version", b"").decode() != SNAPSHOT_FORMAT_VERSION:
+                return None
+            if expected_hash and metadata.get(b"workbook_sha256", b"").decode() != expected_hash:
+                return None
+
+            typed_cells = json.loads(metadata.get(b"typed_cells", b"[]"))
+            df = table.to_pandas()
+    except (OSError, pa.ArrowInvalid) as e:
+        print(f"Warning: could not read corpus snapshot '{snapshot_path}': {e}")
+        return None
+
+    return _decode_cells(df, typed_cells)
+
+
+def load_corpus_frame(workbook_path: str = WORKBOOK_PATH, snapshot_path: str = SNAPSHOT_PATH,
+                      workbook_hash: str = None) -> pd.DataFrame:
+    """
+    Load the research metadata frame, preferring the compiled snapshot.
+
+    Falls back to parsing the workbook when the snapshot is missing or its
+    content hash no longer matches, and refreshes the snapshot in that case.
+
+    Args:
+        workbook_path (str): Path to the Excel workbook
+        snapshot_path (str): Path to the compiled snapshot
+        workbook_hash (str, optional): Precomputed workbook hash
+
+    Returns:
+        DataFrame: The wide field x paper metadata frame
+    """
+    if workbook_hash is None:
+        workbook_hash = compute_workbook_hash(workbook_path)
+
+    df = load_snapshot(snapshot_path, expected_hash=workbook_hash)
+    if df is not None:
+        return df
+
+    df = pd.read_excel(workbook_path)
+    _refresh_snapshot(workbook_path, snapshot_path, workbook_hash, df=df)
+    return df
+
+
+def load_corpus_cells(workbook_path: str = WORKBOOK_PATH, snapshot_path: str = SNAPSHOT_PATH,
+                      workbook_hash: str = None, storage: str = CORPUS_STORAGE,
+                      reader: str = WORKBOOK_READER):
+    """
+    Load the corpus cell store, preferring the compiled snapshot.
+
+    With the "pandas" reader this is load_corpus_frame in the requested
+    storage backend. The "streaming" reader parses a changed workbook with
+    stream_workbook_cells and writes the snapshot column by column, so peak
+    memory stays close to the populated cells instead of fields x papers.
+
+    The "sqlite" backend opens the corpus database directly when it matches
+    the workbook, without loading any cells; otherwise it is rebuilt from
+    the cells loaded with the chosen reader.
+
+    Args:
+        workbook_path (str): Path to the Excel workbook
+        snapshot_path (str): Path to the compiled snapshot
+        workbook_hash (str, optional): Precomputed workbook hash
+        storage (str): Cell storage backend (a key of CELL_STORES)
+        reader (str): "pandas" or "streaming"
+
+    Returns:
+        DenseCells, SparseCells or SqliteCells: The corpus cells
+    """
+    if storage == "sqlite":
+        if workbook_hash is None:
+            workbook_hash = compute_workbook_hash(workbook_path)
+        cells = SqliteCells.open(CORPUS_DB_PATH, expected_hash=workbook_hash)
+        if cells is not None:
+            return cells
+        source = load_corpus_cells(workbook_path, snapshot_path, workbook_hash,
+                                   storage="sparse" if reader == "streaming" else "dense", reader=reader)
+        return SqliteCells.build(source, CORPUS_DB_PATH, content_hash=workbook_hash)
+
+    if reader == "pandas":
+        return CELL_STORES[storage].from_frame(load_corpus_frame(workbook_path, snapshot_path, workbook_hash))
+    if reader != "streaming":
+        raise ValueError(f"Unknown workbook reader '{reader}' (expected 'pandas' or 'streaming')")
+
+    if workbook_hash is None:
+        workbook_hash = compute_workbook_hash(workbook_path)
+
+    df = load_snapshot(snapshot_path, expected_hash=workbook_hash)
+    if df is not None:
+        return CELL_STORES[storage].from_frame(df)
+
+    cells = stream_workbook_cells(workbook_path)
+    _refresh_snapshot(workbook_path, snapshot_path, workbook_hash, cells=cells)
+    if storage != "sparse":
+        return CELL_STORES[storage].from_frame(cells.to_frame())
+    return cells
+
+
+def _refresh_snapshot(workbook_path: str, snapshot_path: str, workbook_hash: str, **parsed):
+    """Rewrite the snapshot from a freshly parsed workbook, if pyarrow is available."""
+    try:
+        build_snapshot(workbook_path, snapshot_path, workbook_hash=workbook_hash, **parsed)
+    except ImportError:
+        pass  # pyarrow not installed - keep serving straight from Excel
+    except OSError as e:
+        print(f"Warning: could not write corpus snapshot '{snapshot_path}': {e}")
+
+
+class FieldIndex:
+    """
+    Hash index from field keys to row positions in the corpus frame.
+
+    Replaces the repeated df[df['Category'] == x] scans: each lookup is a dict
+    access instead of a string comparison over every row. Row positions are
+    kept in frame order, so "first matching row" semantics are unchanged.
+
+    Keys:
+        by_category:    Category -> positions
+        by_subcategory: SubCategory -> positions
+        by_pair:        (Category, SubCategory) -> positions
+        by_path:        dotted path "Category.SubCategory" (or just Category
+                        when the row has no SubCategory) -> positions
+
+    paths holds the dotted path of every row (None without a Category).
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        by_category = defaultdict(list)
+        by_subcategory = defaultdict(list)
+        by_pair = defaultdict(list)
+        by_path = defaultdict(list)
+        paths = []
+
+        categories = df["Category"] if "Category" in df.columns else pd.Series(np.nan, index=df.index)
+        subcategories = df["SubCategory"] if "SubCategory" in df.columns else pd.Series(np.nan, index=df.index)
+
+        for pos, (category, subcategory) in enumerate(zip(categories, subcategories)):
+            has_category = pd.notna(category)
+            has_subcategory = pd.notna(subcategory)
+            if has_category:
+                by_category[category].append(pos)
+            if has_subcategory:
+                by_subcategory[subcategory].append(pos)
+            if has_category and has_subcategory:
+                by_pair[(category, subcategory)].append(pos)
+            if has_category:
+                if has_subcategory and subcategory != "-":
+                    path = f"{category}.{subcategory}"
+                else:
+                    path = str(category)
+                by_path[path].append(pos)
+                paths.append(path)
+            else:
+                paths.append(None)
+
+        self.by_category = {key: tuple(value) for key, value in by_category.items()}
+        self.by_subcategory = {key: tuple(value) for key, value in by_subcategory.items()}
+        self.by_pair = {key: tuple(value) for key, value in by_pair.items()}
+        self.by_path = {key: tuple(value) for key, value in by_path.items()}
+        self.paths = tuple(paths)
+
+    def positions(self, category=None, subcategory=None, path=None) -> tuple:
+        """
+        Return the row positions matching a field key.
+
+        Args:
+            category (str, optional): Exact Category value
+            subcategory (str, optional): Exact SubCategory value
+            path (str, optional): Dotted field path, e.g. "harmful_ingredients.name"
+
+        Returns:
+            tuple: Row positions in frame order (empty if nothing matches)
+        """
+        if path is not None:
+            return self.by_path.get(path, ())
+        if category is not None and subcategory is not None:
+            return self.by_pair.get((category, subcategory), ())
+        if category is not None:
+            return self.by_category.get(category, ())
+        if subcategory is not None:
+            return self.by_subcategory.get(subcategory, ())
+        return ()
+
+
+def _memoized(method):
+    """
+    Cache a method's results on its instance (in self._memo).
+
+    Unlike functools.lru_cache on a method, whose cache lives on the class and
+    keeps every instance alive, the cache is dropped with the instance, e.g.
+    the resolver of a corpus replaced by a reload.
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        key = (method.__name__, args, tuple(sorted(kwargs.items())))
+        try:
+            return self._memo[key]
+        except KeyError:
+            result = self._memo[key] = method(self, *args, **kwargs)
+            return result
+    return wrapper
+
+
+class FieldResolver:
+    """
+    Compiles field names from the category specs (see prompts_and_categories.py)
+    into row positions, once per corpus.
+
+    Each extraction helper historically resolved names with its own chain of
+    exact and str.contains matches on Category and SubCategory, repeated for
+    every document. The methods below reproduce each chain exactly but run it
+    once per name; the helpers then gather cells at the resulting positions
+    with CorpusSnapshot.values_at / value_at.
+    """
+
+    def __init__(self, snapshot):
+        df = snapshot.labels
+        self._index = snapshot.field_index
+        self._categories = df["Category"] if "Category" in df.columns else None
+        self._subcategories = df["SubCategory"] if "SubCategory" in df.columns else None
+        self._memo = {}
+
+    @staticmethod
+    def _contains(column, pattern, regex=True) -> tuple:
+        """Row positions where column.str.contains(pattern) holds."""
+        if column is None:
+            return ()
+        return tuple(np.flatnonzero(column.str.contains(pattern, na=False, regex=regex).to_numpy()).tolist())
+
+    @_memoized
+    def insight_rows(self, name: str) -> tuple:
+        """
+        Rows for extract_research_insights_from_docs: exact Category, Category
+        contains, exact SubCategory, then SubCategory contains.
+        """
+        positions = self._index.positions(category=name)
+        if not positions:
+            positions = self._contains(self._categories, name)
+        if not positions and self._subcategories is not None:
+            positions = self._index.positions(subcategory=name)
+            if not positions:
+                positions = self._contains(self._subcategories, name)
+        return tuple(positions)
+
+    @_memoized
+    def comprehensive_rows(self, name: str) -> tuple:
+        """
+        Rows for generate_comprehensive_paper_insights.
+
+        Dotted names ("base.rest") match Category containing base and SubCategory
+        containing rest, falling back to SubCategory == rest. Plain names match
+        Category exactly, falling back to SubCategory exactly.
+        """
+        if '.' in name:
+            parts = name.split('.')
+            base_category = parts[0]
+            sub_parts = '.'.join(parts[1:])
+
+            category_positions = self._contains(self._categories, base_category)
+            if category_positions:
+                sub_matches = set(self._contains(self._subcategories, sub_parts, regex=False))
+                positions = tuple(pos for pos in category_positions if pos in sub_matches)
+                if positions:
+                    return positions
+            return self._index.positions(subcategory=sub_parts)
+
+        return self._index.positions(category=name) or self._index.positions(subcategory=name)
+
+    @_memoized
+    def feature_candidates(self, name: str) -> tuple:
+        """
+        Candidate rows for get_feature_data_for_papers, in the order to try them.
+
+        An exact SubCategory or Category match yields its first row only. Dotted
+        names yield the first row whose Category contains the base (as a regex,
+        then literally) and whose SubCategory contains the rest; the second
+        candidate is only used when the first cell is empty.
+        """
+        if self._index.by_subcategory.get(name):
+            return self._index.by_subcategory[name][:1]
+        if self._index.by_category.get(name):
+            return self._index.by_category[name][:1]
+        if '.' not in name:
+            return ()
+
+        parts = name.split('.')
+        base_category = parts[0]
+        sub_parts = '.'.join(parts[1:])
+        sub_positions = set(self._contains(self._subcategories, sub_parts, regex=False))
+
+        candidates = []
+        for regex in (True, False):
+            positions = [pos for pos in self._contains(self._categories, base_category, regex=regex)
+                         if pos in sub_positions]
+            if positions:
+                candidates.append(positions[0])
+        return tuple(candidates)
+
+    @_memoized
+    def value_row(self, category: str, subcategory: str = None):
+        """
+        First row for get_value_for_papers, or None.
+
+        With a subcategory: exact pair, then Category contains + exact
+        SubCategory, then both contains. Without: exact Category, then
+        Category contains.
+        """
+        if subcategory:
+            positions = self._index.positions(category=category, subcategory=subcategory)
+            if not positions:
+                category_matches = set(self._contains(self._categories, category))
+                positions = [pos for pos in self._index.positions(subcategory=subcategory)
+                             if pos in category_matches]
+            if not positions:
+                sub_matches = set(self._contains(self._subcategories, subcategory))
+                positions = [pos for pos in self._contains(self._categories, category)
+                             if pos in sub_matches]
+        else:
+            positions = self._index.positions(category=category)
+            if not positions:
+                positions = self._contains(self._categories, category)
+
+        return positions[0] if positions else None
+
+    def plan(self, strategy: str, categories: dict) -> tuple:
+        """
+        Compile a category spec into a cached resolution plan.
+
+        Args:
+            strategy (str): "insights" or "comprehensive", selecting the
+                fallback chain of the calling helper
+            categories (dict): Main category -> list of field names
+
+        Returns:
+            tuple: ((main_category, ((field_name, positions), ...)), ...)
+        """
+        spec = tuple((main_category, tuple(fields)) for main_category, fields in categories.items())
+        return self._compile(strategy, spec)
+
+    @_memoized
+    def _compile(self, strategy: str, spec: tuple) -> tuple:
+        resolve = {"insights": self.insight_rows, "comprehensive": self.comprehensive_rows}[strategy]
+        return tuple(
+            (main_category, tuple((name, resolve(name)) for name in fields))
+            for main_category, fields in spec
+        )
+
+
+# Integer per-document facets: facet name -> field key in the corpus
+RANGE_FACETS = {
+    "year": {"category": "publication_year"},
+    "sample_size": {"subcategory": "total_size"},
+}
+
+# Categorical per-document facets: facet name -> field key in the corpus
+CATEGORICAL_FACETS = {
+    "publication_type": {"category": "publication_type"},
+    "funding_type": {"subcategory": "type"},
+    "study_design": {"subcategory": "primary_type"},
+}
+
+
+def parse_int_facet(values: pd.Series) -> pd.Series:
+    """
+    Vectorized int(float(x)) for a column of raw cells.
+
+    Args:
+        values (Series): Raw cell values (strings, numbers or NaN)
+
+    Returns:
+        Series: Nullable Int64 values; missing or unparseable cells become <NA>
+    """
+    numbers = pd.to_numeric(values.astype(str).str.strip(), errors="coerce")
+    numbers = numbers.where(np.isfinite(numbers))
+    return np.trunc(numbers).astype("Int64")
+
+
+def build_doc_facets(snapshot) -> pd.DataFrame:
+    """
+    Build the DocFacets table: one typed row per document column.
+
+    Columns:
+        year (Int64):               publication_year
+        sample_size (Int64):        sample_characteristics total_size
+        publication_type (category)
+        funding_type (category):    funding_source type
+        study_design (category):    study_design primary_type
+        country_codes (object):     ISO alpha-3 codes of country_of_study
+
+    Each facet is taken from the first row of its field, matching the
+    per-document lookups it replaces. Missing or unparseable values are NA.
+
+    Args:
+        snapshot (CorpusSnapshot): Corpus to build the table from
+
+    Returns:
+        DataFrame: Facet table indexed by document column name
+    """
+    docs = pd.Index(snapshot.doc_columns, name="doc")
+
+    def first_row(**key):
+        positions = snapshot.field_index.positions(**key)
+        if not positions:
+            return pd.Series(np.nan, index=docs, dtype=object)
+        return snapshot.cells.row(positions[0])
+
+    facets = pd.DataFrame(index=docs)
+    for name, key in RANGE_FACETS.items():
+        facets[name] = parse_int_facet(first_row(**key))
+
+    for name, key in CATEGORICAL_FACETS.items():
+        values = first_row(**key)
+        values = values[values.notna()].astype(str)
+        values = values[values != ""]
+        facets[name] = values.reindex(docs).astype("category")
+
+    facets["country_codes"] = [parse_country_codes(value) for value in first_row(**COUNTRY_FIELD)]
+
+    return facets
+
+
+# Separator of numbered-list cells such as "1) Formaldehyde, 2) Acrolein"
+NUMBERED_ITEM_SEPARATOR = re.compile(r'\d+\)\s+')
+
+
+def parse_numbered_list(text) -> list:
+    """
+    Split a numbered-list cell ("1) X, 2) Y") into its items.
+
+    Args:
+        text: Raw cell value
+
+    Returns:
+        list: Item texts without numbering or trailing commas (empty for
+        non-strings and cells without numbered items)
+    """
+    if not isinstance(text, str):
+        return []
+
+    # First part is the text before "1) ", usually empty
+    parts = NUMBERED_ITEM_SEPARATOR.split(text)
+    return [part.strip().rstrip(',') for part in parts[1:] if part.strip()]
+
+
+def build_list_items(snapshot) -> pd.DataFrame:
+    """
+    Build the ListItems table: every numbered-list cell exploded into rows.
+
+    Columns:
+        doc (category):     document column name
+        field (category):   dotted field path, e.g. "harmful_ingredients.name"
+        item_index (int):   0-based position of the item in its cell
+        item_text (str):    item as returned by parse_numbered_list
+
+    Each field is taken from its first row, matching CorpusSnapshot.value.
+    Rows are ordered by field (frame order), document (corpus order) and item.
+
+    Args:
+        snapshot (CorpusSnapshot): Corpus to build the table from
+
+    Returns:
+        DataFrame: Long item table
+    """
+    docs, fields, item_indexes, item_texts = [], [], [], []
+    for field, positions in snapshot.field_index.by_path.items():
+        for doc, text in snapshot.cells.row_items(positions[0]):
+            if not isinstance(text, str) or ')' not in text:
+                continue
+            for item_index, item_text in enumerate(parse_numbered_list(text)):
+                docs.append(doc)
+                fields.append(field)
+                item_indexes.append(item_index)
+                item_texts.append(item_text)
+
+    return pd.DataFrame({
+        "doc": pd.Categorical(docs, categories=list(snapshot.doc_columns)),
+        "field": pd.Categorical(fields, categories=list(snapshot.field_index.by_path)),
+        "item_index": np.asarray(item_indexes, dtype=np.int64),
+        "item_text": pd.Series(item_texts, dtype=object),
+    })
+
+
+def build_list_item_lookup(snapshot) -> dict:
+    """(field, doc) -> tuple of item texts, for per-document item lookups."""
+    items = snapshot.list_items
+    lookup = defaultdict(list)
+    for field, doc, item_text in zip(items["field"], items["doc"], items["item_text"]):
+        lookup[(field, doc)].append(item_text)
+    return {key: tuple(value) for key, value in lookup.items()}
+
+
+# Leading list numbering such as "1) ", "2. " or "3 - " in a text cell
+NUMBERING_PREFIX = re.compile(r'^\s*\d+[\)\.:\-\s]+\s*')
+
+
+def strip_numbering(text: str) -> str:
+    """Strip surrounding whitespace and a leading list number from a text."""
+    return NUMBERING_PREFIX.sub('', text.strip())
+
+
+class NormalizedText:
+    """
+    Cleaned variants of every text cell, computed once at load time.
+
+    For each distinct string in the corpus it keeps:
+
+        clean       the value without surrounding whitespace or a leading
+                    list number ("1) Nicotine" -> "Nicotine")
+        clean_list  every comma-separated part cleaned the same way and
+                    rejoined with ", " (the raw value if no part is left)
+        word_count  number of whitespace-separated words of clean
+
+    Render paths look cells up here instead of running the regex per cell
+    per rerun. Values that are not in the corpus (defaults, titles typed by
+    hand, ...) are cleaned on the fly, so any string is accepted.
+
+    Args:
+        cells: Cell store of the corpus (DenseCells or SparseCells)
+    """
+
+    def __init__(self, cells):
+        self._clean = {}
+        self._clean_list = {}
+        self._word_counts = {}
+        for value in cells.text_values():
+            if value in self._clean:
+                continue
+            clean, clean_list, word_count = self._normalize(value)
+            # Most cells are already clean - keep a reference instead of a copy
+            self._clean[value] = value if clean == value else clean
+            self._clean_list[value] = value if clean_list == value else clean_list
+            self._word_counts[value] = word_count
+
+    @staticmethod
+    def _normalize(value: str) -> tuple:
+        """(clean, clean_list, word_count) of one string."""
+        clean = strip_numbering(value)
+        parts = [part for part in (strip_numbering(item) for item in value.split(',')) if part]
+        clean_list = ', '.join(parts) if parts else value
+        return clean, clean_list, len(clean.split())
+
+    def clean(self, value):
+        """Cleaned text of a string value (other values are returned as is)."""
+        if not isinstance(value, str):
+            return value
+        clean = self._clean.get(value)
+        return clean if clean is not None else self._normalize(value)[0]
+
+    def clean_list(self, value):
+        """Comma-separated parts of a string value, each cleaned."""
+        if not isinstance(value, str):
+            return value
+        clean_list = self._clean_list.get(value)
+        return clean_list if clean_list is not None else self._normalize(value)[1]
+
+    def word_count(self, value) -> int:
+        """Number of words of the cleaned value (0 for non-strings)."""
+        if not isinstance(value, str):
+            return 0
+        word_count = self._word_counts.get(value)
+        return word_count if word_count is not None else self._normalize(value)[2]
+
+
+class CorpusSnapshot:
+    """
+    Immutable, process-wide view of the research corpus.
+
+    A single instance is shared by every session (see load_corpus in the main
+    app), so the cells are held in memory once. Helpers receive this object
+    instead of a raw DataFrame and must treat its data as read-only.
+    Derived tables are built lazily, once per process, through derived().
+
+    Cells live in a cell store (see cell_store.py): "dense" keeps the wide
+    frame, "sparse" keeps only the populated cells. Lookups go through the
+    same API either way; only the df property has to materialize the wide
+    frame for the sparse backend. Pass either the wide frame or a prebuilt
+    cell store (cells), e.g. from stream_workbook_cells.
+    """
+
+    def __init__(self, df: pd.DataFrame = None, content_hash: str = None, storage: str = CORPUS_STORAGE,
+                 cells=None):
+        if cells is None:
+            cells = CELL_STORES[storage].from_frame(df)
+        object.__setattr__(self, "_cells", cells)
+        object.__setattr__(self, "_storage", cells.storage)
+        object.__setattr__(self, "_content_hash", content_hash)
+        object.__setattr__(self, "_doc_columns", cells.doc_columns)
+        object.__setattr__(self, "_derived", {})
+        object.__setattr__(self, "_builders", {})
+        object.__setattr__(self, "_lock", threading.RLock())
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CorpusSnapshot is read-only")
+
+    @classmethod
+    def from_workbook(cls, workbook_path: str = WORKBOOK_PATH, snapshot_path: str = SNAPSHOT_PATH,
+                      storage: str = CORPUS_STORAGE, reader: str = WORKBOOK_READER):
+        """Load the corpus from its snapshot (or the workbook) and wrap it."""
+        workbook_hash = compute_workbook_hash(workbook_path)
+        cells = load_corpus_cells(workbook_path, snapshot_path, workbook_hash, storage=storage, reader=reader)
+        return cls(content_hash=workbook_hash, cells=cells)
+
+    @property
+    def df(self) -> pd.DataFrame:
+        """
+        The wide field x paper frame (shared - do not mutate).
+
+        With sparse storage it is materialized on first use and kept, so
+        prefer labels, cells and the lookup methods.
+        """
+        if self._storage == "dense":
+            return self._cells.frame
+        return self.derived("wide_frame", lambda snapshot: snapshot.cells.to_frame())
+
+    @property
+    def labels(self) -> pd.DataFrame:
+        """The Main Category / Category / SubCategory columns of every field row."""
+        return self._cells.labels
+
+    @property
+    def cells(self):
+        """The cell store (DenseCells or SparseCells)."""
+        return self._cells
+
+    @property
+    def storage(self) -> str:
+        """Name of the cell storage backend."""
+        return self._storage
+
+    @property
+    def doc_columns(self) -> tuple:
+        """Document (paper) column names, in workbook order."""
+        return self._doc_columns
+
+    @property
+    def content_hash(self) -> str:
+        """SHA-256 of the workbook this snapshot was loaded from."""
+        return self._content_hash
+
+    @property
+    def empty(self) -> bool:
+        return self.labels.empty
+
+    @property
+    def field_index(self) -> FieldIndex:
+        """Field key -> row position index, built once per process."""
+        return self.derived("field_index", lambda snapshot: FieldIndex(snapshot.labels))
+
+    @property
+    def resolver(self) -> "FieldResolver":
+        """Field-name resolver with cached row-position plans."""
+        return self.derived("field_resolver", FieldResolver)
+
+    @property
+    def facets(self) -> pd.DataFrame:
+        """The DocFacets table (see build_doc_facets), built once per process."""
+        return self.derived("doc_facets", build_doc_facets)
+
+    @property
+    def database(self) -> SqliteCells:
+        """
+        The corpus as a SQLite database with full-text search.
+
+        This is the cell store itself with the "sqlite" backend. Otherwise the
+        database at CORPUS_DB_PATH is opened (or built from the cells) on
+        first use; snapshots without a content hash get a private temporary
+        database.
+        """
+        return self.derived("database", open_corpus_database)
+
+    def search(self, query: str, category=None, subcategory=None, path=None) -> list:
+        """
+        Documents with a text cell matching a full-text query.
+
+        Searches every field, or only the rows of one field key when given.
+
+        Args:
+            query (str): FTS5 query, e.g. 'acrolein' or '"vitamin e" OR formald*'
+            category (str, optional): Exact Category value
+            subcategory (str, optional): Exact SubCategory value
+            path (str, optional): Dotted field path
+
+        Returns:
+            list: Document column names in corpus order
+        """
+        positions = None
+        if category is not None or subcategory is not None or path is not None:
+            positions = self.field_index.positions(category, subcategory, path)
+        return self.database.search(query, positions)
+
+    @property
+    def text(self) -> NormalizedText:
+        """Cleaned text variants and word counts of every text cell."""
+        return self.derived("normalized_text", lambda snapshot: NormalizedText(snapshot.cells))
+
+    @property
+    def list_items(self) -> pd.DataFrame:
+        """The ListItems table (see build_list_items), built once per process."""
+        return self.derived("list_items", build_list_items)
+
+    def has_category(self, category) -> bool:
+        """Equivalent of `category in df['Category'].values`."""
+        return category in self.field_index.by_category
+
+    def has_subcategory(self, subcategory) -> bool:
+        """Equivalent of `subcategory in df['SubCategory'].values`."""
+        return subcategory in self.field_index.by_subcategory
+
+    def rows(self, category=None, subcategory=None, path=None) -> pd.DataFrame:
+        """
+        Return the frame rows for a field key.
+
+        Equivalent to df[df['Category'] == category] (and/or the SubCategory
+        condition) but served from the field index.
+
+        Args:
+            category (str, optional): Exact Category value
+            subcategory (str, optional): Exact SubCategory value
+            path (str, optional): Dotted field path
+
+        Returns:
+            DataFrame: Matching rows, with their original index labels
+        """
+        positions = self.field_index.positions(category, subcategory, path)
+        return self._cells.to_frame(positions)
+
+    def value(self, doc, category=None, subcategory=None, path=None, default=None):
+        """
+        Return the first cell of a field for one document.
+
+        Equivalent to rows(...)[doc].iloc[0], without building a frame.
+
+        Args:
+            doc (str): Document column name
+            category (str, optional): Exact Category value
+            subcategory (str, optional): Exact SubCategory value
+            path (str, optional): Dotted field path
+            default: Returned when no row matches the field key
+
+        Returns:
+            The raw cell value (possibly NaN), or default
+        """
+        positions = self.field_index.positions(category, subcategory, path)
+        if not positions:
+            return default
+        return self._cells.get(positions[0], doc)
+
+    def values(self, doc, category=None, subcategory=None, path=None) -> list:
+        """
+        Return every non-missing cell of a field for one document.
+
+        Equivalent to rows(...)[doc].dropna().tolist().
+        """
+        return self.values_at(doc, self.field_index.positions(category, subcategory, path))
+
+    def values_at(self, doc, positions) -> list:
+        """
+        Gather the non-missing cells of one document at the given row positions.
+
+        Args:
+            doc (str): Document column name
+            positions (iterable): Row positions, e.g. from a FieldResolver plan
+
+        Returns:
+            list: Raw cell values in row order
+        """
+        return self._cells.gather(doc, positions)
+
+    def value_at(self, doc, position):
+        """Return the raw cell of one document at a row position."""
+        return self._cells.get(position, doc)
+
+    def items(self, doc, category=None, subcategory=None, path=None) -> tuple:
+        """
+        Return the numbered-list items of a field for one document.
+
+        Equivalent to parse_numbered_list(value(...)), served from ListItems.
+
+        Returns:
+            tuple: Item texts (empty if the cell is not a numbered list)
+        """
+        positions = self.field_index.positions(category, subcategory, path)
+        if not positions:
+            return ()
+        field = self.field_index.paths[positions[0]]
+        lookup = self.derived("list_item_lookup", build_list_item_lookup)
+        return lookup.get((field, doc), ())
+
+    def aligned_items(self, category, subcategories, docs=None) -> pd.DataFrame:
+        """
+        Items of sibling numbered-list fields, aligned by item position.
+
+        The first subcategory is the anchor: the result has one row per anchor
+        item, and each sibling column holds the item at the same position of
+        that sibling field (NaN when the sibling list is shorter or missing).
+        E.g. ("name", "evidence_strength") of "harmful_ingredients" pairs each
+        ingredient with its evidence strength.
+
+        Args:
+            category (str): Category shared by the fields
+            subcategories (sequence): Anchor subcategory followed by its siblings
+            docs (list, optional): Keep only these documents, in this order
+
+        Returns:
+            DataFrame: Columns doc, item_index and one column per subcategory
+        """
+        subcategories = tuple(subcategories)
+
+        def build(snapshot):
+            items = snapshot.list_items
+            key = ["doc", "item_index"]
+
+            def field_items(subcategory):
+                rows = items[items["field"] == f"{category}.{subcategory}"]
+                return rows[key + ["item_text"]].rename(columns={"item_text": subcategory})
+
+            aligned = field_items(subcategories[0])
+            for subcategory in subcategories[1:]:
+                aligned = aligned.merge(field_items(subcategory), on=key, how="left")
+            return aligned.reset_index(drop=True)
+
+        aligned = self.derived(f"aligned_items:{category}:{'|'.join(subcategories)}", build)
+        if docs is None:
+            return aligned
+
+        order = {doc: rank for rank, doc in enumerate(docs)}
+        ranks = aligned["doc"].astype(object).map(order).dropna()
+        aligned = aligned.loc[ranks.index].assign(_rank=ranks)
+        return aligned.sort_values(["_rank", "item_index"], kind="stable").drop(columns="_rank")
+
+    def inherit(self, previous, names):
+        """
+        Reuse derived tables of an earlier snapshot that are still valid.
+
+        Used on hot reload (see corpus_watcher.py) so that tables depending
+        only on unchanged parts of the corpus are not rebuilt.
+
+        Args:
+            previous (CorpusSnapshot): Snapshot the tables were built for
+            names (iterable): Names of the derived tables to carry over
+        """
+        with self._lock:
+            for name in names:
+                if name in previous._derived and name not in self._derived:
+                    self._derived[name] = previous._derived[name]
+                    self._builders[name] = previous._builders.get(name)
+
+    def warm(self, previous):
+        """
+        Build the derived tables an earlier snapshot had built, ahead of their first use.
+
+        Used on hot reload (see corpus_watcher.py), off the request path: the
+        facets, filter engine, indexes, ... the sessions were using are ready
+        before the new snapshot is served. Tables already present (e.g.
+        inherited) are kept; a table that fails to build is left to be built
+        on first use.
+
+        Args:
+            previous (CorpusSnapshot): Snapshot whose derived tables to rebuild
+        """
+        for name, build in list(previous._builders.items()):
+            if build is None:
+                continue
+            try:
+                self.derived(name, build)
+            except Exception as e:
+                print(f"Warning: could not prepare derived table '{name}': {e}")
+
+    def derived(self, name: str, build):
+        """
+        Return a derived table, building it on first use.
+
+        Args:
+            name (str): Unique name of the derived table
+            build (callable): Called with this snapshot to build the table
+
+        Returns:
+            The cached result of build(self)
+        """
+        try:
+            return self._derived[name]
+        except KeyError:
+            pass
+
+        with self._lock:
+            if name not in self._derived:
+                self._derived[name] = build(self)
+                self._builders[name] = build
+            return self._derived[name]
+
+
+def open_corpus_database(snapshot: CorpusSnapshot) -> SqliteCells:
+    """Return the SQLite database of a snapshot, building it if it is missing or stale."""
+    if snapshot.storage == "sqlite":
+        return snapshot.cells
+    if snapshot.content_hash is None:
+        fd, db_path = tempfile.mkstemp(suffix=".sqlite")
+        os.close(fd)
+        return SqliteCells.build(snapshot.cells, db_path)
+
+    database = SqliteCells.open(CORPUS_DB_PATH, expected_hash=snapshot.content_hash)
+    if database is None:
+        database = SqliteCells.build(snapshot.cells, CORPUS_DB_PATH, content_hash=snapshot.content_hash)
+    return database
+
+
+if __name__ == "__main__":
+    # Build step: python corpus_store.py [workbook_path] [snapshot_path]
+    workbook = sys.argv[1] if len(sys.argv) > 1 else WORKBOOK_PATH
+    snapshot = sys.argv[2] if len(sys.argv) > 2 else SNAPSHOT_PATH
+
+    content_hash = build_snapshot(workbook, snapshot)
+    print(f"Compiled '{workbook}' into '{snapshot}' (sha256 {content_hash[:12]})")
@@ -0,0 +1,362 @@
+import os
+import time
+import threading
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from corpus_store import (CORPUS_STORAGE, SNAPSHOT_PATH, WORKBOOK_PATH, WORKBOOK_READER, CorpusSnapshot,
+                          compute_workbook_hash, load_corpus_cells)
+
+
+# Seconds between two workbook checks (override with CORPUS_RELOAD_POLL_SECONDS)
+RELOAD_POLL_SECONDS = float(os.environ.get("CORPUS_RELOAD_POLL_SECONDS", "5"))
+
+# Number of reload diffs remembered for sessions that are behind
+DIFF_HISTORY = 32
+
+# Derived tables that only depend on the field rows, kept when those are unchanged
+FIELD_TABLES = ("field_index", "field_resolver")
+
+# Session-state key of {insights key: (documents the insights were generated from, cohort flag)}
+INSIGHT_SOURCES_KEY = "insight_sources"
+
+# Odd 64-bit multiplier used to combine cell hashes
+_HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+class CorpusDiff:
+    """
+    Difference between two corpus snapshots by document column and field row.
+
+    Attributes:
+        added_docs, removed_docs, changed_docs (tuple): Document column names
+        added_fields, removed_fields, changed_fields (tuple): Field keys
+            (Main Category, Category, SubCategory, occurrence)
+        structure_changed (bool): Field rows were added, removed or reordered,
+            so row positions of the two snapshots do not correspond
+    """
+
+    def __init__(self, added_docs=(), removed_docs=(), changed_docs=(),
+                 added_fields=(), removed_fields=(), changed_fields=(), structure_changed=False):
+        self.added_docs = tuple(added_docs)
+        self.removed_docs = tuple(removed_docs)
+        self.changed_docs = tuple(changed_docs)
+        self.added_fields = tuple(added_fields)
+        self.removed_fields = tuple(removed_fields)
+        self.changed_fields = tuple(changed_fields)
+        self.structure_changed = structure_changed
+
+    @property
+    def affected_docs(self) -> frozenset:
+        """Documents whose cached results may differ (added, removed or changed)."""
+        return frozenset(self.added_docs) | frozenset(self.removed_docs) | frozenset(self.changed_docs)
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.affected_docs or self.added_fields or self.removed_fields
+                    or self.changed_fields or self.structure_changed)
+
+    def summary(self) -> str:
+        """Short human-readable description, e.g. for logs."""
+        return (f"{len(self.added_docs)} documents added, {len(self.changed_docs)} changed, "
+                f"{len(self.removed_docs)} removed; {len(self.added_fields)} fields added, "
+                f"{len(self.changed_fields)} changed, {len(self.removed_fields)} removed")
+
+
+def field_keys(labels: pd.DataFrame) -> list:
+    """
+    Stable keys of the field rows: the label values plus an occurrence number.
+
+    Rows are matched across snapshots by these keys rather than by position,
+    so inserting a field row does not mark every later row as changed.
+    """
+    seen = defaultdict(int)
+    keys = []
+    for row in labels.itertuples(index=False):
+        label = tuple(None if pd.isna(value) else str(value) for value in row)
+        keys.append(label + (seen[label],))
+        seen[label] += 1
+    return keys
+
+
+def _hash_strings(strings) -> np.ndarray:
+    return pd.util.hash_array(np.asarray(strings, dtype=object))
+
+
+def fingerprint(snapshot) -> dict:
+    """
+    Content hashes of every document column and field row of a snapshot.
+
+    Each populated cell is hashed once; a document hash combines its cells
+    with their field keys, a field hash its cells with their document names.
+    Both are order-independent XORs, so only cell contents matter.
+
+    Returns:
+        dict: {"fields": [field keys in row order],
+               "docs": {doc: hash}, "field_hashes": {field key: hash}}
+    """
+    keys = field_keys(snapshot.labels)
+    docs = list(snapshot.doc_columns)
+    field_ids, doc_ids, values = snapshot.cells.triples()
+
+    value_hashes = _hash_strings([f"{type(value).__name__}:{value}" for value in values.tolist()])
+    key_hashes = _hash_strings([repr(key) for key in keys])
+    doc_name_hashes = _hash_strings([str(doc) for doc in docs])
+
+    doc_hashes = np.zeros(len(docs), dtype=np.uint64)
+    np.bitwise_xor.at(doc_hashes, doc_ids, value_hashes * _HASH_MULTIPLIER + key_hashes[field_ids])
+
+    field_hashes = np.zeros(len(keys), dtype=np.uint64)
+    np.bitwise_xor.at(field_hashes, field_ids, value_hashes * _HASH_MULTIPLIER + doc_name_hashes[doc_ids])
+
+    return {
+        "fields": keys,
+        "docs": dict(zip(docs, doc_hashes.tolist())),
+        "field_hashes": dict(zip(keys, field_hashes.tolist())),
+    }
+
+
+def diff_snapshots(old, new) -> CorpusDiff:
+    """
+    Compare two corpus snapshots at the document column and field row level.
+
+    Args:
+        old (CorpusSnapshot): Snapshot currently served
+        new (CorpusSnapshot): Freshly loaded snapshot
+
+    Returns:
+        CorpusDiff: What was added, removed or changed
+    """
+    old_print = old.derived("fingerprint", fingerprint)
+    new_print = new.derived("fingerprint", fingerprint)
+
+    old_docs, new_docs = old_print["docs"], new_print["docs"]
+    old_fields, new_fields = old_print["field_hashes"], new_print["field_hashes"]
+
+    return CorpusDiff(
+        added_docs=[doc for doc in new_docs if doc not in old_docs],
+        removed_docs=[doc for doc in old_docs if doc not in new_docs],
+        changed_docs=[doc for doc, value in new_docs.items() if doc in old_docs and old_docs[doc] != value],
+        added_fields=[key for key in new_fields if key not in old_fields],
+        removed_fields=[key for key in old_fields if key not in new_fields],
+        changed_fields=[key for key, value in new_fields.items()
+                        if key in old_fields and old_fields[key] != value],
+        structure_changed=old_print["fields"] != new_print["fields"],
+    )
+
+
+class CorpusWatcher:
+    """
+    Keeps the process-wide corpus snapshot in sync with the workbook on disk.
+
+    refresh() is called on every rerun but stats the workbook at most once
+    per poll interval. A changed mtime starts a reload thread and refresh()
+    returns right away: the served snapshot stays current until the new one
+    is ready. The thread hashes the workbook; only when the hash differs is
+    the workbook reloaded, diffed against the served snapshot (see
+    diff_snapshots) and swapped in. Derived tables that only depend on
+    unchanged field rows are carried over, and the others the served
+    snapshot had built (facets, filter engine, indexes, ...) are rebuilt
+    before the swap (see CorpusSnapshot.warm). Subscribers are then told
+    which documents and fields changed so they can invalidate just the
+    affected cache entries.
+
+    If a reload fails (e.g. the workbook is still being written) the old
+    snapshot keeps being served and the reload is retried on the next poll.
+
+    Args:
+        workbook_path (str): Path to the Excel workbook
+        snapshot_path (str): Path to the compiled snapshot
+        storage (str): Cell storage backend of the snapshots
+        poll_seconds (float): Minimum time between two workbook checks
+        reader (str): Workbook parser, "pandas" or "streaming"
+    """
+
+    def __init__(self, workbook_path: str = WORKBOOK_PATH, snapshot_path: str = SNAPSHOT_PATH,
+                 storage: str = CORPUS_STORAGE, poll_seconds: float = RELOAD_POLL_SECONDS,
+                 reader: str = WORKBOOK_READER):
+        self.workbook_path = workbook_path
+        self.snapshot_path = snapshot_path
+        self.storage = storage
+        self.poll_seconds = poll_seconds
+        self.reader = reader
+
+        self._mtime = self._workbook_mtime()
+        self.snapshot = CorpusSnapshot.from_workbook(workbook_path, snapshot_path, storage=storage,
+                                                     reader=reader)
+        self.generation = 0
+        self._history = []
+        self._listeners = []
+        self._checked_at = time.monotonic()
+        self._lock = threading.Lock()
+        # Held for a whole reload, so a forced refresh waits for the reload thread
+        self._reload_lock = threading.Lock()
+        self._reload_thread = None
+
+    def _workbook_mtime(self):
+        try:
+            return os.stat(self.workbook_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def subscribe(self, listener):
+        """
+        Register a callback run on every reload, before the new snapshot is served.
+
+        Args:
+            listener (callable): Called as listener(diff, old_snapshot, new_snapshot),
+                on the reload thread
+        """
+        self._listeners.append(listener)
+
+    def refresh(self, force: bool = False) -> CorpusSnapshot:
+        """
+        Return the current snapshot, starting a reload if the workbook changed.
+
+        Args:
+            force (bool): Check the workbook now, ignoring the poll interval,
+                and reload it on this thread before returning
+
+        Returns:
+            CorpusSnapshot: The snapshot to serve for this rerun
+        """
+        if not force and time.monotonic() - self._checked_at < self.poll_seconds:
+            return self.snapshot
+
+        with self._lock:
+            if not force and time.monotonic() - self._checked_at < self.poll_seconds:
+                return self.snapshot
+            self._checked_at = time.monotonic()
+
+            mtime = self._workbook_mtime()
+            if mtime is None or mtime == self._mtime:
+                return self.snapshot
+
+            if not force:
+                if self._reload_thread is None or not self._reload_thread.is_alive():
+                    self._reload_thread = threading.Thread(target=self._check, args=(mtime,),
+                                                           name="corpus-reload", daemon=True)
+                    self._reload_thread.start()
+                return self.snapshot
+
+        self._check(mtime)
+        return self.snapshot
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Wait for a running reload to finish.
+
+        Returns:
+            bool: True if no reload is running anymore
+        """
+        thread = self._reload_thread
+        if thread is not None:
+            thread.join(timeout)
+        return thread is None or not thread.is_alive()
+
+    def _check(self, mtime):
+        with self._reload_lock:
+            if mtime == self._mtime:
+                return
+            try:
+                content_hash = compute_workbook_hash(self.workbook_path)
+                if content_hash != self.snapshot.content_hash:
+                    self._reload(content_hash)
+                # Touched but identical content: nothing to invalidate
+                self._mtime = mtime
+            except Exception as e:
+                print(f"Warning: could not reload '{self.workbook_path}': {e}")
+
+    def _reload(self, content_hash: str):
+        cells = load_corpus_cells(self.workbook_path, self.snapshot_path, content_hash,
+                                  storage=self.storage, reader=self.reader)
+        new = CorpusSnapshot(content_hash=content_hash, cells=cells)
+        old = self.snapshot
+
+        diff = diff_snapshots(old, new)
+        if not diff.structure_changed:
+            new.inherit(old, FIELD_TABLES)
+        new.warm(old)
+
+        for listener in self._listeners:
+            try:
+                listener(diff, old, new)
+            except Exception as e:
+                print(f"Warning: corpus reload listener failed: {e}")
+
+        with self._lock:
+            # Snapshot first: whoever reads the new generation is served the new snapshot
+            self.snapshot = new
+            self.generation += 1
+            self._history.append((self.generation, diff))
+            del self._history[:-DIFF_HISTORY]
+        print(f"Reloaded corpus '{self.workbook_path}' (generation {self.generation}): {diff.summary()}")
+
+    def affected_docs_since(self, generation: int):
+        """
+        Documents added, removed or changed by the reloads after a generation.
+
+        Args:
+            generation (int): Generation a session last saw
+
+        Returns:
+            frozenset or None: The documents, or None if the history no longer
+            reaches back that far (treat everything as changed)
+        """
+        with self._lock:
+            diffs = [diff for diff_generation, diff in self._history if diff_generation > generation]
+            if len(diffs) != self.generation - generation:
+                return None
+        return frozenset().union(*(diff.affected_docs for diff in diffs))
+
+
+def record_insight_sources(session_state, insights_key: str, docs, cohort: bool = False):
+    """
+    Remember the documents an insights entry was generated from, so it can be invalidated.
+
+    Args:
+        session_state: Streamlit session state (or any mutable mapping)
+        insights_key (str): Session key of the generated insights
+        docs (iterable): Document column names the insights summarize
+        cohort (bool): The documents are the matches of a filter, so an added
+            or changed document may join them (e.g. the tab insights); False
+            for insights about fixed documents (e.g. one paper)
+    """
+    sources = session_state.get(INSIGHT_SOURCES_KEY)
+    if sources is None:
+        sources = session_state[INSIGHT_SOURCES_KEY] = {}
+    sources[insights_key] = (tuple(docs), cohort)
+
+
+def invalidate_insights(session_state, affected_docs) -> int:
+    """
+    Drop generated insights whose source documents changed.
+
+    Insights are stored under a session key with their token usage
+    (key + "_token_usage") and timing (key + "_timing"); the documents they
+    were generated from are recorded in session_state[INSIGHT_SOURCES_KEY]
+    (see record_insight_sources). Insights of fixed documents are kept when
+    none of them changed. Cohort insights are dropped on any document change:
+    an added or changed document may now match the filter they came from.
+
+    Args:
+        session_state: Streamlit session state (or any mutable mapping)
+        affected_docs (frozenset or None): Changed documents; None drops all
+
+    Returns:
+        int: Number of insights entries dropped
+    """
+    sources = session_state.get(INSIGHT_SOURCES_KEY) or {}
+    dropped = 0
+    for insights_key, (docs, cohort) in list(sources.items()):
+        if affected_docs is not None and not (affected_docs if cohort else affected_docs.intersection(docs)):
+            continue
+
+        for key in (insights_key, f"{insights_key}_token_usage", f"{insights_key}_timing"):
+            if key in session_state:
+                del session_state[key]
+        del sources[insights_key]
+        dropped += 1
+    return dropped
@@ -0,0 +1,373 @@
+import re
+import unicodedata
+from array import array
+
+import pandas as pd
+
+
+# ISO 3166-1 alpha-3 code -> (display name, other spellings).
+# Names, ISO short names and alpha-3 codes are all recognized; the codes match
+# the feature ids of the world-countries GeoJSON drawn by the choropleth.
+COUNTRIES = {
+    "AFG": ("Afghanistan", ()),
+    "ALB": ("Albania", ()),
+    "DZA": ("Algeria", ()),
+    "AND": ("Andorra", ()),
+    "AGO": ("Angola", ()),
+    "ATG": ("Antigua and Barbuda", ()),
+    "ARG": ("Argentina", ()),
+    "ARM": ("Armenia", ()),
+    "AUS": ("Australia", ()),
+    "AUT": ("Austria", ()),
+    "AZE": ("Azerbaijan", ()),
+    "BHS": ("Bahamas", ("The Bahamas",)),
+    "BHR": ("Bahrain", ()),
+    "BGD": ("Bangladesh", ()),
+    "BRB": ("Barbados", ()),
+    "BLR": ("Belarus", ()),
+    "BEL": ("Belgium", ()),
+    "BLZ": ("Belize", ()),
+    "BEN": ("Benin", ()),
+    "BTN": ("Bhutan", ()),
+    "BOL": ("Bolivia", ("Plurinational State of Bolivia",)),
+    "BIH": ("Bosnia and Herzegovina", ("Bosnia",)),
+    "BWA": ("Botswana", ()),
+    "BRA": ("Brazil", ()),
+    "BRN": ("Brunei", ("Brunei Darussalam",)),
+    "BGR": ("Bulgaria", ()),
+    "BFA": ("Burkina Faso", ()),
+    "BDI": ("Burundi", ()),
+    "CPV": ("Cabo Verde", ("Cape Verde",)),
+    "KHM": ("Cambodia", ()),
+    "CMR": ("Cameroon", ()),
+    "CAN": ("Canada", ()),
+    "CAF": ("Central African Republic", ()),
+    "TCD": ("Chad", ()),
+    "CHL": ("Chile", ()),
+    "CHN": ("China", ("People's Republic of China", "PRC", "Mainland China")),
+    "COL": ("Colombia", ()),
+    "COM": ("Comoros", ()),
+    "COG": ("Republic of the Congo", ("Congo", "Congo-Brazzaville")),
+    "COD": ("Democratic Republic of the Congo", ("DR Congo", "DRC", "Congo-Kinshasa")),
+    "CRI": ("Costa Rica", ()),
+    "CIV": ("Côte d'Ivoire", ("Ivory Coast",)),
+    "HRV": ("Croatia", ()),
+    "CUB": ("Cuba", ()),
+    "CYP": ("Cyprus", ()),
+    "CZE": ("Czechia", ("Czech Republic",)),
+    "DNK": ("Denmark", ()),
+    "DJI": ("Djibouti", ()),
+    "DMA": ("Dominica", ()),
+    "DOM": ("Dominican Republic", ()),
+    "ECU": ("Ecuador", ()),
+    "EGY": ("Egypt", ()),
+    "SLV": ("El Salvador", ()),
+    "GNQ": ("Equatorial Guinea", ()),
+    "ERI": ("Eritrea", ()),
+    "EST": ("Estonia", ()),
+    "SWZ": ("Eswatini", ("Swaziland",)),
+    "ETH": ("Ethiopia", ()),
+    "FJI": ("Fiji", ()),
+    "FIN": ("Finland", ()),
+    "FRA": ("France", ()),
+    "GAB": ("Gabon", ()),
+    "GMB": ("Gambia", ("The Gambia",)),
+    "GEO": ("Georgia", ("Republic of Georgia", "Georgia (country)")),
+    "DEU": ("Germany", ("Deutschland",)),
+    "GHA": ("Ghana", ()),
+    "GRC": ("Greece", ()),
+    "GRD": ("Grenada", ()),
+    "GRL": ("Greenland", ()),
+    "GTM": ("Guatemala", ()),
+    "GIN": ("Guinea", ()),
+    "GNB": ("Guinea-Bissau", ("Guinea Bissau",)),
+    "GUY": ("Guyana", ()),
+    "HTI": ("Haiti", ()),
+    "HND": ("Honduras", ()),
+    "HKG": ("Hong Kong", ("Hong Kong SAR",)),
+    "HUN": ("Hungary", ()),
+    "ISL": ("Iceland", ()),
+    "IND": ("India", ()),
+    "IDN": ("Indonesia", ()),
+    "IRN": ("Iran", ("Islamic Republic of Iran",)),
+    "IRQ": ("Iraq", ()),
+    "IRL": ("Ireland", ("Republic of Ireland",)),
+    "ISR": ("Israel", ()),
+    "ITA": ("Italy", ()),
+    "JAM": ("Jamaica", ()),
+    "JPN": ("Japan", ()),
+    "JOR": ("Jordan", ()),
+    "KAZ": ("Kazakhstan", ()),
+    "KEN": ("Kenya", ()),
+    "KIR": ("Kiribati", ()),
+    "PRK": ("North Korea", ("Democratic People's Republic of Korea", "DPRK")),
+    "KOR": ("South Korea", ("Republic of Korea",)),
+    "XKX": ("Kosovo", ()),
+    "KWT": ("Kuwait", ()),
+    "KGZ": ("Kyrgyzstan", ()),
+    "LAO": ("Laos", ("Lao People's Democratic Republic", "Lao PDR")),
+    "LVA": ("Latvia", ()),
+    "LBN": ("Lebanon", ()),
+    "LSO": ("Lesotho", ()),
+    "LBR": ("Liberia", ()),
+    "LBY": ("Libya", ()),
+    "LIE": ("Liechtenstein", ()),
+    "LTU": ("Lithuania", ()),
+    "LUX": ("Luxembourg", ()),
+    "MAC": ("Macao", ("Macau",)),
+    "MDG": ("Madagascar", ()),
+    "MWI": ("Malawi", ()),
+    "MYS": ("Malaysia", ()),
+    "MDV": ("Maldives", ()),
+    "MLI": ("Mali", ()),
+    "MLT": ("Malta", ()),
+    "MHL": ("Marshall Islands", ()),
+    "MRT": ("Mauritania", ()),
+    "MUS": ("Mauritius", ()),
+    "MEX": ("Mexico", ()),
+    "FSM": ("Micronesia", ("Federated States of Micronesia",)),
+    "MDA": ("Moldova", ("Republic of Moldova",)),
+    "MCO": ("Monaco", ()),
+    "MNG": ("Mongolia", ()),
+    "MNE": ("Montenegro", ()),
+    "MAR": ("Morocco", ()),
+    "MOZ": ("Mozambique", ()),
+    "MMR": ("Myanmar", ("Burma",)),
+    "NAM": ("Namibia", ()),
+    "NRU": ("Nauru", ()),
+    "NPL": ("Nepal", ()),
+    "NLD": ("Netherlands", ("The Netherlands", "Holland")),
+    "NZL": ("New Zealand", ()),
+    "NIC": ("Nicaragua", ()),
+    "NER": ("Niger", ()),
+    "NGA": ("Nigeria", ()),
+    "MKD": ("North Macedonia", ("Macedonia",)),
+    "NOR": ("Norway", ()),
+    "OMN": ("Oman", ()),
+    "PAK": ("Pakistan", ()),
+    "PLW": ("Palau", ()),
+    "PSE": ("Palestine", ("State of Palestine", "Palestinian Territories", "West Bank", "Gaza")),
+    "PAN": ("Panama", ()),
+    "PNG": ("Papua New Guinea", ()),
+    "PRY": ("Paraguay", ()),
+    "PER": ("Peru", ()),
+    "PHL": ("Philippines", ("The Philippines",)),
+    "POL": ("Poland", ()),
+    "PRT": ("Portugal", ()),
+    "PRI": ("Puerto Rico", ()),
+    "QAT": ("Qatar", ()),
+    "ROU": ("Romania", ()),
+    "RUS": ("Russia", ("Russian Federation",)),
+    "RWA": ("Rwanda", ()),
+    "KNA": ("Saint Kitts and Nevis", ()),
+    "LCA": ("Saint Lucia", ()),
+    "VCT": ("Saint Vincent and the Grenadines", ()),
+    "WSM": ("Samoa", ()),
+    "SMR": ("San Marino", ()),
+    "STP": ("São Tomé and Príncipe", ()),
+    "SAU": ("Saudi Arabia", ()),
+    "SEN": ("Senegal", ()),
+    "SRB": ("Serbia", ("Republic of Serbia",)),
+    "SYC": ("Seychelles", ()),
+    "SLE": ("Sierra Leone", ()),
+    "SGP": ("Singapore", ()),
+    "SVK": ("Slovakia", ("Slovak Republic",)),
+    "SVN": ("Slovenia", ()),
+    "SLB": ("Solomon Islands", ()),
+    "SOM": ("Somalia", ()),
+    "ZAF": ("South Africa", ()),
+    "SSD": ("South Sudan", ()),
+    "ESP": ("Spain", ()),
+    "LKA": ("Sri Lanka", ()),
+    "SDN": ("Sudan", ()),
+    "SUR": ("Suriname", ()),
+    "SWE": ("Sweden", ()),
+    "CHE": ("Switzerland", ()),
+    "SYR": ("Syria", ("Syrian Arab Republic",)),
+    "TWN": ("Taiwan", ("Republic of China",)),
+    "TJK": ("Tajikistan", ()),
+    "TZA": ("Tanzania", ("United Republic of Tanzania",)),
+    "THA": ("Thailand", ()),
+    "TLS": ("Timor-Leste", ("East Timor",)),
+    "TGO": ("Togo", ()),
+    "TON": ("Tonga", ()),
+    "TTO": ("Trinidad and Tobago", ()),
+    "TUN": ("Tunisia", ()),
+    "TUR": ("Türkiye", ("Turkey",)),
+    "TKM": ("Turkmenistan", ()),
+    "TUV": ("Tuvalu", ()),
+    "UGA": ("Uganda", ()),
+    "UKR": ("Ukraine", ()),
+    "ARE": ("United Arab Emirates", ("UAE",)),
+    "GBR": ("United Kingdom", ("UK", "Great Britain", "Britain", "England", "Scotland", "Wales",
+                               "Northern Ireland", "United Kingdom of Great Britain and Northern Ireland",
+                               "United Kingdon")),
+    "USA": ("United States of America", ("United States", "US", "America")),
+    "URY": ("Uruguay", ()),
+    "UZB": ("Uzbekistan", ()),
+    "VUT": ("Vanuatu", ()),
+    "VEN": ("Venezuela", ("Bolivarian Republic of Venezuela",)),
+    "VNM": ("Vietnam", ("Viet Nam",)),
+    "YEM": ("Yemen", ()),
+    "ZMB": ("Zambia", ()),
+    "ZWE": ("Zimbabwe", ()),
+}
+
+# Spellings that name more than one place: a bare "Georgia" is as likely the US
+# state as the country, and "Korea" does not say which one. They stay
+# unresolved; the qualified spellings above still resolve.
+AMBIGUOUS_COUNTRY_NAMES = ("Georgia", "Korea")
+
+# Field key of the country_of_study cells in the corpus
+COUNTRY_FIELD = {"category": "country_of_study"}
+
+# Separators between several countries in one country_of_study cell. Lists are
+# split on punctuation first; "and" / "&" only split parts that are not a
+# country name themselves ("Trinidad and Tobago")
+COUNTRY_SEPARATOR = re.compile(r'[,;/]')
+COUNTRY_CONJUNCTION = re.compile(r'\s+and\s+|\s*&\s*')
+
+
+def country_key(name) -> str:
+    """
+    Lookup key of a country spelling: accents, case, dots, apostrophes and a
+    leading "the" are ignored, so "U.S.A." and "usa" share one key.
+    """
+    text = unicodedata.normalize("NFKD", str(name))
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = re.sub(r"[.'’]", "", text.casefold())
+    text = " ".join(re.sub(r"[-\s]+", " ", text).split())
+    return text[4:] if text.startswith("the ") else text
+
+
+def _build_lookup() -> dict:
+    lookup = {}
+    for code, (name, aliases) in COUNTRIES.items():
+        for spelling in (code, name) + tuple(aliases):
+            lookup[country_key(spelling)] = code
+    for spelling in AMBIGUOUS_COUNTRY_NAMES:
+        lookup.pop(country_key(spelling), None)
+    return lookup
+
+
+# Country key -> ISO alpha-3 code (see country_key)
+COUNTRY_LOOKUP = _build_lookup()
+
+
+def normalize_country(name):
+    """
+    Canonical ISO 3166-1 alpha-3 code of a country spelling.
+
+    Args:
+        name (str): Country name, variant or code, e.g. "U.S.", "England", "DEU"
+
+    Returns:
+        str or None: The code, or None if the spelling is not a known country
+        (e.g. "Global" or "45 countries") or is ambiguous (e.g. "Georgia")
+    """
+    return COUNTRY_LOOKUP.get(country_key(name))
+
+
+def country_name(code: str) -> str:
+    """Display name of an ISO alpha-3 code (the code itself if unknown)."""
+    return COUNTRIES[code][0] if code in COUNTRIES else code
+
+
+def parse_country_codes(value) -> list:
+    """
+    Split a country_of_study cell into canonical country codes.
+
+    Handles several countries in one cell (separated by commas, semicolons,
+    slashes, 'and' or '&'). Parts that are not a known country are dropped,
+    and each country is listed once.
+
+    Args:
+        value: Raw country_of_study cell
+
+    Returns:
+        list: ISO alpha-3 codes in cell order (empty for missing values)
+    """
+    if not value or pd.isna(value):
+        return []
+
+    codes = []
+    for part in split_country_list(value):
+        code = normalize_country(part)
+        if code is not None and code not in codes:
+            codes.append(code)
+    return codes
+
+
+def split_country_list(value) -> list:
+    """Split a country_of_study cell into its (not yet normalized) country spellings."""
+    parts = []
+    for part in COUNTRY_SEPARATOR.split(str(value)):
+        part = part.strip()
+        if not part:
+            continue
+        if normalize_country(part) is not None:
+            parts.append(part)
+        else:
+            parts.extend(piece.strip() for piece in COUNTRY_CONJUNCTION.split(part) if piece.strip())
+    return parts
+
+
+class CountryIndex:
+    """
+    Inverted index: country code -> positions of the documents studying it.
+
+    Built once per corpus from the per-document code lists of the DocFacets
+    table (see corpus_store.build_doc_facets), so the choropleth, its
+    top-countries table and the country filter all share one parse of the
+    country_of_study cells.
+
+    Attributes:
+        postings (dict): Code -> array of document positions (corpus order),
+            codes ordered by their first document
+        positions (dict): Document column name -> position
+        unresolved (dict): Spellings that are not a known country -> number of
+            documents, e.g. "Global"
+    """
+
+    def __init__(self, corpus):
+        self.positions = {doc: position for position, doc in enumerate(corpus.doc_columns)}
+
+        postings = {}
+        for position, codes in enumerate(corpus.facets["country_codes"].tolist()):
+            for code in codes:
+                postings.setdefault(code, array("i")).append(position)
+        self.postings = postings
+
+        self.unresolved = {}
+        rows = corpus.field_index.positions(**COUNTRY_FIELD)
+        values = corpus.cells.row(rows[0]).dropna().tolist() if rows else []
+        for value in values:
+            for part in split_country_list(value):
+                if normalize_country(part) is None:
+                    self.unresolved[part] = self.unresolved.get(part, 0) + 1
+
+    @classmethod
+    def for_corpus(cls, corpus):
+        """Return the index for a corpus, building it on first use."""
+        return corpus.derived("country_index", cls)
+
+    def counts(self, docs=None) -> dict:
+        """
+        Number of documents per country.
+
+        Args:
+            docs (list, optional): Document column names to count; every
+                document when omitted
+
+        Returns:
+            dict: Code -> document count (countries without documents left out)
+        """
+        if docs is None:
+            return {code: len(positions) for code, positions in self.postings.items()}
+        wanted = {self.positions[doc] for doc in docs}
+        counts = {}
+        for code, docs in self.postings.items():
+            count = sum(1 for position in docs if position in wanted)
+            if count:
+                counts[code] = count
+        return counts
@@ -1,12 +1,12 @@
 import pandas as pd
 import streamlit as st
 
-def display_document_details(df, matching_docs):
+def display_document_details(corpus, matching_docs):
     """
     Display detailed information about the filtered documents.
     
     Parameters:
-    df (pandas.DataFrame): Main DataFrame containing research data
+    corpus (CorpusSnapshot): Shared corpus containing research data
     matching_docs (list): List of document column names that match current filters
     """
     st.subheader("Filtered Documents Details")
@@ -18,16 +18,11 @@ def display_document_details(df, matching_docs):
         journals = []
         years = []
         
-        title_rows = df[df['Category'] == 'title']
-        author_rows = df[df['Category'] == 'authors']
-        journal_rows = df[df['Category'] == 'journal']
-        year_rows = df[df['Category'] == 'publication_year']
-        
         for doc in matching_docs:
-            title = title_rows[doc].iloc[0] if not title_rows.empty else "Unknown"
-            author = author_rows[doc].iloc[0] if not author_rows.empty else "Unknown"
-            journal = journal_rows[doc].iloc[0] if not journal_rows.empty else "Unknown"
-            year = year_rows[doc].iloc[0] if not year_rows.empty else "Unknown"
+            title = corpus.value(doc, category='title', default="Unknown")
+            author = corpus.value(doc, category='authors', default="Unknown")
+            journal = corpus.value(doc, category='journal', default="Unknown")
+            year = corpus.value(doc, category='publication_year', default="Unknown")
             
             titles.append(title if not pd.isna(title) else "Unknown")
             authors.append(author if not pd.isna(author) else "Unknown")
@@ -51,23 +46,21 @@ def display_document_details(df, matching_docs):
         st.write("No documents match the current filters")
 
 
-def display_raw_data(df):
+def display_raw_data(corpus):
     """
     Display sample raw data from the DataFrame, focusing on the most complete documents.
     
     Parameters:
-    df (pandas.DataFrame): Main DataFrame containing research data
+    corpus (CorpusSnapshot): Shared corpus containing research data
     """
     st.subheader("Sample Data")
     
     # Calculate the number of non-empty fields for each document
-    doc_columns = df.columns[3:]  # Document columns start from index 3
     doc_completeness = {}
     
-    for doc_col in doc_columns:
+    for doc_col in corpus.doc_columns:
         # Count non-empty cells in this document column
-        non_empty_count = df[doc_col].count()
-        doc_completeness[doc_col] = non_empty_count
+        doc_completeness[doc_col] = corpus.cells.count(doc_col)
     
     # Sort documents by completeness (number of non-empty fields)
     sorted_docs = sorted(doc_completeness.items(), key=lambda x: x[1], reverse=True)
@@ -77,8 +70,7 @@ def display_raw_data(df):
     
     # Display only the necessary columns: Main Category, Category, SubCategory, and the top 3 docs
     if top_3_docs:
-        display_columns = ['Main Category', 'Category', 'SubCategory'] + top_3_docs
-        sample_data = df[display_columns].copy()
+        sample_data = corpus.cells.to_frame(docs=top_3_docs).copy()
         
         # Reset index and add a new index column starting from 1
         sample_data = sample_data.reset_index(drop=True)
@@ -0,0 +1,645 @@
+import re
+from array import array
+from bisect import bisect_left
+from collections import defaultdict, namedtuple
+
+import numpy as np
+import pandas as pd
+
+from corpus_store import CATEGORICAL_FACETS, RANGE_FACETS
+from country_index import COUNTRY_FIELD, CountryIndex
+from filter_query import QueryPlan, canonical_query
+
+
+# One facet value and the number of documents that have it
+FacetCount = namedtuple("FacetCount", ["value", "count"])
+
+# Facet name -> keyword argument holding its criterion in a filter state
+FILTER_ARGUMENTS = {
+    "year": "year_range",
+    "sample_size": "sample_size_range",
+    "publication_type": "publication_type",
+    "funding_type": "funding_type",
+    "study_design": "study_design",
+    "country": "country",
+    "text": "field_terms",
+    "query": "query",
+}
+
+# Multi-valued facet of the ISO country codes of each document (see CountryIndex)
+COUNTRY_FACET = "country"
+
+# Facets filtered by a list of accepted values, with faceted counts
+VALUE_FACETS = tuple(CATEGORICAL_FACETS) + (COUNTRY_FACET,)
+
+# Facet of the field + term filter (see TermIndex)
+TEXT_FACET = "text"
+
+# Facet of the boolean filter query (see filter_query.py)
+QUERY_FACET = "query"
+
+# Words of the normalized cell text, as indexed by TermIndex
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list:
+    """Casefolded word tokens of a text."""
+    return TOKEN_PATTERN.findall(text.casefold())
+
+
+def bits_from_positions(positions) -> int:
+    """Bitset with the given bit positions set."""
+    positions = list(positions)
+    if not positions:
+        return 0
+    buffer = bytearray(max(positions) // 8 + 1)
+    for position in positions:
+        buffer[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(buffer, "little")
+
+
+def canonical_field_terms(field_terms) -> tuple:
+    """
+    Canonical form of a field + term criterion.
+
+    Terms are reduced to their space-joined tokens, so "Korea" and " korea"
+    are the same filter; pairs without any token are dropped.
+
+    Args:
+        field_terms (iterable): (field path or None for any field, term) pairs
+
+    Returns:
+        tuple or None: Sorted, de-duplicated pairs, or None if none is left
+    """
+    pairs = set()
+    for field, term in field_terms:
+        tokens = tokenize(str(term))
+        if tokens:
+            pairs.add((field or None, " ".join(tokens)))
+    return tuple(sorted(pairs, key=str)) or None
+
+
+def canonical_filter_state(criteria: dict) -> tuple:
+    """
+    Canonical, hashable form of a filter state.
+
+    Ranges become (int, int) and selections sorted tuples, so states that
+    select the same documents map to the same key regardless of selection
+    order or list/tuple types.
+
+    Args:
+        criteria (dict): Filter state keyed like FilterEngine.criteria_bits
+
+    Returns:
+        tuple: ((facet, criterion key), ...) in FILTER_ARGUMENTS order
+    """
+    state = []
+    for facet, argument in FILTER_ARGUMENTS.items():
+        criterion = criteria.get(argument)
+        if criterion is None:
+            key = None
+        elif facet == TEXT_FACET:
+            key = canonical_field_terms(criterion)
+        elif facet == QUERY_FACET:
+            key = canonical_query(criterion)
+        elif facet in RANGE_FACETS:
+            key = (int(criterion[0]), int(criterion[1]))
+        else:
+            key = tuple(sorted(set(criterion), key=str))
+        state.append((facet, key))
+    return tuple(state)
+
+
+def criteria_from_state(state: tuple) -> dict:
+    """
+    Inverse of canonical_filter_state: filter criteria for a canonical state.
+
+    Returns:
+        dict: Keyword arguments for FilterEngine.criteria_bits / match
+    """
+    criteria = {}
+    for facet, key in state:
+        if key is not None:
+            criteria[FILTER_ARGUMENTS[facet]] = key if facet in RANGE_FACETS or facet == QUERY_FACET else list(key)
+    return criteria
+
+
+class RangeIndex:
+    """
+    Sorted, typed index over one integer facet (year, sample size).
+
+    The documents that have a value are kept as two parallel arrays sorted
+    by value: values (int64) and positions (document bit positions), so a
+    range query is two binary searches plus the k matching positions.
+    Bounds and percentiles are computed once, which makes slider setup O(1).
+
+    Attributes:
+        count (int): Documents with a value
+        min, max (int or None): Smallest and largest value
+        percentiles (dict): Percentile (0-100) -> value, for PERCENTILES
+
+    Args:
+        values (Series): The facet column in document (bit position) order
+    """
+
+    PERCENTILES = (5, 25, 50, 75, 95)
+
+    def __init__(self, values: pd.Series):
+        present = values.notna().to_numpy()
+        positions = np.flatnonzero(present)
+        typed = values[present].astype("int64").to_numpy()
+
+        order = np.argsort(typed, kind="stable")
+        self.values = typed[order]
+        self.positions = positions[order].astype(np.int64)
+
+        self.count = len(self.values)
+        self.min = int(self.values[0]) if self.count else None
+        self.max = int(self.values[-1]) if self.count else None
+        self.percentiles = {
+            percentile: int(np.percentile(self.values, percentile, method="lower"))
+            for percentile in self.PERCENTILES
+        } if self.count else {}
+
+    def span(self, low, high) -> tuple:
+        """Slice (start, stop) of the sorted arrays holding values in [low, high]."""
+        return (int(np.searchsorted(self.values, low, side="left")),
+                int(np.searchsorted(self.values, high, side="right")))
+
+    def range_positions(self, low, high) -> np.ndarray:
+        """Bit positions of the documents whose value lies in [low, high]."""
+        start, stop = self.span(low, high)
+        return self.positions[start:stop]
+
+    def range_count(self, low, high) -> int:
+        """Number of documents whose value lies in [low, high]."""
+        start, stop = self.span(low, high)
+        return max(0, stop - start)
+
+    def log_edges(self, steps=(1, 2, 5)) -> list:
+        """
+        Log-scale bucket edges covering [min, max]: min, the 1-2-5 series
+        values strictly between, then max. Used for sliders over long-tailed
+        values such as sample sizes above 10000.
+        """
+        if not self.count:
+            return []
+        edges = [self.min]
+        magnitude = 1
+        while magnitude <= self.max:
+            for step in steps:
+                edge = step * magnitude
+                if self.min < edge < self.max:
+                    edges.append(edge)
+            magnitude *= 10
+        if self.max != self.min:
+            edges.append(self.max)
+        return edges
+
+
+class TermIndex:
+    """
+    Inverted index over the normalized cell text of every field.
+
+    Each cell is cleaned like the render paths show it (corpus.text.clean_list)
+    and split into casefolded word tokens. For every field path and token the
+    index keeps a posting list: the sorted positions (in corpus.doc_columns)
+    of the documents whose field contains the token. Postings under the
+    None field cover any field.
+
+    A term matches a document when every one of its tokens is a prefix of a
+    token of the field, so "formald" and "Formaldehyde" both match
+    "1) Formaldehyde". Each query token costs two bisects over the sorted
+    vocabulary of the field plus a union of the postings in that range.
+
+    Build it once per corpus with TermIndex.for_corpus(corpus).
+    """
+
+    def __init__(self, corpus):
+        self.docs = tuple(corpus.doc_columns)
+        positions = {doc: position for position, doc in enumerate(self.docs)}
+
+        postings = defaultdict(lambda: defaultdict(set))
+        for row, path in enumerate(corpus.field_index.paths):
+            if path is None:
+                continue
+            for doc, value in corpus.cells.row_items(row):
+                text = corpus.text.clean_list(value) if isinstance(value, str) else str(value)
+                for token in set(tokenize(text)):
+                    postings[path][token].add(positions[doc])
+                    postings[None][token].add(positions[doc])
+
+        self.postings = {
+            field: {token: array("i", sorted(docs)) for token, docs in tokens.items()}
+            for field, tokens in postings.items()
+        }
+        self.vocabulary = {field: sorted(tokens) for field, tokens in self.postings.items()}
+
+    @classmethod
+    def for_corpus(cls, corpus):
+        """Return the index for a corpus, building it on first use."""
+        return corpus.derived("term_index", cls)
+
+    @property
+    def fields(self) -> list:
+        """Indexed field paths, sorted."""
+        return sorted(field for field in self.postings if field is not None)
+
+    def token_docs(self, field, token: str) -> set:
+        """Positions of the documents with a token of field starting with token."""
+        vocabulary = self.vocabulary.get(field, [])
+        postings = self.postings.get(field, {})
+        docs = set()
+        for vocabulary_token in vocabulary[bisect_left(vocabulary, token):
+                                           bisect_left(vocabulary, token + "\U0010ffff")]:
+            docs.update(postings[vocabulary_token])
+        return docs
+
+    def term_bits(self, field, term: str) -> int:
+        """
+        Bitset of documents whose field contains every token of term.
+
+        Args:
+            field (str or None): Field path (see FieldIndex), None for any field
+            term (str): Search term
+
+        Returns:
+            int: The bitset (0 if the term has no token)
+        """
+        docs = None
+        for token in tokenize(term):
+            token_docs = self.token_docs(field, token)
+            docs = token_docs if docs is None else docs & token_docs
+            if not docs:
+                return 0
+        return bits_from_positions(docs or ())
+
+
+class FilterEngine:
+    """
+    Bitset index over the DocFacets table for the sidebar filters.
+
+    Every document gets a bit position (its index in corpus.doc_columns). Each
+    categorical facet value maps to a Python int bitset of the documents that
+    have it; so does each country code, from the CountryIndex postings (a
+    document studying several countries is in several bitsets). The year and
+    sample size facets are RangeIndexes (sorted typed arrays), so a range
+    filter costs two binary searches plus the matching documents. A filter
+    state is then evaluated with bitwise AND/OR, and counts are popcounts.
+
+    The field + term filter intersects bitsets from the TermIndex, which is
+    built on first use; with the sqlite storage backend it runs FTS5 prefix
+    queries against the corpus database instead. A boolean filter query (see filter_query.py) is
+    compiled into a QueryPlan over these same bitsets.
+
+    Build it once per corpus with FilterEngine.for_corpus(corpus).
+    """
+
+    def __init__(self, corpus):
+        facets = corpus.facets
+        self.corpus = corpus
+
+        self.docs = tuple(corpus.doc_columns)
+        self.positions = {doc: position for position, doc in enumerate(self.docs)}
+        self.all_bits = (1 << len(self.docs)) - 1
+
+        # Facets whose field is missing from the workbook are never filtered on
+        self.available = {
+            name: bool(corpus.field_index.positions(**key))
+            for name, key in {**RANGE_FACETS, **CATEGORICAL_FACETS}.items()
+        }
+        self.available[COUNTRY_FACET] = bool(corpus.field_index.positions(**COUNTRY_FIELD))
+        self.available[TEXT_FACET] = True
+        self.available[QUERY_FACET] = True
+
+        self.value_bits = {}
+        for name in CATEGORICAL_FACETS:
+            self.value_bits[name] = self._bits_by_value(facets[name])
+        country_postings = CountryIndex.for_corpus(corpus).postings
+        self.value_bits[COUNTRY_FACET] = {
+            code: bits_from_positions(positions) for code, positions in country_postings.items()
+        }
+
+        self.range_indexes = {name: RangeIndex(facets[name]) for name in RANGE_FACETS}
+
+    @classmethod
+    def for_corpus(cls, corpus):
+        """Return the engine for a corpus, building it on first use."""
+        return corpus.derived("filter_engine", cls)
+
+    @staticmethod
+    def _bits_by_value(values: pd.Series) -> dict:
+        """Map each non-missing value of a facet column to its document bitset."""
+        bits_by_value = {}
+        for position, value in enumerate(values.tolist()):
+            if pd.isna(value):
+                continue
+            bits_by_value[value] = bits_by_value.get(value, 0) | (1 << position)
+        return bits_by_value
+
+    def range_bits(self, facet: str, low, high) -> int:
+        """
+        Bitset of documents whose integer facet lies in [low, high].
+
+        Documents with a missing value never match. Costs O(log n + k) for
+        k matching documents (see RangeIndex).
+        """
+        return bits_from_positions(self.range_indexes[facet].range_positions(low, high).tolist())
+
+    @property
+    def term_index(self) -> TermIndex:
+        return TermIndex.for_corpus(self.corpus)
+
+    @property
+    def term_fields(self) -> list:
+        """Field paths the field + term filter can search, sorted."""
+        if self.corpus.storage == "sqlite":
+            paths = self.corpus.field_index.paths
+            return sorted({paths[row] for row in self.corpus.cells.populated_rows() if paths[row] is not None})
+        return self.term_index.fields
+
+    def term_bits(self, field, term: str) -> int:
+        """
+        Bitset of documents whose field contains every token of term as a word prefix.
+
+        The sqlite storage backend answers this from the FTS5 index of the
+        corpus database (one prefix query, see CorpusSnapshot.search), which
+        covers the raw text cells; the other backends use the TermIndex over
+        the cleaned text of every cell, built on first use.
+
+        Args:
+            field (str or None): Field path (see FieldIndex), None for any field
+            term (str): Search term
+
+        Returns:
+            int: The bitset (0 if the term has no token)
+        """
+        if self.corpus.storage != "sqlite":
+            return self.term_index.term_bits(field, term)
+        tokens = tokenize(term)
+        if not tokens:
+            return 0
+        docs = self.corpus.search(" ".join(f'"{token}"*' for token in tokens), path=field)
+        return bits_from_positions(self.positions[doc] for doc in docs)
+
+    def terms_bits(self, field_terms) -> int:
+        """Bitset of documents matching every (field, term) pair (AND)."""
+        bits = self.all_bits
+        for field, term in field_terms:
+            bits &= self.term_bits(field, term)
+        return bits
+
+    def query_bits(self, query: str) -> int:
+        """
+        Bitset of documents matching a filter query.
+
+        Raises:
+            FilterQueryError: If the query does not parse or names an unknown field
+        """
+        return QueryPlan(self, query).evaluate()
+
+    def query(self, query: str) -> list:
+        """Document column names matching a filter query, in corpus order."""
+        return self.docs_for(self.query_bits(query))
+
+    def values_bits(self, facet: str, values) -> int:
+        """Bitset of documents whose categorical facet (or country) is any of values (OR)."""
+        bits = 0
+        facet_bits = self.value_bits[facet]
+        for value in values:
+            bits |= facet_bits.get(value, 0)
+        return bits
+
+    def criteria_bits(self, year_range=None, sample_size_range=None, publication_type=None,
+                      funding_type=None, study_design=None, country=None, field_terms=None, query=None) -> dict:
+        """
+        Bitset of each active criterion of a filter state.
+
+        Args:
+            year_range (tuple, optional): Inclusive (min, max) publication year
+            sample_size_range (tuple, optional): Inclusive (min, max) sample size
+            publication_type (list, optional): Accepted publication types
+            funding_type (list, optional): Accepted funding source types
+            study_design (list, optional): Accepted primary study designs
+            country (list, optional): Accepted ISO alpha-3 country codes
+            field_terms (list, optional): (field path or None, term) pairs
+                that must all match (see TermIndex)
+            query (str, optional): Boolean filter query (see filter_query.py)
+
+        A criterion that is None (or whose field is missing from the corpus)
+        does not filter. Categorical lists hold plain values, without "All".
+
+        Returns:
+            dict: Facet name -> bitset of documents passing that criterion
+        """
+        criteria = {
+            "year": year_range,
+            "sample_size": sample_size_range,
+            "publication_type": publication_type,
+            "funding_type": funding_type,
+            "study_design": study_design,
+            COUNTRY_FACET: country,
+            TEXT_FACET: canonical_field_terms(field_terms) if field_terms else None,
+            QUERY_FACET: query or None,
+        }
+
+        active = {}
+        for facet, criterion in criteria.items():
+            bits = self.criterion_bits(facet, criterion)
+            if bits is not None:
+                active[facet] = bits
+        return active
+
+    def criterion_bits(self, facet: str, criterion):
+        """
+        Bitset of documents passing one facet criterion.
+
+        Args:
+            facet (str): Facet name (a key of FILTER_ARGUMENTS)
+            criterion: (min, max) for range facets, (field, term) pairs for
+                the text facet, query text for the query facet, list of
+                values otherwise
+
+        Returns:
+            int or None: The bitset, or None if the criterion does not filter
+        """
+        if criterion is None or not self.available[facet]:
+            return None
+        if facet == TEXT_FACET:
+            return self.terms_bits(criterion)
+        if facet == QUERY_FACET:
+            return self.query_bits(criterion)
+        if facet in RANGE_FACETS:
+            return self.range_bits(facet, criterion[0], criterion[1])
+        return self.values_bits(facet, criterion)
+
+    def match(self, **criteria) -> int:
+        """
+        Evaluate a filter state (see criteria_bits for the arguments).
+
+        Returns:
+            int: Bitset of documents matching every criterion
+        """
+        bits = self.all_bits
+        for criterion_bits in self.criteria_bits(**criteria).values():
+            bits &= criterion_bits
+        return bits
+
+    def facet_counts(self, **criteria) -> dict:
+        """
+        Faceted counts for every categorical facet and the country facet in one pass.
+
+        Uses standard faceted-search semantics: the counts of a facet apply
+        every active criterion except that facet's own selection, so the
+        other values of a facet stay visible while one of them is selected.
+
+        Args:
+            **criteria: Filter state (see criteria_bits)
+
+        Returns:
+            dict: Facet name -> list of FacetCount, most frequent first
+        """
+        active = self.criteria_bits(**criteria)
+
+        counts = {}
+        for facet in VALUE_FACETS:
+            bits = self.all_bits
+            for other, criterion_bits in active.items():
+                if other != facet:
+                    bits &= criterion_bits
+            counts[facet] = self.value_counts(facet, bits)
+
+        return counts
+
+    def docs_for(self, bits: int) -> list:
+        """Document column names for a bitset, in corpus order."""
+        # Little-endian bit string: character i is the bit of document i
+        bit_string = bin(bits)[:1:-1]
+        docs = []
+        position = bit_string.find("1")
+        while position != -1:
+            docs.append(self.docs[position])
+            position = bit_string.find("1", position + 1)
+        return docs
+
+    def bits_for(self, docs) -> int:
+        """Bitset for a list of document column names."""
+        bits = 0
+        for doc in docs:
+            bits |= 1 << self.positions[doc]
+        return bits
+
+    @staticmethod
+    def count(bits: int) -> int:
+        """Number of documents in a bitset."""
+        return bits.bit_count()
+
+    def value_counts(self, facet: str, bits: int) -> list:
+        """
+        Count the documents in bits per value of a categorical facet (or country).
+
+        Returns:
+            list: FacetCount records with count > 0, most frequent first.
+            Ties keep the order in which the values first appear in bits.
+        """
+        counts = []
+        for value, value_bits in self.value_bits[facet].items():
+            matched = value_bits & bits
+            if matched:
+                first_doc = (matched & -matched).bit_length()
+                counts.append((first_doc, value, matched.bit_count()))
+
+        counts.sort(key=lambda item: (-item[2], item[0]))
+        return [FacetCount(value, count) for _, value, count in counts]
+
+
+class FilterPipeline:
+    """
+    Memoized, per-session evaluation of the sidebar filters.
+
+    Each stage remembers the inputs it was last computed from and returns its
+    previous result while they are unchanged:
+
+        year, sample_size, publication_type, funding_type, study_design,
+        country, text, query
+            bitset of one criterion, keyed on that criterion alone
+        counts:<facet>
+            faceted counts of a categorical facet or the country facet,
+            keyed on the other criteria
+        matching
+            matching document list, keyed on every criterion
+
+    A rerun caused by an unrelated widget therefore hits every stage, and
+    changing one selection only recomputes the stages that depend on it.
+    Hit/miss counters per stage are available through stats().
+    """
+
+    def __init__(self, engine: FilterEngine):
+        self.engine = engine
+        self._memo = {}
+        self.hits = {}
+        self.misses = {}
+
+    def _stage(self, stage: str, key, compute):
+        """Return the memoized result of a stage, recomputing it if key changed."""
+        memo = self._memo.get(stage)
+        if memo is not None and memo[0] == key:
+            self.hits[stage] = self.hits.get(stage, 0) + 1
+            return memo[1]
+
+        self.misses[stage] = self.misses.get(stage, 0) + 1
+        result = compute()
+        self._memo[stage] = (key, result)
+        return result
+
+    def criteria_bits(self, **criteria) -> dict:
+        """Memoized FilterEngine.criteria_bits (same arguments and result)."""
+        active = {}
+        for facet, key in canonical_filter_state(criteria):
+            bits = self._stage(facet, key, lambda: self.engine.criterion_bits(facet, key))
+            if bits is not None:
+                active[facet] = bits
+        return active
+
+    def facet_counts(self, **criteria) -> dict:
+        """Memoized FilterEngine.facet_counts (same arguments and result)."""
+        keys = dict(canonical_filter_state(criteria))
+        active = self.criteria_bits(**criteria)
+
+        def compute(facet):
+            bits = self.engine.all_bits
+            for other, criterion_bits in active.items():
+                if other != facet:
+                    bits &= criterion_bits
+            return self.engine.value_counts(facet, bits)
+
+        counts = {}
+        for facet in VALUE_FACETS:
+            other_keys = tuple((other, key) for other, key in keys.items() if other != facet)
+            counts[facet] = self._stage(f"counts:{facet}", other_keys, lambda: compute(facet))
+        return counts
+
+    def matching_docs(self, **criteria) -> list:
+        """
+        Document column names matching a filter state, in corpus order.
+
+        Returns:
+            list: A fresh list (the memoized copy is never handed out)
+        """
+        keys = canonical_filter_state(criteria)
+
+        def compute():
+            bits = self.engine.all_bits
+            for criterion_bits in self.criteria_bits(**criteria).values():
+                bits &= criterion_bits
+            return tuple(self.engine.docs_for(bits))
+
+        return list(self._stage("matching", keys, compute))
+
+    def stats(self) -> dict:
+        """Stage name -> {"hits": int, "misses": int}."""
+        stages = sorted(set(self.hits) | set(self.misses))
+        return {
+            stage: {"hits": self.hits.get(stage, 0), "misses": self.misses.get(stage, 0)}
+            for stage in stages
+        }
@@ -0,0 +1,418 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from io import StringIO
+from pathlib import Path
+from contextlib import closing, contextmanager
+
+import pandas as pd
+
+from filter_engine import FilterEngine, canonical_filter_state, criteria_from_state
+from filter_query import FilterQueryError
+from insights_utils import INSIGHTS_ERROR_PREFIX, generate_tab_insights
+from llm_scheduler import LLMScheduler
+from async_runtime import run
+
+
+# SQLite file holding the saved presets and their materialized results (override with FILTER_PRESETS_PATH)
+PRESETS_PATH = os.environ.get("FILTER_PRESETS_PATH", "filter_presets/presets.sqlite")
+
+# Seconds between two materialization passes (override with PRESET_POLL_SECONDS)
+PRESET_POLL_SECONDS = float(os.environ.get("PRESET_POLL_SECONDS", "60"))
+
+# Generate the insights of every preset ahead of time (opt in with PRESET_PREWARM_INSIGHTS=1); each
+# pre-warmed preset costs one completion per tab and corpus version, whether or not anyone loads it
+PRESET_PREWARM_INSIGHTS = os.environ.get("PRESET_PREWARM_INSIGHTS", "0") != "0"
+
+# Failed tab insights are retried after PRESET_INSIGHT_RETRY_SECONDS, doubling after every further failure,
+# and given up after PRESET_INSIGHT_MAX_ATTEMPTS failures per preset, tab and corpus version
+PRESET_INSIGHT_RETRY_SECONDS = float(os.environ.get("PRESET_INSIGHT_RETRY_SECONDS", "300"))
+PRESET_INSIGHT_MAX_ATTEMPTS = int(os.environ.get("PRESET_INSIGHT_MAX_ATTEMPTS", "3"))
+
+
+def canonical_criteria(criteria: dict) -> str:
+    """
+    Canonical JSON text of filter criteria, so equivalent filters compare equal.
+
+    Args:
+        criteria (dict): Filter state keyed like FilterEngine.criteria_bits
+
+    Returns:
+        str: JSON of criteria_from_state(canonical_filter_state(criteria))
+    """
+    return json.dumps(criteria_from_state(canonical_filter_state(criteria)), sort_keys=True)
+
+
+def encode_aggregates(aggregates: dict) -> str:
+    """
+    JSON text of materialized chart aggregates.
+
+    DataFrames (e.g. the year counts) are stored as their
+    to_json(orient="split") text under a {"dataframe": ...} wrapper; the
+    other aggregates are plain lists and dicts.
+
+    Args:
+        aggregates (dict): Chart aggregates by name
+
+    Returns:
+        str: JSON text (see decode_aggregates)
+    """
+    encoded = {}
+    for name, value in aggregates.items():
+        if isinstance(value, pd.DataFrame):
+            value = {"dataframe": value.to_json(orient="split")}
+        encoded[name] = value
+    return json.dumps(encoded, ensure_ascii=False)
+
+
+def decode_aggregates(text: str) -> dict:
+    """
+    Chart aggregates from the JSON text written by encode_aggregates.
+
+    Args:
+        text (str): JSON text of the aggregates
+
+    Returns:
+        dict: Chart aggregates by name
+    """
+    aggregates = json.loads(text)
+    for name, value in aggregates.items():
+        if isinstance(value, dict) and set(value) == {"dataframe"}:
+            aggregates[name] = pd.read_json(StringIO(value["dataframe"]), orient="split", convert_dates=False)
+    return aggregates
+
+
+class PresetStore:
+    """
+    Named filter presets and their materialized results, persisted in SQLite.
+
+    A preset is a named filter state. Its materialized results (matching
+    documents, chart aggregates and per-tab insights) are stored with the
+    corpus content hash and the criteria they were computed for, so results
+    of an older corpus or of a preset saved again under the same name are
+    never served.
+
+    Every call opens its own connection, so the store can be shared by the
+    Streamlit sessions and the materializer thread; WAL mode lets readers
+    run while results are being written.
+
+    Args:
+        db_path (str): Path to the SQLite file (created on first use)
+    """
+
+    def __init__(self, db_path: str = PRESETS_PATH):
+        self.db_path = db_path
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            if connection.execute("PRAGMA user_version").fetchone()[0] < 1:
+                # Version 0 pickled the aggregates; they are rebuilt on the next pass
+                connection.execute("DROP TABLE IF EXISTS materialized")
+                connection.execute("PRAGMA user_version = 1")
+            connection.executescript("""
+                CREATE TABLE IF NOT EXISTS presets (
+                    name TEXT PRIMARY KEY,
+                    criteria TEXT NOT NULL,
+                    updated REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS materialized (
+                    name TEXT PRIMARY KEY,
+                    content_hash TEXT NOT NULL,
+                    criteria TEXT NOT NULL,
+                    docs TEXT NOT NULL,
+                    aggregates TEXT NOT NULL,
+                    insights TEXT NOT NULL,
+                    updated REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS insight_failures (
+                    name TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    insights_key TEXT NOT NULL,
+                    attempts INTEGER NOT NULL,
+                    next_retry REAL NOT NULL,
+                    PRIMARY KEY (name, content_hash, insights_key)
+                );
+            """)
+
+    @contextmanager
+    def _connect(self):
+        # Committed (or rolled back) as one transaction, then closed: the
+        # connection's own context manager does not close it
+        with closing(sqlite3.connect(self.db_path, timeout=30)) as connection, connection:
+            yield connection
+
+    def save(self, name: str, criteria: dict):
+        """
+        Save (or overwrite) a preset.
+
+        Args:
+            name (str): Preset name
+            criteria (dict): Filter state keyed like FilterEngine.criteria_bits
+        """
+        with self._connect() as connection:
+            connection.execute("INSERT OR REPLACE INTO presets VALUES (?, ?, ?)",
+                               (name, canonical_criteria(criteria), time.time()))
+            # New criteria, new cohort: its insights get a fresh set of attempts
+            connection.execute("DELETE FROM insight_failures WHERE name = ?", (name,))
+
+    def delete(self, name: str):
+        """Delete a preset and its materialized results."""
+        with self._connect() as connection:
+            connection.execute("DELETE FROM presets WHERE name = ?", (name,))
+            connection.execute("DELETE FROM materialized WHERE name = ?", (name,))
+            connection.execute("DELETE FROM insight_failures WHERE name = ?", (name,))
+
+    def presets(self) -> dict:
+        """
+        All saved presets.
+
+        Returns:
+            dict: {name: criteria dict}, sorted by name
+        """
+        with self._connect() as connection:
+            rows = connection.execute("SELECT name, criteria FROM presets ORDER BY name").fetchall()
+        return {name: json.loads(criteria) for name, criteria in rows}
+
+    def results(self, name: str, content_hash: str):
+        """
+        Materialized results of a preset for a corpus version.
+
+        Args:
+            name (str): Preset name
+            content_hash (str): Content hash of the corpus being served
+
+        Returns:
+            dict or None: {"docs": tuple, "aggregates": dict, "insights": dict},
+            or None if the preset has no results for its current criteria
+            and this corpus version
+        """
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT m.docs, m.aggregates, m.insights FROM materialized m "
+                "JOIN presets p ON p.name = m.name AND p.criteria = m.criteria "
+                "WHERE m.name = ? AND m.content_hash = ?", (name, content_hash)).fetchone()
+        if row is None:
+            return None
+        docs, aggregates, insights = row
+        return {"docs": tuple(json.loads(docs)), "aggregates": decode_aggregates(aggregates),
+                "insights": json.loads(insights)}
+
+    def save_results(self, name: str, content_hash: str, criteria: str, docs, aggregates: dict, insights: dict):
+        """
+        Store the materialized results of a preset.
+
+        Args:
+            name (str): Preset name
+            content_hash (str): Corpus version the results were computed for
+            criteria (str): Canonical criteria text (see canonical_criteria)
+            docs (list): Matching document columns
+            aggregates (dict): Chart aggregates by name (see result_cache.FilterResult)
+            insights (dict): {insights key: {"insights": list, "token_usage": dict}}
+        """
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO materialized VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (name, content_hash, criteria, json.dumps(list(docs)), encode_aggregates(aggregates),
+                 json.dumps(insights), time.time()))
+            connection.execute("DELETE FROM insight_failures WHERE name = ? AND content_hash != ?",
+                               (name, content_hash))
+
+    def insight_failures(self, name: str, content_hash: str) -> dict:
+        """
+        Failed insight generations of a preset for a corpus version.
+
+        Args:
+            name (str): Preset name
+            content_hash (str): Content hash of the corpus being served
+
+        Returns:
+            dict: {insights key: (failed attempts, time of the next retry)}
+        """
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT insights_key, attempts, next_retry FROM insight_failures "
+                "WHERE name = ? AND content_hash = ?", (name, content_hash)).fetchall()
+        return {insights_key: (attempts, next_retry) for insights_key, attempts, next_retry in rows}
+
+    def record_insight_failure(self, name: str, content_hash: str, insights_key: str,
+                               retry_seconds: float = PRESET_INSIGHT_RETRY_SECONDS) -> int:
+        """
+        Count a failed insight generation and schedule its retry with exponential backoff.
+
+        Args:
+            name (str): Preset name
+            content_hash (str): Corpus version the generation ran against
+            insights_key (str): Tab whose insights failed
+            retry_seconds (float): Delay before the first retry; doubled
+                after every further failure
+
+        Returns:
+            int: Failed attempts so far
+        """
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT attempts FROM insight_failures WHERE name = ? AND content_hash = ? AND insights_key = ?",
+                (name, content_hash, insights_key)).fetchone()
+            attempts = (row[0] if row else 0) + 1
+            connection.execute("INSERT OR REPLACE INTO insight_failures VALUES (?, ?, ?, ?, ?)",
+                               (name, content_hash, insights_key, attempts,
+                                time.time() + retry_seconds * 2 ** (attempts - 1)))
+        return attempts
+
+
+class PresetMaterializer:
+    """
+    Background job that materializes the results of every saved preset.
+
+    Each pass evaluates the presets whose stored results are missing or
+    stale (other corpus version or criteria) with the FilterEngine and
+    builds their chart aggregates. With prewarm_insights and an API key it
+    also generates the insights of every tab concurrently. A tab whose
+    insights failed is retried with exponential backoff, and given up after
+    max_attempts failures for the same corpus version; the other tabs are
+    kept. A pass runs every poll interval, and right away after wake()
+    (preset saved) or a corpus reload.
+
+    Args:
+        store (PresetStore): Presets and their results
+        corpus (CorpusSnapshot): Corpus to evaluate presets against
+        api_key (str): OpenAI API key for the insights; empty skips them
+        tabs (list): Insight tab configurations (see INSIGHT_TABS)
+        aggregates (dict): Aggregate name -> builder(corpus, docs)
+        poll_seconds (float): Time between two passes
+        prewarm_insights (bool): Generate the tab insights of every preset
+        retry_seconds (float): Delay before the first retry of a failed tab
+        max_attempts (int): Failures after which a tab is given up
+    """
+
+    def __init__(self, store: PresetStore, corpus, api_key: str = "", tabs=(), aggregates=None,
+                 poll_seconds: float = PRESET_POLL_SECONDS, prewarm_insights: bool = PRESET_PREWARM_INSIGHTS,
+                 retry_seconds: float = PRESET_INSIGHT_RETRY_SECONDS,
+                 max_attempts: int = PRESET_INSIGHT_MAX_ATTEMPTS):
+        self.store = store
+        self.corpus = corpus
+        self.api_key = api_key
+        self.tabs = list(tabs)
+        self.aggregates = dict(aggregates or {})
+        self.poll_seconds = poll_seconds
+        self.prewarm_insights = prewarm_insights
+        self.retry_seconds = retry_seconds
+        self.max_attempts = max_attempts
+
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the materializer thread (a daemon, so it never blocks shutdown)."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="preset-materializer", daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        """Run a pass now, e.g. after a preset was saved."""
+        self._wake.set()
+
+    def on_reload(self, diff, old_corpus, new_corpus):
+        """CorpusWatcher listener: re-materialize against the reloaded corpus."""
+        self.corpus = new_corpus
+        self.wake()
+
+    def _run(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Warning: preset materialization failed: {e}")
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+
+    def run_once(self) -> int:
+        """
+        Materialize every preset whose results are missing or stale.
+
+        Returns:
+            int: Number of presets materialized
+        """
+        corpus = self.corpus
+        engine = FilterEngine.for_corpus(corpus)
+        materialized = 0
+        for name, criteria in self.store.presets().items():
+            previous = self.store.results(name, corpus.content_hash)
+            if previous is not None and not self._missing_tabs(name, corpus.content_hash, previous["insights"]):
+                continue
+            try:
+                self.materialize(engine, name, criteria, previous)
+            except FilterQueryError as e:
+                # E.g. a field the reloaded corpus no longer has; the other presets still run
+                print(f"Warning: preset '{name}' has an invalid filter query: {e}")
+                continue
+            materialized += 1
+        return materialized
+
+    def _missing_tabs(self, name: str, content_hash: str, insights: dict) -> list:
+        """Tabs to generate now: not stored yet, not given up and not waiting for their retry."""
+        if not (self.prewarm_insights and self.api_key):
+            return []
+        failures = self.store.insight_failures(name, content_hash)
+        now = time.time()
+        missing = []
+        for config in self.tabs:
+            key = config["insights_key"]
+            attempts, next_retry = failures.get(key, (0, 0))
+            if key not in insights and attempts < self.max_attempts and next_retry <= now:
+                missing.append(config)
+        return missing
+
+    def materialize(self, engine: FilterEngine, name: str, criteria: dict, previous: dict = None):
+        """
+        Compute and store the results of one preset.
+
+        Args:
+            engine (FilterEngine): Engine of the corpus to evaluate against
+            name (str): Preset name
+            criteria (dict): Filter state of the preset
+            previous (dict): Results already stored for this corpus version
+                and criteria; their aggregates and insights are reused
+        """
+        corpus = engine.corpus
+        if previous is None:
+            docs = engine.docs_for(engine.match(**criteria))
+            aggregates = {aggregate: build(corpus, docs) for aggregate, build in self.aggregates.items()}
+            insights = {}
+        else:
+            docs, aggregates, insights = list(previous["docs"]), previous["aggregates"], dict(previous["insights"])
+
+        missing = self._missing_tabs(name, corpus.content_hash, insights)
+        if missing:
+            insights.update(run(self._generate_insights(corpus, docs, missing)))
+            for config in missing:
+                if config["insights_key"] not in insights:
+                    attempts = self.store.record_insight_failure(name, corpus.content_hash, config["insights_key"],
+                                                                 self.retry_seconds)
+                    if attempts >= self.max_attempts:
+                        print(f"Warning: giving up {config['topic_name']} insights for preset '{name}' "
+                              f"after {attempts} failed attempts")
+
+        self.store.save_results(name, corpus.content_hash, canonical_criteria(criteria), docs, aggregates, insights)
+
+    async def _generate_insights(self, corpus, docs, tabs) -> dict:
+        scheduler = LLMScheduler()
+        results = await scheduler.gather(
+            {config["insights_key"]: generate_tab_insights(corpus, docs, config, self.api_key, scheduler)
+             for config in tabs}
+        )
+        insights = {}
+        for config in tabs:
+            result = results[config["insights_key"]]
+            if result.error is not None:
+                print(f"Warning: could not generate {config['topic_name']} insights for preset: {result.error}")
+                continue
+            tab_insights, token_usage = result.value
+            if tab_insights and str(tab_insights[0]).startswith(INSIGHTS_ERROR_PREFIX):
+                # Failed API call: leave the tab missing so a later pass retries it
+                print(f"Warning: {tab_insights[0]}")
+                continue
+            insights[config["insights_key"]] = {"insights": tab_insights, "token_usage": token_usage}
+        return insights
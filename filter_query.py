@@ -0,0 +1,328 @@
+import re
+from functools import reduce
+
+from country_index import normalize_country
+
+
+# Query field name -> facet it filters on (see FilterEngine)
+QUERY_FIELDS = {
+    "year": "year",
+    "publication_year": "year",
+    "sample_size": "sample_size",
+    "sample": "sample_size",
+    "publication_type": "publication_type",
+    "type": "publication_type",
+    "funding": "funding_type",
+    "funding_type": "funding_type",
+    "funding_source": "funding_type",
+    "study_design": "study_design",
+    "design": "study_design",
+    "country": "country",
+    "country_of_study": "country",
+}
+
+# Facets compared with < <= > >= and lo..hi ranges
+RANGE_QUERY_FACETS = ("year", "sample_size")
+
+_TOKEN_PATTERN = re.compile(r"""
+    \s*(?:
+        (?P<paren>[()])
+      | (?P<op>>=|<=|!=|[:=<>])
+      | "(?P<string>(?:[^"\\]|\\.)*)"
+      | (?P<word>[^\s()"':=<>!]+)
+    )""", re.VERBOSE)
+
+_KEYWORDS = ("AND", "OR", "NOT")
+
+
+class FilterQueryError(ValueError):
+    """Raised for a filter query that cannot be parsed or compiled."""
+
+
+def _tokenize(text: str) -> list:
+    """Split a query into (kind, value, offset) tokens."""
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = _TOKEN_PATTERN.match(text, position)
+        if match is None:
+            rest = text[position:].lstrip()
+            raise FilterQueryError(f"unexpected character {rest[:1]!r} "
+                                   f"at position {len(text) - len(rest) + 1}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        offset = match.start(kind)
+        if kind == "string":
+            value = re.sub(r"\\(.)", r"\1", value)
+        elif kind == "word" and value.upper() in _KEYWORDS:
+            kind, value = "keyword", value.upper()
+        tokens.append((kind, value, offset))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    """
+    Recursive-descent parser of the filter query grammar:
+
+        query  := or
+        or     := and ("OR" and)*
+        and    := unary ("AND"? unary)*        adjacent terms are ANDed
+        unary  := "NOT" unary | "(" or ")" | term
+        term   := field (":" | "=" | "!=") value
+                | range_field (">" | ">=" | "<" | "<=") number
+                | value                        any-field text search
+        value  := word | "quoted string"
+
+    Nodes are tuples:
+        ("or", children) ("and", children) ("not", child)
+        ("range", facet, low, high)   inclusive, None for an open end
+        ("values", facet, value)      categorical value, case-insensitive
+        ("text", field, term)         term search (field None: any field, see FilterEngine.term_bits)
+    """
+
+    def __init__(self, text: str):
+        self.tokens = _tokenize(text)
+        self.index = 0
+
+    def peek(self):
+        return self.tokens[self.index] if self.index < len(self.tokens) else (None, None, None)
+
+    def take(self):
+        token = self.peek()
+        self.index += 1
+        return token
+
+    def error(self, message: str):
+        kind, value, offset = self.peek()
+        where = f"at position {offset + 1}" if offset is not None else "at end of query"
+        raise FilterQueryError(f"{message} {where}")
+
+    def parse(self):
+        if not self.tokens:
+            raise FilterQueryError("empty query")
+        node = self.parse_or()
+        if self.index < len(self.tokens):
+            self.error("unexpected " + repr(self.peek()[1]))
+        return node
+
+    def parse_or(self):
+        children = [self.parse_and()]
+        while self.peek()[:2] == ("keyword", "OR"):
+            self.take()
+            children.append(self.parse_and())
+        return children[0] if len(children) == 1 else ("or", tuple(children))
+
+    def parse_and(self):
+        children = [self.parse_unary()]
+        while True:
+            kind, value, _ = self.peek()
+            if (kind, value) == ("keyword", "AND"):
+                self.take()
+            elif kind is None or (kind, value) in (("keyword", "OR"), ("paren", ")")):
+                break
+            children.append(self.parse_unary())
+        return children[0] if len(children) == 1 else ("and", tuple(children))
+
+    def parse_unary(self):
+        kind, value, _ = self.peek()
+        if (kind, value) == ("keyword", "NOT"):
+            self.take()
+            return ("not", self.parse_unary())
+        if (kind, value) == ("paren", "("):
+            self.take()
+            node = self.parse_or()
+            if self.peek()[:2] != ("paren", ")"):
+                self.error("expected ')'")
+            self.take()
+            return node
+        if kind not in ("word", "string"):
+            self.error("expected a filter term")
+        return self.parse_term()
+
+    def parse_term(self):
+        kind, name, _ = self.take()
+        if self.peek()[0] != "op":
+            # Bare word or phrase: search every field
+            return ("text", None, name)
+        if kind != "word":
+            self.error("expected a value after a quoted string, not an operator")
+
+        _, op, _ = self.take()
+        value_kind, value, _ = self.take()
+        if value_kind not in ("word", "string"):
+            self.index -= 1
+            self.error(f"expected a value after '{name}{op}'")
+
+        facet = QUERY_FIELDS.get(name.lower())
+        if facet in RANGE_QUERY_FACETS:
+            node = self.range_term(facet, op, value)
+        elif op in (":", "=", "!="):
+            node = ("values", facet, value) if facet else ("text", name, value)
+        else:
+            self.index -= 1
+            self.error(f"'{op}' needs a numeric field (year or sample_size), not '{name}'")
+        return ("not", node) if op == "!=" else node
+
+    def range_term(self, facet: str, op: str, value: str):
+        low_text, separator, high_text = value.partition("..")
+        try:
+            low = int(low_text) if low_text else None
+            high = int(high_text) if high_text else None
+        except ValueError:
+            self.index -= 1
+            self.error(f"expected a whole number or lo..hi range for {facet}")
+        if not separator:
+            high = low
+        if separator and op not in (":", "=", "!="):
+            self.index -= 1
+            self.error(f"a lo..hi range cannot be combined with '{op}'")
+
+        if op == ">":
+            low, high = low + 1, None
+        elif op == ">=":
+            high = None
+        elif op == "<":
+            low, high = None, low - 1
+        elif op == "<=":
+            low, high = None, low
+        return ("range", facet, low, high)
+
+
+def parse_query(text: str) -> tuple:
+    """
+    Parse a filter query into its syntax tree.
+
+    Example:
+        (study_design:"In vitro" OR study_design:"In vivo") AND year>=2022 AND NOT funding:Industry
+
+    Fields are the facets (year, sample_size, publication_type, funding,
+    study_design, country and the aliases in QUERY_FIELDS) or any field path of the
+    term index (harmful_ingredients.name:formaldehyde); a bare word or
+    phrase searches every field.
+
+    Raises:
+        FilterQueryError: With the position of the first syntax error
+    """
+    return _Parser(str(text)).parse()
+
+
+def _quote(value) -> str:
+    value = str(value)
+    if re.fullmatch(r"[^\s()\"':=<>!]+", value) and value.upper() not in _KEYWORDS:
+        return value
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def format_query(node, parent: str = None) -> str:
+    """Render a syntax tree back into canonical query text."""
+    kind = node[0]
+    if kind in ("or", "and"):
+        text = f" {kind.upper()} ".join(format_query(child, kind) for child in node[1])
+        # NOT binds tighter than AND, and AND tighter than OR
+        needs_parentheses = parent == "not" or (kind == "or" and parent == "and")
+        return f"({text})" if needs_parentheses else text
+    if kind == "not":
+        return f"NOT {format_query(node[1], 'not')}"
+    if kind == "range":
+        _, facet, low, high = node
+        if low is not None and high is not None:
+            return f"{facet}:{low}" if low == high else f"{facet}:{low}..{high}"
+        if low is not None:
+            return f"{facet}>={low}"
+        if high is not None:
+            return f"{facet}<={high}"
+        return f"{facet}:.."
+    _, field, value = node
+    return _quote(value) if field is None else f"{field}:{_quote(value)}"
+
+
+def canonical_query(text: str) -> str:
+    """
+    Canonical text of a filter query, so equivalent spellings share one key.
+
+    Keywords are upper-cased, aliases resolved, redundant parentheses and
+    whitespace dropped and ranges normalized.
+
+    Raises:
+        FilterQueryError: If the query does not parse
+    """
+    return format_query(parse_query(text))
+
+
+class QueryPlan:
+    """
+    A filter query compiled against a FilterEngine.
+
+    Every leaf is resolved to a document bitset up front: categorical values
+    through the per-value bitsets, ranges through binary searches over the
+    range index, text terms through FilterEngine.term_bits. Evaluating the plan is
+    then a handful of AND/OR/NOT operations on Python ints, so its cost
+    depends on the number of terms and the bitset width, not on how many
+    cells the documents have.
+
+    Args:
+        engine (FilterEngine): Engine of the corpus to query
+        query (str or tuple): Query text or a parsed syntax tree
+    """
+
+    def __init__(self, engine, query):
+        self.engine = engine
+        self.tree = parse_query(query) if isinstance(query, str) else query
+        self.text = format_query(self.tree)
+        self.plan = self._compile(self.tree)
+
+    def _compile(self, node):
+        kind = node[0]
+        if kind in ("or", "and"):
+            return (kind, tuple(self._compile(child) for child in node[1]))
+        if kind == "not":
+            return ("not", self._compile(node[1]))
+        return ("bits", self._leaf_bits(node))
+
+    def _leaf_bits(self, node) -> int:
+        engine = self.engine
+        kind = node[0]
+        if kind == "text":
+            _, field, term = node
+            if field is not None and field not in engine.term_fields:
+                raise FilterQueryError(f"unknown field '{field}'")
+            return engine.term_bits(field, term)
+
+        facet = node[1]
+        if not engine.available[facet]:
+            # Like the sidebar filters, a facet missing from the corpus does not filter
+            return engine.all_bits
+        if kind == "range":
+            _, _, low, high = node
+            return engine.range_bits(facet, float("-inf") if low is None else low,
+                                     float("inf") if high is None else high)
+
+        if facet == "country":
+            # Any spelling of a country matches its ISO code
+            code = normalize_country(node[2])
+            return engine.values_bits(facet, [code] if code else [])
+
+        wanted = str(node[2]).casefold()
+        values = [value for value in engine.value_bits[facet] if str(value).casefold() == wanted]
+        return engine.values_bits(facet, values)
+
+    def evaluate(self) -> int:
+        """Bitset of the documents matching the query."""
+        return self._evaluate(self.plan)
+
+    def _evaluate(self, step) -> int:
+        kind = step[0]
+        if kind == "bits":
+            return step[1]
+        if kind == "not":
+            return self.engine.all_bits & ~self._evaluate(step[1])
+        operands = (self._evaluate(child) for child in step[1])
+        if kind == "and":
+            return reduce(lambda left, right: left & right, operands)
+        return reduce(lambda left, right: left | right, operands)
+
+    def docs(self) -> list:
+        """Matching document column names, in corpus order."""
+        return self.engine.docs_for(self.evaluate())
@@ -0,0 +1,131 @@
+"""
+Benchmark workbook ingestion: pd.read_excel vs. streaming read-only parsing.
+
+Generates a synthetic wide workbook (field rows x paper columns) whose papers
+are resampled from the real metadata workbook, then loads it once per mode in
+a fresh subprocess and reports wall time and peak resident memory.
+
+    python ingest_benchmark.py [--papers N] [--workbook PATH] [--keep]
+
+Modes:
+    pandas          pd.read_excel + dense cells (the default loader)
+    pandas-sparse   pd.read_excel + sparse cells
+    streaming       stream_workbook_cells (openpyxl read-only, sparse cells)
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import tempfile
+import subprocess
+
+import pandas as pd
+
+from cell_store import LABEL_COLUMNS
+
+MODES = ("pandas", "pandas-sparse", "streaming")
+
+# Excel sheets end at column XFD, so the wide layout holds at most this many papers
+MAX_PAPERS = 16384 - LABEL_COLUMNS
+
+
+def generate_workbook(path: str, papers: int, source: str, seed: int = 0):
+    """
+    Write a synthetic workbook with the field rows of source and resampled papers.
+
+    Each synthetic paper copies the cells of a random real paper, so the fill
+    ratio and value mix match the real corpus. Written with openpyxl's
+    write-only mode, one row at a time.
+    """
+    from openpyxl import Workbook
+
+    df = pd.read_excel(source)
+    labels = df.iloc[:, :LABEL_COLUMNS]
+    real = df.iloc[:, LABEL_COLUMNS:].astype(object)
+    real = real.where(real.notna(), None)
+
+    rng = random.Random(seed)
+    picks = [rng.randrange(real.shape[1]) for _ in range(papers)]
+    cells = real.to_numpy()
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(list(labels.columns) + [f"paper_{i:05d}.pdf" for i in range(papers)])
+    for row_idx, label in enumerate(labels.itertuples(index=False)):
+        label = [None if pd.isna(value) else value for value in label]
+        sheet.append(label + [cells[row_idx, pick] for pick in picks])
+    workbook.save(path)
+
+
+def measure(mode: str, workbook_path: str) -> dict:
+    """Load the workbook once in this process and report time and memory."""
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    from corpus_store import stream_workbook_cells
+    from cell_store import CELL_STORES
+
+    start = time.perf_counter()
+    if mode == "streaming":
+        cells = stream_workbook_cells(workbook_path)
+    else:
+        storage = "sparse" if mode == "pandas-sparse" else "dense"
+        cells = CELL_STORES[storage].from_frame(pd.read_excel(workbook_path))
+    seconds = time.perf_counter() - start
+
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "mode": mode,
+        "seconds": round(seconds, 2),
+        "peak_rss_mb": round(peak_kb / 1024, 1),
+        "ingest_rss_mb": round((peak_kb - baseline_kb) / 1024, 1),
+        "store_mb": round(cells.nbytes / 2 ** 20, 1),
+        "cells": int(len(cells.triples()[0])),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--papers", type=int, default=MAX_PAPERS,
+                        help=f"synthetic paper columns (at most {MAX_PAPERS})")
+    parser.add_argument("--workbook", help="benchmark an existing workbook instead")
+    parser.add_argument("--source", default="E_Cigarette_Research_Metadata_Consolidated.xlsx",
+                        help="workbook the synthetic papers are sampled from")
+    parser.add_argument("--keep", action="store_true", help="keep the generated workbook")
+    parser.add_argument("--measure", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.workbook)))
+        return
+
+    workbook_path = args.workbook
+    if workbook_path is None:
+        papers = min(args.papers, MAX_PAPERS)
+        if papers < args.papers:
+            print(f"Capping at {MAX_PAPERS} papers (Excel's 16,384-column limit)")
+        workbook_path = os.path.join(tempfile.mkdtemp(), f"synthetic_{papers}.xlsx")
+        start = time.perf_counter()
+        generate_workbook(workbook_path, papers, args.source)
+        print(f"Generated {workbook_path} ({os.path.getsize(workbook_path) / 2 ** 20:.1f} MB) "
+              f"in {time.perf_counter() - start:.1f}s")
+
+    try:
+        for mode in MODES:
+            output = subprocess.run(
+                [sys.executable, __file__, "--measure", mode, "--workbook", workbook_path],
+                capture_output=True, text=True, check=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{result['mode']:<14} {result['seconds']:>8.2f}s  peak RSS {result['peak_rss_mb']:>8.1f} MB"
+                  f"  (+{result['ingest_rss_mb']:.1f} MB during ingest)  store {result['store_mb']:.1f} MB"
+                  f"  {result['cells']} cells")
+    finally:
+        if args.workbook is None and not args.keep:
+            os.remove(workbook_path)
+
+
+if __name__ == "__main__":
+    main()
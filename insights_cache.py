@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from contextlib import closing, contextmanager
+
+
+# SQLite file of the generated insights cache (override with INSIGHTS_CACHE_PATH)
+INSIGHTS_CACHE_PATH = os.environ.get("INSIGHTS_CACHE_PATH", "insights_cache/insights.sqlite")
+
+# Total size of the cached entries before the least recently used ones are evicted
+INSIGHTS_CACHE_MAX_BYTES = int(float(os.environ.get("INSIGHTS_CACHE_MAX_MB", "64")) * 2 ** 20)
+
+# Entries older than this are evicted (override with INSIGHTS_CACHE_MAX_AGE_DAYS)
+INSIGHTS_CACHE_MAX_AGE_SECONDS = float(os.environ.get("INSIGHTS_CACHE_MAX_AGE_DAYS", "30")) * 86400
+
+
+def insights_cache_key(payload: str, topic_name: str, focus_prompt, model: str, temperature: float) -> str:
+    """
+    Content address of one insights request.
+
+    Everything that determines the completion is hashed (the formatted
+    insights payload, topic, focus prompt, model and temperature) and nothing
+    else, so identical requests share an entry whatever the session or API key.
+
+    Returns:
+        str: Hex SHA-256 digest
+    """
+    request = json.dumps([payload, topic_name, focus_prompt, model, temperature], ensure_ascii=False)
+    return hashlib.sha256(request.encode("utf-8")).hexdigest()
+
+
+class InsightsCache:
+    """
+    Disk-backed cache of generated insights: request key -> (bullets, token usage).
+
+    Entries survive restarts and are shared by every session and process
+    using the same file. Entries older than max_age_seconds are never served
+    and are deleted on the next write; when the cached entries exceed
+    max_bytes, the least recently used ones are deleted.
+
+    Every call opens its own connection, so the cache can be used from the
+    Streamlit script thread and background threads alike.
+
+    Args:
+        db_path (str): Path to the SQLite file (created on first use)
+        max_bytes (int): Total size of the entries kept
+        max_age_seconds (float): Age after which an entry expires
+    """
+
+    def __init__(self, db_path: str = INSIGHTS_CACHE_PATH, max_bytes: int = INSIGHTS_CACHE_MAX_BYTES,
+                 max_age_seconds: float = INSIGHTS_CACHE_MAX_AGE_SECONDS):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript("""
+                CREATE TABLE IF NOT EXISTS insights (
+                    key TEXT PRIMARY KEY,
+                    insights TEXT NOT NULL,
+                    token_usage TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    used REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS insights_by_used ON insights (used);
+            """)
+
+    @contextmanager
+    def _connect(self):
+        # Committed (or rolled back) as one transaction, then closed: the
+        # connection's own context manager does not close it
+        with closing(sqlite3.connect(self.db_path, timeout=30)) as connection, connection:
+            yield connection
+
+    def get(self, key: str):
+        """
+        Cached result of a request.
+
+        Args:
+            key (str): Request key (see insights_cache_key)
+
+        Returns:
+            tuple or None: (list of bullet points, dict with token usage), or
+            None if the request is not cached or its entry expired
+        """
+        now = time.time()
+        with self._connect() as connection:
+            row = connection.execute("SELECT insights, token_usage FROM insights WHERE key = ? AND created >= ?",
+                                     (key, now - self.max_age_seconds)).fetchone()
+            if row is not None:
+                connection.execute("UPDATE insights SET used = ? WHERE key = ?", (now, key))
+
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0]), json.loads(row[1])
+
+    def put(self, key: str, insights: list, token_usage: dict):
+        """
+        Store the result of a request, then evict expired and excess entries.
+
+        Args:
+            key (str): Request key (see insights_cache_key)
+            insights (list): Generated bullet points
+            token_usage (dict): Token usage of the completion
+        """
+        insights_text = json.dumps(insights, ensure_ascii=False)
+        usage_text = json.dumps(token_usage)
+        size = len(insights_text.encode("utf-8")) + len(usage_text) + len(key)
+        now = time.time()
+
+        with self._connect() as connection:
+            connection.execute("INSERT OR REPLACE INTO insights VALUES (?, ?, ?, ?, ?, ?)",
+                               (key, insights_text, usage_text, size, now, now))
+            self._evict(connection, now)
+
+    def _evict(self, connection: sqlite3.Connection, now: float):
+        connection.execute("DELETE FROM insights WHERE created < ?", (now - self.max_age_seconds,))
+
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM insights").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Least recently used first, until the rest fits
+        evicted = []
+        for key, size in connection.execute("SELECT key, size FROM insights ORDER BY used"):
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        connection.executemany("DELETE FROM insights WHERE key = ?", evicted)
+
+    def clear(self):
+        with self._connect() as connection:
+            connection.execute("DELETE FROM insights")
+
+    def stats(self) -> dict:
+        """Hit/miss counters of this process and the current size of the cache."""
+        with self._connect() as connection:
+            entries, size = connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM insights").fetchone()
+        return {"entries": entries, "bytes": size, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses}
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_insights_cache() -> InsightsCache:
+    """The process-wide InsightsCache at INSIGHTS_CACHE_PATH, opened on first use."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = InsightsCache()
+        return _default_cache
@@ -1,17 +1,30 @@
 import streamlit as st
 import pandas as pd
-from functools import lru_cache
-from openai import AsyncOpenAI
+from openai_clients import get_async_client, complete_chat_streaming
 
+from insights_cache import get_insights_cache, insights_cache_key
+from llm_scheduler import LLMScheduler, estimate_tokens
 
 
-def extract_research_insights_from_docs(df, matching_docs, categories_to_extract):
+# Start of the insights returned when the API call failed (such results are not worth keeping)
+INSIGHTS_ERROR_PREFIX = "Error generating"
+
+# Completion settings of the tab insights (part of the insights cache key)
+INSIGHTS_MODEL = "gpt-4.1"
+INSIGHTS_TEMPERATURE = 0.3
+INSIGHTS_MAX_TOKENS = 4096
+
+# GPT-4.1 context window, shown as the share of it the insights used
+INSIGHTS_TOKEN_LIMIT = 1000000
+
+
+def extract_research_insights_from_docs(corpus, matching_docs, categories_to_extract):
     """
     Extract comprehensive research insights from matching documents using custom categories.
     Only includes non-missing attributes to provide better context.
     
     Args:
-        df (DataFrame): The dataframe containing all research data
+        corpus (CorpusSnapshot): The shared research corpus
         matching_docs (list): List of document columns that match filter criteria
         categories_to_extract (dict, optional): Dictionary of categories and subcategories to extract
                                                If None, uses default categories
@@ -21,43 +34,33 @@ def extract_research_insights_from_docs(df, matching_docs, categories_to_extract
     """
     insights = {}
     
+    # Resolve every field name to its row positions once, not once per document
+    plan = corpus.resolver.plan("insights", categories_to_extract)
+    
+    title_rows = corpus.rows(category='title')
+    meta_title_rows = title_rows[title_rows['Main Category'] == 'meta_data']
+    
     # For each matching document, extract the insights
     for doc_col in matching_docs:
         doc_insights = {}
         
         # Get title if available
         title = None
-        title_row = df[(df['Main Category'] == 'meta_data') & (df['Category'] == 'title')]
-        if not title_row.empty:
-            title = title_row[doc_col].iloc[0]
+        if not meta_title_rows.empty:
+            title = meta_title_rows[doc_col].iloc[0]
         if title is None:
-            title_row = df[df['Category'] == 'title']
-            if not title_row.empty:
-                title = title_row[doc_col].iloc[0]
+            title = corpus.value(doc_col, category='title')
         
         doc_identifier = title if title and not pd.isna(title) else doc_col
         
         # Process each main category
-        for main_category, subcategories in categories_to_extract.items():
+        for main_category, fields in plan:
             category_insights = {}
             
-            for subcategory in subcategories:
-                # Look for exact matches first
-                subcategory_rows = df[df['Category'] == subcategory]
-                
-                # If not found, try partial matches
-                if subcategory_rows.empty:
-                    subcategory_rows = df[df['Category'].str.contains(subcategory, na=False)]
-                
-                # If still not found, look for it in SubCategory
-                if subcategory_rows.empty and 'SubCategory' in df.columns:
-                    subcategory_rows = df[df['SubCategory'] == subcategory]
-                    
-                    if subcategory_rows.empty:
-                        subcategory_rows = df[df['SubCategory'].str.contains(subcategory, na=False)]
-                
-                if not subcategory_rows.empty:
-                    subcategory_data = subcategory_rows[doc_col].dropna().tolist()
+            # Positions follow exact Category, Category contains, exact SubCategory, SubCategory contains
+            for subcategory, positions in fields:
+                if positions:
+                    subcategory_data = corpus.values_at(doc_col, positions)
                     # Only include non-empty data
                     if subcategory_data and any(str(item).strip() != "" for item in subcategory_data):
                         category_insights[subcategory] = subcategory_data
@@ -73,15 +76,107 @@ def extract_research_insights_from_docs(df, matching_docs, categories_to_extract
     return insights
 
 
-async def generate_insights_with_gpt4o(insights_data, api_key, topic_name="Research", custom_focus_prompt=None):
+def format_insights_payload(insights_data):
+    """
+    Format the structured insights data into the readable text sent in the prompt.
+    
+    Args:
+        insights_data (dict): Structured insights data organized by document and category
+        
+    Returns:
+        str: One block per document, with a readable line per subcategory value
+    """
+    formatted_insights = []
+    
+    for doc_id, doc_data in insights_data.items():
+        formatted_insights.append(f"DOCUMENT: {doc_id}")
+        
+        for category, category_data in doc_data.items():
+            # Add category header only if there's actual data
+            if category_data:
+                formatted_insights.append(f"\n{category}:")
+                
+                for subcategory, values in category_data.items():
+                    # Skip empty values
+                    if not values or all(pd.isna(v) for v in values) or all(str(v).strip() == "" for v in values):
+                        continue
+                        
+                    # Create a human-readable version of the subcategory by replacing dots and underscores
+                    readable_subcategory = subcategory.replace('.', ' → ').replace('_', ' ').title()
+                    
+                    if isinstance(values, list):
+                        # For lists, prefix each value with its meaning
+                        if len(values) == 1:
+                            formatted_insights.append(f"  - {readable_subcategory}: {values[0]}")
+                        else:
+                            formatted_insights.append(f"  - {readable_subcategory}:")
+                            for i, val in enumerate(values):
+                                if str(val).strip():  # Only include non-empty values
+                                    formatted_insights.append(f"      * Value {i+1}: {val}")
+                    else:
+                        if str(values).strip():  # Only include non-empty values
+                            formatted_insights.append(f"  - {readable_subcategory}: {values}")
+                    
+        formatted_insights.append("\n---\n")
+    
+    return '\n'.join(formatted_insights)
+
+
+def parse_insight_bullets(insights_text):
+    """
+    Split generated insights text into bullet points.
+    
+    Also used on the partial text of a streaming completion, so the bullets
+    can be rendered while they are being generated.
+    
+    Args:
+        insights_text (str): Completion text, bullets starting with '•'
+        
+    Returns:
+        list: Bullet points, each starting with '•' (or plain lines if the text has no bullets)
+    """
+    # Split the text into bullet points, making sure each starts with •
+    bullet_points = []
+    for line in insights_text.split('\n'):
+        line = line.strip()
+        if line and line.startswith('•'):
+            # Remove any potential nested bullets by replacing any bullet characters
+            # that might appear after the initial bullet with their text equivalent
+            clean_line = line.replace(' • ', ': ')  # Replace nested bullets with colons
+            bullet_points.append(clean_line)
+        elif line and bullet_points:  # For lines that might be continuation of previous bullet point
+            # Make sure there are no bullet characters in continuation lines
+            clean_line = line.replace('•', '')
+            bullet_points[-1] += ' ' + clean_line
+    
+    # If no bullet points were found with •, try to parse by lines
+    if not bullet_points:
+        bullet_points = [line.strip().replace('•', '') for line in insights_text.split('\n') if line.strip()]
+    
+    return bullet_points
+
+
+async def generate_insights_with_gpt4o(insights_data, api_key, topic_name="Research", custom_focus_prompt=None,
+                                       scheduler=None, on_delta=None):
     """
     Pass the extracted research insights to GPT-4o and get concise bullet point insights.
     
+    Results are kept in the persistent insights cache, keyed by the formatted
+    payload, topic, focus prompt, model and temperature, so identical requests
+    are answered from disk across sessions and restarts.
+    
+    With on_delta, the completion is streamed and on_delta receives every
+    text delta, and None whenever a (retried) request starts over; cached
+    results are returned without calling it.
+    
     Args:
         insights_data (dict): Structured insights data organized by document and category
         api_key (str): OpenAI API key
         topic_name (str): The name of the topic for prompt customization
         custom_focus_prompt (str, optional): Custom prompt section for specific focus areas
+        scheduler (LLMScheduler, optional): Paces and retries the API request; shared
+            by the requests of one batch so they respect the rate limits together
+        on_delta (callable, optional): Streams the completion to this callback (see complete_chat_streaming)
         
     Returns:
         tuple: (list of generated bullet points with insights, dict with token usage information)
@@ -90,42 +185,19 @@ async def generate_insights_with_gpt4o(insights_data, api_key, topic_name="Resea
         return [f"No {topic_name.lower()} insights found in the filtered documents."], {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
     
     try:
-        # Initialize OpenAI client
-        client = AsyncOpenAI(api_key=api_key)
-        
         # Format the structured insights data into a readable text format for the prompt with improved context
-        formatted_insights = []
+        payload = format_insights_payload(insights_data)
         
-        for doc_id, doc_data in insights_data.items():
-            formatted_insights.append(f"DOCUMENT: {doc_id}")
-            
-            for category, category_data in doc_data.items():
-                # Add category header only if there's actual data
-                if category_data:
-                    formatted_insights.append(f"\n{category}:")
-                    
-                    for subcategory, values in category_data.items():
-                        # Skip empty values
-                        if not values or all(pd.isna(v) for v in values) or all(str(v).strip() == "" for v in values):
-                            continue
-                            
-                        # Create a human-readable version of the subcategory by replacing dots and underscores
-                        readable_subcategory = subcategory.replace('.', ' → ').replace('_', ' ').title()
-                        
-                        if isinstance(values, list):
-                            # For lists, prefix each value with its meaning
-                            if len(values) == 1:
-                                formatted_insights.append(f"  - {readable_subcategory}: {values[0]}")
-                            else:
-                                formatted_insights.append(f"  - {readable_subcategory}:")
-                                for i, val in enumerate(values):
-                                    if str(val).strip():  # Only include non-empty values
-                                        formatted_insights.append(f"      * Value {i+1}: {val}")
-                        else:
-                            if str(values).strip():  # Only include non-empty values
-                                formatted_insights.append(f"  - {readable_subcategory}: {values}")
-                        
-            formatted_insights.append("\n---\n")
+        # Identical requests are served from the persistent cache
+        cache = get_insights_cache()
+        cache_key = insights_cache_key(payload, topic_name, custom_focus_prompt, INSIGHTS_MODEL, INSIGHTS_TEMPERATURE)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        # Shared pooled client (retries are left to the scheduler)
+        client = get_async_client(api_key).with_options(max_retries=0)
+        scheduler = scheduler or LLMScheduler()
         
         # Prepare the prompt with specific formatting instructions
         prompt = f"""
@@ -144,21 +216,32 @@ async def generate_insights_with_gpt4o(insights_data, api_key, topic_name="Resea
 
         Here are the {topic_name.lower()} insights:
         
-        {'\n'.join(formatted_insights)}
+        {payload}
         
         Please respond with only the bullet points, each starting with a '•' character.
         """
         
-        # Make API call to GPT-4.1
-        response = await client.chat.completions.create(
-            model="gpt-4.1",
-            messages=[
-                {"role": "system", "content": f"You are a helpful assistant that generates concise {topic_name.lower()} insights with simple bullet points. Never use nested bullet points. Always clearly indicate what metrics and units are being used."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3,
-            max_tokens=4096
-        )
+        messages = [
+            {"role": "system", "content": f"You are a helpful assistant that generates concise {topic_name.lower()} insights with simple bullet points. Never use nested bullet points. Always clearly indicate what metrics and units are being used."},
+            {"role": "user", "content": prompt}
+        ]
+        request = {
+            "model": INSIGHTS_MODEL,
+            "messages": messages,
+            "temperature": INSIGHTS_TEMPERATURE,
+            "max_tokens": INSIGHTS_MAX_TOKENS
+        }
+        estimated_tokens = sum(estimate_tokens(message["content"]) for message in messages)
+        
+        # Make API call to GPT-4.1, within the rate limits and retried on 429/5xx
+        if on_delta is None:
+            response = await scheduler.call(lambda: client.chat.completions.create(**request), estimated_tokens)
+            insights_text = response.choices[0].message.content
+        else:
+            # The whole stream runs inside the scheduler slot, so a retry streams again from the start
+            response = await scheduler.call(lambda: complete_chat_streaming(client, on_delta, **request),
+                                            estimated_tokens)
+            insights_text = response.text
         
         # Extract token usage information
         token_usage = {
@@ -168,45 +251,74 @@ async def generate_insights_with_gpt4o(insights_data, api_key, topic_name="Resea
         }
         
         # Extract and process the bullet points
-        insights_text = response.choices[0].message.content
-        
-        # Split the text into bullet points, making sure each starts with •
-        bullet_points = []
-        for line in insights_text.split('\n'):
-            line = line.strip()
-            if line and line.startswith('•'):
-                # Remove any potential nested bullets by replacing any bullet characters
-                # that might appear after the initial bullet with their text equivalent
-                clean_line = line.replace(' • ', ': ')  # Replace nested bullets with colons
-                bullet_points.append(clean_line)
-            elif line and bullet_points:  # For lines that might be continuation of previous bullet point
-                # Make sure there are no bullet characters in continuation lines
-                clean_line = line.replace('•', '')
-                bullet_points[-1] += ' ' + clean_line
-        
-        # If no bullet points were found with •, try to parse by lines
-        if not bullet_points:
-            bullet_points = [line.strip().replace('•', '') for line in insights_text.split('\n') if line.strip()]
+        bullet_points = parse_insight_bullets(insights_text)
         
+        cache.put(cache_key, bullet_points, token_usage)
         return bullet_points, token_usage
     
     except Exception as e:
-        return [f"Error generating {topic_name.lower()} insights: {str(e)}"], {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        return [f"{INSIGHTS_ERROR_PREFIX} {topic_name.lower()} insights: {str(e)}"], {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+
+
+async def generate_tab_insights(corpus, matching_docs, config, api_key, scheduler=None, on_delta=None):
+    """
+    Generate the insights of one insight tab for a set of documents.
     
+    Args:
+        corpus: Research corpus (CorpusSnapshot)
+        matching_docs (list): Document column names to summarize
+        config (dict): Tab configuration (see INSIGHT_TABS in prompts_and_categories)
+        api_key (str): OpenAI API key
+        scheduler (LLMScheduler, optional): Scheduler shared by the tabs generated together
+        on_delta (callable, optional): Receives the text deltas while streaming
+        
+    Returns:
+        tuple: (list of generated bullet points with insights, dict with token usage information)
+    """
+    topic_name = config["topic_name"]
+    research_insights = extract_research_insights_from_docs(corpus, matching_docs, config["categories"])
+    if not research_insights:
+        return ([f"No {topic_name.lower()} insights found in the filtered documents."],
+                {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0})
+    return await generate_insights_with_gpt4o(research_insights, api_key, topic_name, config["prompt"], scheduler,
+                                              on_delta)
+
 
-# Add a cache for API responses
-@lru_cache(maxsize=32)
-def cached_generate_insights(insights_data_str, api_key, topic_name, custom_focus_prompt):
-    """Cached version of the generate_insights function to avoid duplicate API calls"""
-    # Convert insights_data_str back to dictionary
-    import json
-    insights_data = json.loads(insights_data_str)
-    insights, token_usage = generate_insights_with_gpt4o(insights_data, api_key, topic_name, custom_focus_prompt)
-    # Return both the insights and token usage
-    return insights, token_usage
+def render_insights_html(insights, token_usage=None, timing=None, height=525):
+    """
+    HTML of an insights box: the bullet points and a footer with token usage and timing.
+    
+    Args:
+        insights (list): Bullet points
+        token_usage (dict, optional): Token usage of the completion
+        timing (dict, optional): {"ttft_seconds": float or None, "seconds": float} from
+            the Generate Insights click to the first streamed token and to the result
+        height (int): Box height in pixels
+        
+    Returns:
+        str: HTML for st.markdown(..., unsafe_allow_html=True)
+    """
+    insights_html = f'<div style="height: {height}px; overflow-y: auto; padding: 0.5rem; border: 2px solid #f8d6d5; border-radius: 0.5rem;">'
+    for insight in insights:
+        insights_html += f"<p>{insight}</p>"
+    
+    footer = []
+    if token_usage is not None:
+        token_percentage = (token_usage["total_tokens"] / INSIGHTS_TOKEN_LIMIT) * 100
+        footer.append(f"Tokens used: {token_usage['total_tokens']} ({token_percentage:.1f}% of 1 million token limit)")
+    if timing is not None:
+        if timing.get("ttft_seconds") is not None:
+            footer.append(f"First token after {timing['ttft_seconds']:.1f}s, complete after {timing['seconds']:.1f}s")
+        else:
+            footer.append(f"Ready after {timing['seconds']:.1f}s (not streamed: cached or no data)")
+    if footer:
+        insights_html += f"<p style='font-size: 0.8em; color: #666; border-top: 1px solid #ddd; padding-top: 5px;'>{'<br>'.join(footer)}</p>"
+    
+    insights_html += "</div>"
+    return insights_html
 
 
-def display_insights(df, matching_docs, section_title="Research Insights", 
+def display_insights(corpus, matching_docs, section_title="Research Insights", 
                      topic_name="Research", categories_to_extract=None, 
                      custom_focus_prompt=None,
                      wordcloud_path="Images/ecigarette_research_wordcloud.png",
@@ -214,7 +326,11 @@ def display_insights(df, matching_docs, section_title="Research Insights",
                      tab_index=-1, height=525):
     """
     Displays insights for a single tab with async processing support.
-    Note: Categories and prompts for Tab 3 subtabs are handled in process_all_tabs_async().
+    Note: Categories and prompts for Tab 3 subtabs are handled in process_all_tabs().
+    
+    The box is rendered into a placeholder registered in
+    st.session_state.insight_placeholders under its insights key, so insights
+    generated later in the same run can be streamed into it.
     """
     st.subheader(section_title)
     
@@ -246,22 +362,17 @@ def display_insights(df, matching_docs, section_title="Research Insights",
                 insights_key = "generated_cardiovascular_health_insights"
                 token_usage_key = f"{insights_key}_token_usage"
         
+        # Placeholder the insights can be streamed into later in this run
+        placeholder = st.empty()
+        st.session_state.setdefault("insight_placeholders", {})[insights_key] = (placeholder, height)
+        
         # Display generated insights if available
         if insights_key in st.session_state:
-            # Display previously generated insights with direct height styling
-            insights_html = f'<div style="height: {height}px; overflow-y: auto; padding: 0.5rem; border: 2px solid #f8d6d5; border-radius: 0.5rem;">'
-            for insight in st.session_state[insights_key]:
-                insights_html += f"<p>{insight}</p>"
-            
-            # Add token usage information at the bottom if available
-            if token_usage_key in st.session_state:
-                token_usage = st.session_state[token_usage_key]
-                token_limit = 1000000  # GPT-4.1 token limit
-                token_percentage = (token_usage["total_tokens"] / token_limit) * 100
-                insights_html += f"<p style='font-size: 0.8em; color: #666; border-top: 1px solid #ddd; padding-top: 5px;'>Tokens used: {token_usage['total_tokens']} ({token_percentage:.1f}% of 1 million token limit)</p>"
-            
-            insights_html += "</div>"
-            st.markdown(insights_html, unsafe_allow_html=True)
+            # Display previously generated insights with direct height styling, token usage and timing
+            insights_html = render_insights_html(st.session_state[insights_key],
+                                                 st.session_state.get(token_usage_key),
+                                                 st.session_state.get(f"{insights_key}_timing"), height)
+            placeholder.markdown(insights_html, unsafe_allow_html=True)
             
         else:
             # Empty state with wordcloud and direct height styling
@@ -285,9 +396,9 @@ def display_insights(df, matching_docs, section_title="Research Insights",
                     <img src="data:image/png;base64,{encoded_image}" style="width: 100%; height: 100%; object-fit: cover; padding: 35px 0px 15px 0px;" />
                 </div>
                 """
-                st.markdown(html, unsafe_allow_html=True)
+                placeholder.markdown(html, unsafe_allow_html=True)
             except Exception as e:
-                st.markdown(f"""
+                placeholder.markdown(f"""
                 <div style="height: {height}px; overflow-y: auto; padding: 0.5rem; border: 2px solid #f8d6d5; border-radius: 0.5rem; display: flex; flex-direction: column; align-items: center; justify-content: center;">
                     <p style="color: #666; text-align: center;">{message}</p>
                     <p style="color: #999; font-size: 0.8em;">Unable to load wordcloud image: {str(e)}</p>
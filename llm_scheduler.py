@@ -0,0 +1,180 @@
+import os
+import time
+import random
+import asyncio
+from collections import namedtuple
+
+from openai import APIConnectionError, APIStatusError, RateLimitError
+
+
+# Requests in flight at once (override with LLM_MAX_CONCURRENCY)
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "4"))
+
+# Account rate limits the requests are paced to (override with LLM_REQUESTS_PER_MINUTE / LLM_TOKENS_PER_MINUTE)
+LLM_REQUESTS_PER_MINUTE = float(os.environ.get("LLM_REQUESTS_PER_MINUTE", "500"))
+LLM_TOKENS_PER_MINUTE = float(os.environ.get("LLM_TOKENS_PER_MINUTE", "30000"))
+
+# Retries of a rate-limited (429), failed (5xx) or dropped request, and their backoff bounds in seconds
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "5"))
+LLM_BACKOFF_BASE_SECONDS = 1.0
+LLM_BACKOFF_MAX_SECONDS = 30.0
+
+# Outcome of one scheduled task: its return value or the exception it raised, and its wall time
+TaskResult = namedtuple("TaskResult", ["value", "error", "seconds"])
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of a prompt (about four characters per token)."""
+    return len(text) // 4 + 1
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether a failed request is worth retrying: rate limits, server errors, timeouts and dropped connections."""
+    if isinstance(error, (RateLimitError, APIConnectionError)):
+        return True
+    return isinstance(error, APIStatusError) and error.status_code >= 500
+
+
+def retry_after_seconds(error: Exception):
+    """Delay requested by the server in a Retry-After header, if any."""
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at per_minute / 60 units per second.
+
+    Holds at most one minute's worth of units, so a burst never exceeds the
+    per-minute limit.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until amount units are available (requests larger than the bucket wait for a full bucket)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        """Consume units; the level may go negative, delaying later requests."""
+        self._refill()
+        self.level -= amount
+
+
+class LLMScheduler:
+    """
+    Paces concurrent OpenAI requests to the account's rate limits.
+
+    Every request goes through call(): it waits for a slot of the bounded
+    semaphore and for room in the requests-per-minute and tokens-per-minute
+    buckets (charged with the estimated prompt tokens, then corrected with
+    the reported usage). Rate-limited (429), failed (5xx) and dropped
+    requests are retried with full-jitter exponential backoff, honouring
+    Retry-After. gather() runs named tasks to completion and records each
+    one's result or error, so one slow or failing task never cancels the
+    others.
+
+    A scheduler belongs to the event loop it is first used in; create one
+    per batch of requests.
+
+    Args:
+        max_concurrency (int): Requests in flight at once
+        requests_per_minute (float): Request rate limit
+        tokens_per_minute (float): Token rate limit
+        max_retries (int): Retries of a retryable failure before giving up
+    """
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 requests_per_minute: float = LLM_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = LLM_TOKENS_PER_MINUTE, max_retries: int = LLM_MAX_RETRIES):
+        self.semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.retries = 0
+
+    async def _acquire(self, estimated_tokens: int):
+        while True:
+            wait = max(self.requests.wait_time(1), self.tokens.wait_time(estimated_tokens))
+            if wait <= 0:
+                self.requests.take(1)
+                self.tokens.take(estimated_tokens)
+                return
+            await asyncio.sleep(wait)
+
+    async def call(self, request, estimated_tokens: int = 0):
+        """
+        Run one API request under the concurrency and rate limits, with retries.
+
+        Args:
+            request (callable): Returns a new awaitable of the request on every call
+            estimated_tokens (int): Estimated prompt tokens (see estimate_tokens)
+
+        Returns:
+            The response of the first successful attempt
+
+        Raises:
+            Exception: The last error, once it is not retryable or retries are exhausted
+        """
+        attempt = 0
+        while True:
+            async with self.semaphore:
+                await self._acquire(estimated_tokens)
+                try:
+                    response = await request()
+                except Exception as e:
+                    if not is_retryable(e) or attempt >= self.max_retries:
+                        raise
+                    error = e
+                else:
+                    usage = getattr(response, "usage", None)
+                    if usage is not None:
+                        self.tokens.take(usage.total_tokens - estimated_tokens)
+                    return response
+
+            # Back off outside the semaphore so other requests can proceed
+            delay = random.uniform(0, min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * 2 ** attempt))
+            delay = max(delay, retry_after_seconds(error) or 0)
+            attempt += 1
+            self.retries += 1
+            print(f"Retrying OpenAI request in {delay:.1f}s (attempt {attempt}/{self.max_retries}): {error}")
+            await asyncio.sleep(delay)
+
+    async def gather(self, tasks: dict, on_result=None) -> dict:
+        """
+        Run named coroutines concurrently and collect every outcome.
+
+        Args:
+            tasks (dict): Name -> coroutine
+            on_result (callable, optional): Called as on_result(name, TaskResult)
+                as soon as each task finishes
+
+        Returns:
+            dict: Name -> TaskResult, in the order of tasks
+        """
+        async def run(name, coroutine):
+            start = time.perf_counter()
+            try:
+                result = TaskResult(await coroutine, None, time.perf_counter() - start)
+            except Exception as e:
+                result = TaskResult(None, e, time.perf_counter() - start)
+            if on_result is not None:
+                on_result(name, result)
+            return result
+
+        results = await asyncio.gather(*(run(name, coroutine) for name, coroutine in tasks.items()))
+        return dict(zip(tasks, results))
@@ -0,0 +1,131 @@
+import os
+import asyncio
+import threading
+import importlib.util
+from collections import namedtuple
+from weakref import WeakKeyDictionary
+
+import httpx
+from openai import AsyncOpenAI, OpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient
+
+
+# Timeouts of the OpenAI requests in seconds (override with OPENAI_TIMEOUT_SECONDS / OPENAI_CONNECT_TIMEOUT_SECONDS)
+OPENAI_TIMEOUT_SECONDS = float(os.environ.get("OPENAI_TIMEOUT_SECONDS", "300"))
+OPENAI_CONNECT_TIMEOUT_SECONDS = float(os.environ.get("OPENAI_CONNECT_TIMEOUT_SECONDS", "10"))
+
+# Connection pool of each client: open connections, idle connections kept alive and how long they stay idle
+OPENAI_MAX_CONNECTIONS = int(os.environ.get("OPENAI_MAX_CONNECTIONS", "20"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "10"))
+OPENAI_KEEPALIVE_EXPIRY_SECONDS = float(os.environ.get("OPENAI_KEEPALIVE_EXPIRY_SECONDS", "60"))
+
+# Negotiate HTTP/2 when the h2 package is installed (disable with OPENAI_HTTP2=0)
+OPENAI_HTTP2 = os.environ.get("OPENAI_HTTP2", "1") != "0" and importlib.util.find_spec("h2") is not None
+
+# Result of a streamed chat completion: the full text and its token usage (None if not reported)
+StreamedCompletion = namedtuple("StreamedCompletion", ["text", "usage"])
+
+_sync_clients = {}
+_async_clients = WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def _http_options() -> dict:
+    return {
+        "timeout": httpx.Timeout(OPENAI_TIMEOUT_SECONDS, connect=OPENAI_CONNECT_TIMEOUT_SECONDS),
+        "limits": httpx.Limits(max_connections=OPENAI_MAX_CONNECTIONS,
+                               max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                               keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY_SECONDS),
+        "http2": OPENAI_HTTP2,
+    }
+
+
+def get_client(api_key: str) -> OpenAI:
+    """
+    Shared synchronous OpenAI client for an API key.
+
+    One client (and one keep-alive connection pool) per process and key, so
+    repeated requests reuse open connections and TLS sessions. The client is
+    thread-safe; never close it.
+
+    Args:
+        api_key (str): OpenAI API key
+
+    Returns:
+        OpenAI: The pooled client
+    """
+    with _lock:
+        client = _sync_clients.get(api_key)
+        if client is None:
+            client = OpenAI(api_key=api_key, http_client=DefaultHttpxClient(**_http_options()))
+            _sync_clients[api_key] = client
+        return client
+
+
+def get_async_client(api_key: str) -> AsyncOpenAI:
+    """
+    Shared AsyncOpenAI client for an API key and the running event loop.
+
+    An async connection pool can only be used from the event loop it was
+    created in, so clients are kept per loop and key (and dropped with their
+    loop). Must be called from a coroutine; never close the client.
+
+    Args:
+        api_key (str): OpenAI API key
+
+    Returns:
+        AsyncOpenAI: The pooled client
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(api_key)
+        if client is None:
+            client = AsyncOpenAI(api_key=api_key, http_client=DefaultAsyncHttpxClient(**_http_options()))
+            clients[api_key] = client
+        return client
+
+
+async def stream_chat_completion(client: AsyncOpenAI, **request):
+    """
+    Stream a chat completion as it is generated.
+
+    Args:
+        client (AsyncOpenAI): Client to send the request with
+        **request: Arguments of chat.completions.create (model, messages, ...)
+
+    Yields:
+        tuple: (text delta, usage); usage is None except on the final chunk
+    """
+    stream = await client.chat.completions.create(stream=True, stream_options={"include_usage": True}, **request)
+    async for chunk in stream:
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        yield delta or "", chunk.usage
+
+
+async def complete_chat_streaming(client: AsyncOpenAI, on_delta, **request) -> StreamedCompletion:
+    """
+    Run a chat completion with streaming, reporting every text delta.
+
+    on_delta receives only the new text, so the consumer accumulates it (and
+    joins it only when it renders) instead of every delta copying the whole
+    text again. It is called with None before the request is sent: when a
+    retry runs the completion again, the consumer drops the text it has.
+
+    Args:
+        client (AsyncOpenAI): Client to send the request with
+        on_delta (callable): Called with None, then with every text delta
+        **request: Arguments of chat.completions.create (model, messages, ...)
+
+    Returns:
+        StreamedCompletion: Full text and token usage (its usage attribute lets
+        LLMScheduler correct its token estimate like for a regular response)
+    """
+    parts = []
+    usage = None
+    on_delta(None)
+    async for delta, chunk_usage in stream_chat_completion(client, **request):
+        if delta:
+            parts.append(delta)
+            on_delta(delta)
+        usage = chunk_usage or usage
+    return StreamedCompletion("".join(parts), usage)
@@ -498,4 +498,91 @@ publication_categories = {
         "conflicts_of_interest.description",
         "conflicts_of_interest.industry_affiliations"
     ]
-}
\ No newline at end of file
+}
+
+
+# Insight tabs generated by "Generate Insights" (and pre-warmed for filter presets):
+# topic name, categories and prompt of each tab, and the session key of its insights
+INSIGHT_TABS = [
+    # Tab 0 - Overview
+    {
+        "topic_name": "Overall",
+        "categories": categories_to_extract,
+        "prompt": overview_prompt,
+        "insights_key": "generated_overall_insights",
+        "index": 0
+    },
+    # Tab 1 - Adverse Events
+    {
+        "topic_name": "Adverse Events",
+        "categories": adverse_events_categories,
+        "prompt": adverse_events_prompt,
+        "insights_key": "generated_adverse_events_insights",
+        "index": 2
+    },
+    # Tab 2 - Perceived Benefits
+    {
+        "topic_name": "Perceived Benefits",
+        "categories": perceived_benefits_categories,
+        "prompt": perceived_benefits_prompt,
+        "insights_key": "generated_perceived_benefits_insights",
+        "index": 3
+    },
+    # Tab 3 Health Outcomes subtabs
+    {
+        "topic_name": "Oral Health",
+        "categories": oral_health_categories,
+        "prompt": oral_health_prompt,
+        "insights_key": "generated_oral_health_insights",
+        "index": 4,
+        "subtab": "oral"
+    },
+    {
+        "topic_name": "Respiratory Health",
+        "categories": respiratory_categories,
+        "prompt": respiratory_prompt,
+        "insights_key": "generated_respiratory_health_insights",
+        "index": 4,
+        "subtab": "respiratory"
+    },
+    {
+        "topic_name": "Cardiovascular Health",
+        "categories": cardiovascular_categories,
+        "prompt": cardiovascular_prompt,
+        "insights_key": "generated_cardiovascular_health_insights",
+        "index": 4,
+        "subtab": "cardiovascular"
+    },
+    # Tab 4 - Research Trends
+    {
+        "topic_name": "Research Trends",
+        "categories": research_trends_categories,
+        "prompt": research_trends_prompt,
+        "insights_key": "generated_research_trends_insights",
+        "index": 5
+    },
+    # Tab 5 - Contradictions
+    {
+        "topic_name": "Contradictions and Conflicts",
+        "categories": contradictions_categories,
+        "prompt": contradictions_prompt,
+        "insights_key": "generated_contradictions_and_conflicts_insights",
+        "index": 6
+    },
+    # Tab 6 - Bias
+    {
+        "topic_name": "Research Bias",
+        "categories": bias_categories,
+        "prompt": bias_prompt,
+        "insights_key": "generated_research_bias_insights",
+        "index": 7
+    },
+    # Tab 7 - Publication Level
+    {
+        "topic_name": "Publication Metrics",
+        "categories": publication_categories,
+        "prompt": publication_prompt,
+        "insights_key": "generated_publication_metrics_insights",
+        "index": 8
+    }
+]
\ No newline at end of file
@@ -0,0 +1,202 @@
+import os
+import threading
+from collections import OrderedDict
+
+
+# Number of distinct filter states kept per process (override with FILTER_CACHE_SIZE)
+FILTER_CACHE_SIZE = int(os.environ.get("FILTER_CACHE_SIZE", "64"))
+
+
+class FilterResult:
+    """
+    Cached result of one filter state: the matching documents plus the
+    aggregates derived from them (year counts, sunburst tree, country counts,
+    ingredient tallies, ...).
+
+    Entries are shared by every session with the same filters, so callers
+    must treat the documents and aggregates as read-only.
+
+    Args:
+        docs (list): Matching document columns
+        aggregates (dict): Aggregates already computed (e.g. materialized for
+            a filter preset), by name
+    """
+
+    def __init__(self, docs, aggregates=None):
+        self.docs = tuple(docs)
+        self._aggregates = dict(aggregates or {})
+        self._lock = threading.Lock()
+
+    def aggregate(self, name: str, build):
+        """
+        Return a derived aggregate, building it on first use.
+
+        Args:
+            name (str): Unique name of the aggregate
+            build (callable): Called without arguments to compute it
+
+        Returns:
+            The cached result of build()
+        """
+        try:
+            return self._aggregates[name]
+        except KeyError:
+            pass
+
+        with self._lock:
+            if name not in self._aggregates:
+                self._aggregates[name] = build()
+            return self._aggregates[name]
+
+
+class MatchingDocs(list):
+    """
+    List of matching document columns that remembers its cached FilterResult.
+
+    It behaves like the plain list the visualizations expect, and lets
+    cached_aggregate() reuse aggregates already computed for the same filters.
+    """
+
+    def __init__(self, docs, result: FilterResult = None):
+        super().__init__(docs)
+        self.result = result
+
+
+class FilterResultCache:
+    """
+    Thread-safe, process-wide LRU cache: canonical filter state -> FilterResult.
+
+    Args:
+        max_entries (int): Number of filter states kept before the least
+            recently used one is evicted
+    """
+
+    def __init__(self, max_entries: int = FILTER_CACHE_SIZE):
+        self.max_entries = max(1, int(max_entries))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return the cached FilterResult for key (marking it recently used), or None."""
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key, result: FilterResult) -> FilterResult:
+        """
+        Store a result and evict the least recently used entries over capacity.
+
+        If another session stored the same key first, that entry wins and is
+        returned, so concurrent sessions end up sharing one FilterResult.
+        """
+        with self._lock:
+            existing = self._entries.get(key)
+            if existing is not None:
+                self._entries.move_to_end(key)
+                return existing
+
+            self._entries[key] = result
+            self._evict()
+            return result
+
+    def get_or_compute(self, key, compute_docs) -> FilterResult:
+        """
+        Return the cached result for key, computing the matching docs on a miss.
+
+        Args:
+            key: Canonical, hashable filter state
+            compute_docs (callable): Returns the matching document columns
+
+        Returns:
+            FilterResult: Shared result for this filter state
+        """
+        result = self.get(key)
+        if result is not None:
+            return result
+        return self.put(key, FilterResult(compute_docs()))
+
+    def resize(self, max_entries: int):
+        """Change the capacity, evicting entries if it shrinks."""
+        with self._lock:
+            self.max_entries = max(1, int(max_entries))
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def carry_over(self, old_version, new_version, still_valid) -> int:
+        """
+        Move the entries of one corpus version to the next one.
+
+        Keys are (corpus version, filter state). Entries of old_version are
+        re-keyed under new_version when still_valid says their documents and
+        aggregates are unaffected by the change, and dropped otherwise.
+
+        Args:
+            old_version: Version (content hash) the entries were computed for
+            new_version: Version now being served
+            still_valid (callable): still_valid(filter_state, result) -> bool
+
+        Returns:
+            int: Number of entries carried over
+        """
+        with self._lock:
+            old_entries = [(key, result) for key, result in self._entries.items() if key[0] == old_version]
+
+        kept = 0
+        for key, result in old_entries:
+            if still_valid(key[1], result):
+                self.put((new_version,) + tuple(key[1:]), result)
+                kept += 1
+
+        with self._lock:
+            for key, _ in old_entries:
+                self._entries.pop(key, None)
+        return kept
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        """Hit/miss/eviction counters and current size."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+def cached_aggregate(matching_docs, name: str, build):
+    """
+    Return an aggregate of matching_docs, shared through the filter cache.
+
+    When matching_docs is a MatchingDocs backed by a cached FilterResult the
+    aggregate is computed once per filter state for all sessions; for a plain
+    list it is simply built.
+
+    Args:
+        matching_docs (list): Matching document columns
+        name (str): Unique name of the aggregate
+        build (callable): Called without arguments to compute it
+
+    Returns:
+        The aggregate
+    """
+    result = getattr(matching_docs, "result", None)
+    if result is None:
+        return build()
+    return result.aggregate(name, build)
@@ -0,0 +1,49 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# The modules live at the repository root, next to the app
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpus_store import CorpusSnapshot  # noqa: E402
+
+
+# (Main Category, Category, SubCategory) of the field rows of the test corpus
+FIELDS = [
+    ("Publication", "publication_year", None),
+    ("Publication", "publication_type", None),
+    ("Study", "sample_characteristics", "total_size"),
+    ("Study", "study_design", "primary_type"),
+    ("Funding", "funding_source", "type"),
+    ("Study", "country_of_study", None),
+    ("Findings", "harmful_ingredients", "name"),
+]
+
+# Document column -> cell per field row (None: empty cell)
+PAPERS = {
+    "a.pdf": ["2019", "Journal article", "120", "In vitro", "Industry", "United Kingdom",
+              "1) Formaldehyde, 2) Acrolein"],
+    "b.pdf": ["2021", "Journal article", "1500", "Cohort", "Government", "USA, Canada", "1) Nicotine"],
+    "c.pdf": ["2022", "Review", None, "Systematic review", "Government", "Georgia", None],
+    "d.pdf": ["2023", "Journal article", "40", "In vitro", "Industry", "South Korea and Japan",
+              "1) Acrolein, 2) Diacetyl"],
+    "e.pdf": [None, "Report", "15000", "Cohort", None, "Republic of Georgia", "1) Formaldehyde"],
+}
+
+
+def corpus_frame(papers=None, fields=None) -> pd.DataFrame:
+    """Wide field x paper frame like the workbook's."""
+    papers = PAPERS if papers is None else papers
+    fields = FIELDS if fields is None else fields
+    frame = pd.DataFrame(fields, columns=["Main Category", "Category", "SubCategory"], dtype=object)
+    for doc, cells in papers.items():
+        frame[doc] = pd.Series([np.nan if cell is None else cell for cell in cells], dtype=object)
+    return frame.where(frame.notna(), np.nan)
+
+
+@pytest.fixture
+def corpus():
+    return CorpusSnapshot(corpus_frame(), content_hash="test")
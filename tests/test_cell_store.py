@@ -0,0 +1,58 @@
+import os
+
+import pytest
+
+from cell_store import CORPUS_DB_PATH, SqliteCells, fts_literal_query
+from corpus_store import CorpusSnapshot
+from filter_engine import FilterEngine
+
+from conftest import corpus_frame
+
+
+@pytest.fixture
+def sqlite_corpus(tmp_path):
+    cells = SqliteCells.from_frame(corpus_frame(), str(tmp_path / "corpus.sqlite"), content_hash="test")
+    yield CorpusSnapshot(content_hash="test", cells=cells)
+    cells.close()
+
+
+def test_from_frame_without_path_uses_a_temporary_database():
+    cells = SqliteCells.from_frame(corpus_frame())
+    try:
+        assert os.path.abspath(cells.db_path) != os.path.abspath(CORPUS_DB_PATH)
+        assert cells.content_hash is None
+        assert cells.doc_columns == tuple(corpus_frame().columns[3:])
+    finally:
+        cells.close()
+        os.remove(cells.db_path)
+
+
+def test_from_frame_records_content_hash(sqlite_corpus):
+    reopened = SqliteCells.open(sqlite_corpus.cells.db_path, expected_hash="test")
+    assert reopened is not None
+    reopened.close()
+    assert SqliteCells.open(sqlite_corpus.cells.db_path, expected_hash="other") is None
+
+
+def test_fts_literal_query_quotes_every_token():
+    assert fts_literal_query('vitamin-e "x" OR') == '"vitamin-e" """x""" "OR"'
+
+
+def test_search_falls_back_to_literal_words(sqlite_corpus):
+    assert sqlite_corpus.search("acrolein") == ["a.pdf", "d.pdf"]
+    assert sqlite_corpus.search("formald*", path="harmful_ingredients.name") == ["a.pdf", "e.pdf"]
+    # Not valid FTS5 syntax: searched word by word
+    assert sqlite_corpus.search("in-vitro") == ["a.pdf", "d.pdf"]
+
+
+@pytest.mark.parametrize("field, term", [
+    (None, "formald"), (None, "acrolein diacetyl"), (None, "review"), (None, "nothing"),
+    ("study_design.primary_type", "vitro"), ("funding_source.type", "vitro"), ("country_of_study", "korea"),
+])
+def test_sqlite_term_filter_matches_term_index(corpus, sqlite_corpus, field, term):
+    dense = FilterEngine.for_corpus(corpus)
+    fts = FilterEngine.for_corpus(sqlite_corpus)
+
+    assert fts.term_bits(field, term) == dense.term_bits(field, term)
+    assert fts.term_fields == dense.term_fields
+    assert "term_index" not in sqlite_corpus._derived
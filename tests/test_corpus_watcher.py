@@ -0,0 +1,109 @@
+import os
+
+import pandas as pd
+import pytest
+
+from corpus_store import CorpusSnapshot
+from corpus_watcher import (INSIGHT_SOURCES_KEY, CorpusWatcher, diff_snapshots, field_keys,
+                            invalidate_insights, record_insight_sources)
+
+from conftest import FIELDS, PAPERS, corpus_frame
+
+
+NEW_FIELD = ("Findings", "nicotine_concentration", None)
+
+
+def with_field(position, field, cells):
+    """FIELDS and PAPERS with one field row inserted at position."""
+    fields = FIELDS[:position] + [field] + FIELDS[position:]
+    papers = {doc: values[:position] + [cells.get(doc)] + values[position:] for doc, values in PAPERS.items()}
+    return fields, papers
+
+
+def test_field_keys_number_repeated_labels():
+    labels = pd.DataFrame([("A", "x", None), ("A", "y", None), ("A", "x", None)],
+                          columns=["Main Category", "Category", "SubCategory"])
+    assert field_keys(labels) == [("A", "x", None, 0), ("A", "y", None, 0), ("A", "x", None, 1)]
+
+
+def test_identical_snapshots_do_not_differ(corpus):
+    diff = diff_snapshots(corpus, CorpusSnapshot(corpus_frame(), content_hash="other"))
+    assert not diff.changed
+    assert diff.affected_docs == frozenset()
+
+
+def test_inserted_field_row_only_affects_its_documents(corpus):
+    fields, papers = with_field(2, NEW_FIELD, {"b.pdf": "18 mg/mL", "d.pdf": "5%"})
+    diff = diff_snapshots(corpus, CorpusSnapshot(corpus_frame(papers, fields), content_hash="new"))
+
+    assert diff.structure_changed
+    assert diff.added_fields == (NEW_FIELD + (0,),)
+    # Later rows moved but kept their keys and contents
+    assert diff.removed_fields == () and diff.changed_fields == ()
+    assert diff.added_docs == () and diff.removed_docs == ()
+    assert diff.affected_docs == frozenset({"b.pdf", "d.pdf"})
+
+
+def test_empty_inserted_field_row_changes_no_document(corpus):
+    fields, papers = with_field(0, NEW_FIELD, {})
+    diff = diff_snapshots(corpus, CorpusSnapshot(corpus_frame(papers, fields), content_hash="new"))
+
+    assert diff.structure_changed and diff.added_fields == (NEW_FIELD + (0,),)
+    assert diff.affected_docs == frozenset()
+
+
+def test_edited_cell_and_added_document(corpus):
+    papers = dict(PAPERS, **{"c.pdf": ["2020"] + PAPERS["c.pdf"][1:], "f.pdf": ["2024"] + [None] * 6})
+    diff = diff_snapshots(corpus, CorpusSnapshot(corpus_frame(papers), content_hash="new"))
+
+    assert not diff.structure_changed
+    assert diff.changed_docs == ("c.pdf",) and diff.added_docs == ("f.pdf",)
+    assert diff.changed_fields == (("Publication", "publication_year", None, 0),)
+
+
+def test_invalidate_insights_by_source_documents():
+    state = {"paper_a": "...", "paper_a_token_usage": 10, "paper_a_timing": 1.0, "paper_b": "...",
+             "tab_insights": "..."}
+    record_insight_sources(state, "paper_a", ["a.pdf"])
+    record_insight_sources(state, "paper_b", ["b.pdf"])
+    record_insight_sources(state, "tab_insights", ["a.pdf", "b.pdf"], cohort=True)
+
+    assert invalidate_insights(state, frozenset()) == 0
+    # A new document may match the cohort's filter even though none of its documents changed
+    assert invalidate_insights(state, frozenset({"f.pdf"})) == 1
+    assert "tab_insights" not in state and "paper_a" in state
+
+    assert invalidate_insights(state, frozenset({"a.pdf"})) == 1
+    assert set(state) == {"paper_b", INSIGHT_SOURCES_KEY}
+
+    assert invalidate_insights(state, None) == 1
+    assert state == {INSIGHT_SOURCES_KEY: {}}
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    path = tmp_path / "corpus.xlsx"
+    corpus_frame().to_excel(path, index=False)
+    return path
+
+
+def test_watcher_reload_reports_affected_documents(tmp_path, workbook):
+    watcher = CorpusWatcher(str(workbook), str(tmp_path / "corpus.arrow"), storage="dense", poll_seconds=0)
+    old = watcher.snapshot
+    diffs = []
+    watcher.subscribe(lambda diff, old_snapshot, new_snapshot: diffs.append(diff))
+
+    assert watcher.refresh(force=True) is old
+
+    fields, papers = with_field(2, NEW_FIELD, {"d.pdf": "5%"})
+    corpus_frame(papers, fields).to_excel(workbook, index=False)
+    # Coarse file system timestamps must not hide the rewrite
+    mtime = os.stat(workbook).st_mtime_ns + 1_000_000_000
+    os.utime(workbook, ns=(mtime, mtime))
+    new = watcher.refresh(force=True)
+
+    assert new is not old and watcher.generation == 1
+    assert [diff.affected_docs for diff in diffs] == [frozenset({"d.pdf"})]
+    assert watcher.affected_docs_since(0) == frozenset({"d.pdf"})
+    assert watcher.affected_docs_since(1) == frozenset()
+    assert watcher.affected_docs_since(-1) is None
@@ -0,0 +1,55 @@
+import pytest
+
+from country_index import CountryIndex, country_key, country_name, normalize_country, parse_country_codes
+from filter_engine import FilterEngine
+
+
+@pytest.mark.parametrize("spelling, code", [
+    ("United Kingdom", "GBR"), ("U.K.", "GBR"), ("England", "GBR"), ("U.S.A.", "USA"),
+    ("the Netherlands", "NLD"), ("Côte d'Ivoire", "CIV"), ("cote divoire", "CIV"), ("DEU", "DEU"),
+    ("South Korea", "KOR"), ("Republic of Korea", "KOR"), ("North Korea", "PRK"),
+    ("Republic of Georgia", "GEO"), ("Georgia (country)", "GEO"), ("GEO", "GEO"),
+])
+def test_spellings_resolve_to_iso_codes(spelling, code):
+    assert normalize_country(spelling) == code
+
+
+@pytest.mark.parametrize("spelling", ["Georgia", "georgia", "Korea", "Global", "45 countries", ""])
+def test_ambiguous_or_unknown_spellings_stay_unresolved(spelling):
+    assert normalize_country(spelling) is None
+
+
+def test_country_key_ignores_accents_case_and_punctuation():
+    assert country_key("  The  Côte-d'Ivoire ") == "cote divoire"
+    assert country_key("U.S.") == country_key("us")
+
+
+def test_parse_country_codes_splits_lists():
+    assert parse_country_codes("USA, Canada; UK/England") == ["USA", "CAN", "GBR"]
+    assert parse_country_codes("Trinidad and Tobago") == ["TTO"]
+    assert parse_country_codes("South Korea and Japan & Georgia") == ["KOR", "JPN"]
+    assert parse_country_codes(None) == [] and parse_country_codes(float("nan")) == []
+
+
+def test_country_name():
+    assert country_name("GBR") == "United Kingdom"
+    assert country_name("XYZ") == "XYZ"
+
+
+def test_index_postings_counts_and_unresolved(corpus):
+    index = CountryIndex.for_corpus(corpus)
+
+    assert {code: list(positions) for code, positions in index.postings.items()} == {
+        "GBR": [0], "USA": [1], "CAN": [1], "KOR": [3], "JPN": [3], "GEO": [4]}
+    assert index.counts() == {"GBR": 1, "USA": 1, "CAN": 1, "KOR": 1, "JPN": 1, "GEO": 1}
+    assert index.counts(["b.pdf", "c.pdf", "e.pdf"]) == {"USA": 1, "CAN": 1, "GEO": 1}
+    assert index.unresolved == {"Georgia": 1}
+    assert CountryIndex.for_corpus(corpus) is index
+
+
+def test_country_filter_uses_the_index(corpus):
+    engine = FilterEngine.for_corpus(corpus)
+
+    assert engine.docs_for(engine.match(country=["KOR", "GBR"])) == ["a.pdf", "d.pdf"]
+    counts = dict(engine.value_counts("country", engine.all_bits))
+    assert counts == {"GBR": 1, "USA": 1, "CAN": 1, "KOR": 1, "JPN": 1, "GEO": 1}
@@ -0,0 +1,49 @@
+from filter_engine import FilterEngine, FilterPipeline
+
+
+def test_pipeline_matches_engine(corpus):
+    engine = FilterEngine.for_corpus(corpus)
+    pipeline = FilterPipeline(engine)
+    criteria = {"year_range": (2019, 2022), "funding_type": ["Government"]}
+
+    assert pipeline.matching_docs(**criteria) == engine.docs_for(engine.match(**criteria))
+    assert pipeline.facet_counts(**criteria) == engine.facet_counts(**criteria)
+
+
+def test_unchanged_criteria_hit_every_stage(corpus):
+    pipeline = FilterPipeline(FilterEngine.for_corpus(corpus))
+    criteria = {"year_range": (2019, 2022), "study_design": ["Cohort", "In vitro"]}
+
+    first = pipeline.matching_docs(**criteria)
+    pipeline.facet_counts(**criteria)
+    misses = dict(pipeline.misses)
+    assert pipeline.matching_docs(**criteria) == first
+    pipeline.facet_counts(**criteria)
+
+    assert pipeline.misses == misses
+    assert pipeline.stats()["matching"] == {"hits": 1, "misses": 1}
+
+
+def test_changing_one_criterion_recomputes_only_dependent_stages(corpus):
+    pipeline = FilterPipeline(FilterEngine.for_corpus(corpus))
+    pipeline.facet_counts(year_range=(2019, 2022), study_design=["Cohort"])
+    pipeline.matching_docs(year_range=(2019, 2022), study_design=["Cohort"])
+
+    pipeline.facet_counts(year_range=(2019, 2022), study_design=["In vitro"])
+    assert pipeline.matching_docs(year_range=(2019, 2022), study_design=["In vitro"]) == ["a.pdf"]
+
+    stats = pipeline.stats()
+    assert stats["year"]["misses"] == 1
+    assert stats["study_design"]["misses"] == 2
+    # The study design counts do not depend on the study design selection
+    assert stats["counts:study_design"] == {"hits": 1, "misses": 1}
+    assert stats["counts:funding_type"]["misses"] == 2
+    assert stats["matching"]["misses"] == 2
+
+
+def test_matching_docs_are_fresh_lists(corpus):
+    pipeline = FilterPipeline(FilterEngine.for_corpus(corpus))
+
+    docs = pipeline.matching_docs(funding_type=["Industry"])
+    docs.append("mutated.pdf")
+    assert pipeline.matching_docs(funding_type=["Industry"]) == ["a.pdf", "d.pdf"]
@@ -0,0 +1,71 @@
+import pytest
+
+from filter_engine import FilterEngine
+from filter_query import FilterQueryError, QueryPlan, canonical_query, parse_query
+
+
+@pytest.mark.parametrize("query, message", [
+    ("", "empty query"),
+    ("year>>2020", "expected a value after 'year>' at position 6"),
+    ("year:abc", "expected a whole number or lo..hi range for year at position 6"),
+    ("type<3", "'<' needs a numeric field (year or sample_size), not 'type' at position 6"),
+    ('"x":y', "expected a value after a quoted string, not an operator at position 4"),
+    ("a ) b", "unexpected ')' at position 3"),
+    ("(a OR b", "expected ')' at end of query"),
+    ("year>=2020 AND (", "expected a filter term at end of query"),
+])
+def test_parse_errors_report_their_position(query, message):
+    with pytest.raises(FilterQueryError) as error:
+        parse_query(query)
+    assert str(error.value) == message
+
+
+def test_parse_builds_syntax_tree():
+    assert parse_query('design:"In vitro" OR year>=2022 acrolein') == (
+        "or", (
+            ("values", "study_design", "In vitro"),
+            ("and", (("range", "year", 2022, None), ("text", None, "acrolein"))),
+        ))
+    assert parse_query("country!=UK") == ("not", ("values", "country", "UK"))
+    assert parse_query("harmful_ingredients.name:formaldehyde") == (
+        "text", "harmful_ingredients.name", "formaldehyde")
+
+
+@pytest.mark.parametrize("query, canonical", [
+    ('design:"In vitro" or design:"in vivo" and year >= 2022',
+     'study_design:"In vitro" OR study_design:"in vivo" AND year>=2022'),
+    ("not (a or b)", "NOT (a OR b)"),
+    ("(a b) or c", "a AND b OR c"),
+    ("(a or b) c", "(a OR b) AND c"),
+    ("type:Review publication_year:2019..2021", "publication_type:Review AND year:2019..2021"),
+    ("year:2020..2020", "year:2020"),
+    ("sample<100", "sample_size<=99"),
+    ("year>2019", "year>=2020"),
+    ("country!=UK", "NOT country:UK"),
+    ('"vitamin e" "and"', '"vitamin e" AND "and"'),
+])
+def test_canonical_query_round_trips(query, canonical):
+    assert canonical_query(query) == canonical
+    # Canonical text is a fixed point and parses to the same tree
+    assert canonical_query(canonical) == canonical
+    assert parse_query(canonical) == parse_query(query)
+
+
+def test_query_plan_evaluates_against_engine(corpus):
+    engine = FilterEngine.for_corpus(corpus)
+
+    def docs(query):
+        return engine.docs_for(QueryPlan(engine, query).evaluate())
+
+    assert docs("year:2020..2022") == ["b.pdf", "c.pdf"]
+    assert docs("design:cohort OR funding:industry") == ["a.pdf", "b.pdf", "d.pdf", "e.pdf"]
+    assert docs("NOT funding:industry") == ["b.pdf", "c.pdf", "e.pdf"]
+    assert docs("country:UK OR country:JPN") == ["a.pdf", "d.pdf"]
+    assert docs("harmful_ingredients.name:acro sample<100") == ["d.pdf"]
+    assert docs("formaldehyde") == ["a.pdf", "e.pdf"]
+
+
+def test_query_plan_rejects_unknown_field(corpus):
+    engine = FilterEngine.for_corpus(corpus)
+    with pytest.raises(FilterQueryError, match="unknown field 'no_such.field'"):
+        QueryPlan(engine, "no_such.field:x")
@@ -0,0 +1,81 @@
+import json
+
+import insights_cache
+from insights_cache import InsightsCache, insights_cache_key
+
+USAGE = {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def make_cache(tmp_path, monkeypatch, **options):
+    clock = Clock()
+    monkeypatch.setattr(insights_cache.time, "time", clock)
+    return InsightsCache(str(tmp_path / "insights.sqlite"), **options), clock
+
+
+def entry_size(key, insights):
+    return len(json.dumps(insights, ensure_ascii=False).encode("utf-8")) + len(json.dumps(USAGE)) + len(key)
+
+
+def test_key_depends_on_request_content_only():
+    key = insights_cache_key("payload", "Topic", None, "gpt-4.1", 0.3)
+    assert key == insights_cache_key("payload", "Topic", None, "gpt-4.1", 0.3)
+    assert key != insights_cache_key("payload", "Topic", None, "gpt-4.1", 0.2)
+    assert key != insights_cache_key("payload", "Topic", "focus", "gpt-4.1", 0.3)
+
+
+def test_get_returns_stored_entry_and_counts(tmp_path, monkeypatch):
+    cache, _ = make_cache(tmp_path, monkeypatch)
+
+    assert cache.get("k") is None
+    cache.put("k", ["- Insight"], USAGE)
+    assert cache.get("k") == (["- Insight"], USAGE)
+
+    stats = cache.stats()
+    assert (stats["entries"], stats["hits"], stats["misses"]) == (1, 1, 1)
+    assert stats["bytes"] == entry_size("k", ["- Insight"])
+
+
+def test_least_recently_used_entries_are_evicted_by_size(tmp_path, monkeypatch):
+    size = entry_size("a", ["x" * 50])
+    cache, clock = make_cache(tmp_path, monkeypatch, max_bytes=2 * size)
+
+    cache.put("a", ["x" * 50], USAGE)
+    clock.now += 1
+    cache.put("b", ["x" * 50], USAGE)
+    clock.now += 1
+    # Reading "a" makes "b" the least recently used entry
+    assert cache.get("a") is not None
+    clock.now += 1
+    cache.put("c", ["x" * 50], USAGE)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats()["bytes"] <= 2 * size
+
+
+def test_expired_entries_are_not_served_and_evicted(tmp_path, monkeypatch):
+    cache, clock = make_cache(tmp_path, monkeypatch, max_age_seconds=60)
+
+    cache.put("old", ["- Old"], USAGE)
+    clock.now += 61
+    assert cache.get("old") is None
+    assert cache.stats()["entries"] == 1
+
+    cache.put("new", ["- New"], USAGE)
+    assert cache.stats()["entries"] == 1
+    assert cache.get("new") == (["- New"], USAGE)
+
+
+def test_clear(tmp_path, monkeypatch):
+    cache, _ = make_cache(tmp_path, monkeypatch)
+    cache.put("k", ["- Insight"], USAGE)
+    cache.clear()
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,153 @@
+import asyncio
+import types
+
+import pytest
+
+pytest.importorskip("openai")
+
+import llm_scheduler  # noqa: E402
+from llm_scheduler import LLMScheduler, TokenBucket, is_retryable, retry_after_seconds  # noqa: E402
+from openai import APIConnectionError, APIStatusError, RateLimitError  # noqa: E402
+
+
+class Clock:
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def make_error(cls, status_code=None, retry_after=None):
+    """API error without an HTTP exchange behind it."""
+    error = cls.__new__(cls)
+    error.status_code = status_code
+    error.response = types.SimpleNamespace(headers={} if retry_after is None else {"retry-after": str(retry_after)})
+    return error
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(llm_scheduler.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record backoff sleeps instead of sleeping; jitter always picks the upper bound."""
+    slept = []
+
+    async def sleep(seconds):
+        slept.append(seconds)
+
+    monkeypatch.setattr(llm_scheduler.asyncio, "sleep", sleep)
+    monkeypatch.setattr(llm_scheduler.random, "uniform", lambda low, high: high)
+    return slept
+
+
+def test_token_bucket_refills_continuously(clock):
+    bucket = TokenBucket(per_minute=60)
+
+    assert bucket.wait_time(60) == 0
+    bucket.take(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+    clock.now += 30
+    assert bucket.wait_time(30) == 0
+    assert bucket.wait_time(40) == pytest.approx(10.0)
+    # Never holds more than a minute's worth
+    clock.now += 3600
+    assert bucket.wait_time(60) == 0 and bucket.level == 60
+
+
+def test_token_bucket_overdraft_delays_later_requests(clock):
+    bucket = TokenBucket(per_minute=60)
+
+    bucket.take(90)
+    assert bucket.level == -30
+    # Requests larger than the bucket wait for a full bucket
+    assert bucket.wait_time(1000) == pytest.approx(90.0)
+
+
+def test_retryable_errors():
+    assert is_retryable(make_error(RateLimitError, 429))
+    assert is_retryable(make_error(APIConnectionError))
+    assert is_retryable(make_error(APIStatusError, 503))
+    assert not is_retryable(make_error(APIStatusError, 400))
+    assert not is_retryable(ValueError("bad request"))
+    assert retry_after_seconds(make_error(RateLimitError, 429, retry_after=7)) == 7.0
+    assert retry_after_seconds(ValueError()) is None
+
+
+def test_call_retries_with_exponential_backoff(clock, sleeps):
+    scheduler = LLMScheduler(max_retries=5)
+    attempts = []
+
+    async def request():
+        attempts.append(len(attempts))
+        if len(attempts) < 4:
+            raise make_error(APIStatusError, 500)
+        return "response"
+
+    assert asyncio.run(scheduler.call(request)) == "response"
+    assert len(attempts) == 4 and scheduler.retries == 3
+    assert sleeps == [1.0, 2.0, 4.0]
+
+
+def test_call_honours_retry_after_and_gives_up(clock, sleeps):
+    scheduler = LLMScheduler(max_retries=2)
+
+    async def request():
+        raise make_error(RateLimitError, 429, retry_after=20)
+
+    with pytest.raises(RateLimitError):
+        asyncio.run(scheduler.call(request))
+    assert sleeps == [20.0, 20.0]
+
+
+def test_call_does_not_retry_client_errors(clock, sleeps):
+    scheduler = LLMScheduler()
+
+    async def request():
+        raise make_error(APIStatusError, 400)
+
+    with pytest.raises(APIStatusError):
+        asyncio.run(scheduler.call(request))
+    assert sleeps == [] and scheduler.retries == 0
+
+
+def test_call_waits_for_the_token_bucket(clock, sleeps, monkeypatch):
+    scheduler = LLMScheduler(tokens_per_minute=600)
+    usage = types.SimpleNamespace(total_tokens=900)
+
+    async def request():
+        return types.SimpleNamespace(usage=usage)
+
+    async def advance_clock(seconds):
+        sleeps.append(seconds)
+        clock.now += seconds
+
+    monkeypatch.setattr(llm_scheduler.asyncio, "sleep", advance_clock)
+    # Estimated 100 tokens, charged 900 once the usage is known: the bucket is overdrawn by 300
+    asyncio.run(scheduler.call(request, estimated_tokens=100))
+    assert scheduler.tokens.level == pytest.approx(-300)
+    asyncio.run(scheduler.call(request, estimated_tokens=100))
+    assert sleeps == [pytest.approx(40.0)]
+
+
+def test_gather_collects_results_and_errors():
+    scheduler = LLMScheduler()
+    finished = []
+
+    async def ok():
+        return "value"
+
+    async def fail():
+        raise ValueError("boom")
+
+    results = asyncio.run(scheduler.gather({"a": ok(), "b": fail()},
+                                           on_result=lambda name, result: finished.append(name)))
+    assert list(results) == ["a", "b"]
+    assert results["a"].value == "value" and results["a"].error is None
+    assert isinstance(results["b"].error, ValueError) and results["b"].value is None
+    assert sorted(finished) == ["a", "b"]
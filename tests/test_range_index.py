@@ -0,0 +1,47 @@
+import pandas as pd
+
+from filter_engine import FilterEngine, RangeIndex
+
+
+def test_range_index_sorts_values_with_positions():
+    index = RangeIndex(pd.Series([2021, None, 2019, 2023, 2019], dtype="Int64"))
+
+    assert index.count == 4
+    assert (index.min, index.max) == (2019, 2023)
+    assert index.values.tolist() == [2019, 2019, 2021, 2023]
+    # Stable: equal values keep document order
+    assert index.positions.tolist() == [2, 4, 0, 3]
+
+
+def test_range_queries_are_inclusive():
+    index = RangeIndex(pd.Series([2021, None, 2019, 2023, 2019], dtype="Int64"))
+
+    assert sorted(index.range_positions(2019, 2021).tolist()) == [0, 2, 4]
+    assert index.range_count(2020, 2022) == 1
+    assert index.range_count(2024, 2030) == 0
+    assert index.range_count(float("-inf"), float("inf")) == 4
+    # An empty or inverted range matches nothing
+    assert index.range_count(2022, 2020) == 0
+
+
+def test_percentiles_and_log_edges():
+    index = RangeIndex(pd.Series([40, 120, 1500, 15000], dtype="Int64"))
+
+    assert index.percentiles[50] == 120
+    assert index.percentiles[5] == 40 and index.percentiles[95] == 1500
+    assert index.log_edges() == [40, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 15000]
+
+
+def test_empty_range_index():
+    index = RangeIndex(pd.Series([None, None], dtype="Int64"))
+
+    assert index.count == 0 and index.min is None and index.max is None
+    assert index.percentiles == {} and index.log_edges() == []
+    assert index.range_count(0, 10) == 0
+
+
+def test_engine_range_bits_skip_missing_values(corpus):
+    engine = FilterEngine.for_corpus(corpus)
+
+    assert engine.docs_for(engine.range_bits("year", 2021, 2023)) == ["b.pdf", "c.pdf", "d.pdf"]
+    assert engine.docs_for(engine.range_bits("sample_size", 100, 10 ** 9)) == ["a.pdf", "b.pdf", "e.pdf"]
@@ -0,0 +1,35 @@
+from filter_engine import FilterEngine, TermIndex, tokenize
+
+
+def test_tokenize_casefolds_words():
+    assert tokenize("1) Formaldehyde, 2) Vitamin-E") == ["1", "formaldehyde", "2", "vitamin", "e"]
+
+
+def test_terms_match_word_prefixes(corpus):
+    index = TermIndex.for_corpus(corpus)
+    engine = FilterEngine.for_corpus(corpus)
+
+    assert engine.docs_for(index.term_bits(None, "formald")) == ["a.pdf", "e.pdf"]
+    assert engine.docs_for(index.term_bits(None, "ACROLEIN")) == ["a.pdf", "d.pdf"]
+    # Every token must match, in any order
+    assert engine.docs_for(index.term_bits(None, "diacetyl acro")) == ["d.pdf"]
+    assert index.term_bits(None, "formaldehyde nicotine") == 0
+    assert index.term_bits(None, "  ") == 0
+
+
+def test_terms_are_restricted_to_a_field(corpus):
+    index = TermIndex.for_corpus(corpus)
+    engine = FilterEngine.for_corpus(corpus)
+
+    assert engine.docs_for(index.term_bits("study_design.primary_type", "vitro")) == ["a.pdf", "d.pdf"]
+    assert index.term_bits("funding_source.type", "vitro") == 0
+    assert index.term_bits("no_such.field", "vitro") == 0
+    assert "harmful_ingredients.name" in index.fields
+
+
+def test_terms_compose_with_other_criteria(corpus):
+    engine = FilterEngine.for_corpus(corpus)
+
+    docs = engine.docs_for(engine.match(field_terms=[("harmful_ingredients.name", "formaldehyde")],
+                                        funding_type=["Industry"]))
+    assert docs == ["a.pdf"]
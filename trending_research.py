@@ -1,22 +1,22 @@
 import streamlit as st
 import pandas as pd
 import altair as alt
-from openai import OpenAI
-import re
+from openai_clients import get_client
 
-def generate_comprehensive_paper_insights(df, doc, title, api_key):
+from corpus_watcher import record_insight_sources
+
+def generate_comprehensive_paper_insights(corpus, doc, title, api_key):
     """
     Generate comprehensive R&D-focused insights for a specific e-cigarette research paper
     using all available categories from the dataset and emphasizing quantitative data
     relevant to product improvement. Only includes non-missing attributes.
     
     Args:
-        df: The main dataframe containing research data
+        corpus: The shared CorpusSnapshot containing research data
         doc: The document column for this specific paper
         title: The title of the paper
         api_key: OpenAI API key
     """
-    
     # Define all categories to extract based on the comprehensive Excel structure
     comprehensive_categories = {
         "Key Findings": [
@@ -138,56 +138,19 @@ def generate_comprehensive_paper_insights(df, doc, title, api_key):
     research_insights = {}
     doc_insights = {}
     
+    # Field names are resolved to row positions once per corpus (dotted names
+    # match Category contains base + SubCategory contains the rest)
+    plan = corpus.resolver.plan("comprehensive", comprehensive_categories)
+    
     # Process each main category
-    for main_category, subcategories in comprehensive_categories.items():
+    for main_category, fields in plan:
         category_insights = {}
         
-        for subcategory in subcategories:
-            # Handle nested subcategories with dots
-            if '.' in subcategory:
-                parts = subcategory.split('.')
-                
-                # Try first with Category column
-                found = False
-                base_category = parts[0]
-                sub_parts = '.'.join(parts[1:])
-                
-                # Look for rows where Category contains the base_category and SubCategory has the remaining parts
-                category_rows = df[df['Category'].str.contains(base_category, na=False)]
-                if not category_rows.empty:
-                    sub_rows = category_rows[category_rows['SubCategory'].str.contains(sub_parts, na=False, regex=False)]
-                    if not sub_rows.empty:
-                        found = True
-                        subcategory_data = sub_rows[doc].dropna().tolist()
-                        # Only include non-empty data
-                        if subcategory_data and any(str(item).strip() != "" for item in subcategory_data):
-                            category_insights[subcategory] = subcategory_data
-                
-                # If not found, try all combinations of column splits
-                if not found:
-                    # Try with direct SubCategory match
-                    subcategory_rows = df[df['SubCategory'] == sub_parts]
-                    if not subcategory_rows.empty:
-                        subcategory_data = subcategory_rows[doc].dropna().tolist()
-                        # Only include non-empty data
-                        if subcategory_data and any(str(item).strip() != "" for item in subcategory_data):
-                            category_insights[subcategory] = subcategory_data
-            else:
-                # Direct match in Category
-                category_rows = df[df['Category'] == subcategory]
-                if not category_rows.empty:
-                    subcategory_data = category_rows[doc].dropna().tolist()
-                    # Only include non-empty data
-                    if subcategory_data and any(str(item).strip() != "" for item in subcategory_data):
-                        category_insights[subcategory] = subcategory_data
-                else:
-                    # Try in SubCategory
-                    subcategory_rows = df[df['SubCategory'] == subcategory]
-                    if not subcategory_rows.empty:
-                        subcategory_data = subcategory_rows[doc].dropna().tolist()
-                        # Only include non-empty data
-                        if subcategory_data and any(str(item).strip() != "" for item in subcategory_data):
-                            category_insights[subcategory] = subcategory_data
+        for subcategory, positions in fields:
+            subcategory_data = corpus.values_at(doc, positions)
+            # Only include non-empty data
+            if subcategory_data and any(str(item).strip() != "" for item in subcategory_data):
+                category_insights[subcategory] = subcategory_data
         
         # Only include categories with actual data
         if category_insights:
@@ -201,8 +164,8 @@ def generate_comprehensive_paper_insights(df, doc, title, api_key):
         return ["No insights found for this paper."]
     
     try:
-        # Initialize OpenAI client
-        client = OpenAI(api_key=api_key)
+        # Shared pooled OpenAI client
+        client = get_client(api_key)
         
         # Format the structured insights data with improved context preservation
         formatted_insights = []
@@ -315,13 +278,13 @@ def generate_comprehensive_paper_insights(df, doc, title, api_key):
         return [f"Error generating insights: {str(e)}"]
 
 
-def display_trending_research(df, all_docs):
+def display_trending_research(corpus, all_docs):
     """
     Display trending research feature highlighting new papers from 2024 and 2025
     with summaries, new harmful ingredients, and other relevant insights.
     
     Parameters:
-    - df: The main dataframe containing the research data
+    - corpus: The shared CorpusSnapshot containing the research data
     - all_docs: List of all document columns
     """
     
@@ -457,7 +420,7 @@ def display_trending_research(df, all_docs):
     """, unsafe_allow_html=True)
     
     # Filter for 2024 and 2025 papers (new papers)
-    new_papers = get_papers_by_year(df, all_docs, 2025) + get_papers_by_year(df, all_docs, 2024)
+    new_papers = get_papers_by_year(corpus, all_docs, 2025) + get_papers_by_year(corpus, all_docs, 2024)
     
     if len(new_papers) == 0:
         st.warning("No new research papers found in the dataset.")
@@ -484,7 +447,7 @@ def display_trending_research(df, all_docs):
     
     with col2:
         # Count new harmful ingredients
-        new_harmful_ingredients = get_new_harmful_ingredients(df, all_docs, new_papers)
+        new_harmful_ingredients = get_new_harmful_ingredients(corpus, all_docs, new_papers)
         st.markdown(f"""
         <div class="research-metric">
             <div class="metric-value">{len(new_harmful_ingredients)}</div>
@@ -494,7 +457,7 @@ def display_trending_research(df, all_docs):
     
     with col3:
         # Get unique study designs
-        study_designs = get_unique_values_for_papers(df, new_papers, "study_design", "primary_type")
+        study_designs = get_unique_values_for_papers(corpus, new_papers, "study_design", "primary_type")
         st.markdown(f"""
         <div class="research-metric">
             <div class="metric-value">{len(study_designs)}</div>
@@ -504,7 +467,7 @@ def display_trending_research(df, all_docs):
     
     with col4:
         # Get funding types
-        funding_types = get_unique_values_for_papers(df, new_papers, "funding_source", "type")
+        funding_types = get_unique_values_for_papers(corpus, new_papers, "funding_source", "type")
         st.markdown(f"""
         <div class="research-metric">
             <div class="metric-value">{len(funding_types)}</div>
@@ -526,7 +489,7 @@ def display_trending_research(df, all_docs):
     
     with trending_tabs[0]:
         for i, doc in enumerate(new_papers):
-            paper_details = get_paper_details(df, doc)
+            paper_details = get_paper_details(corpus, doc)
             
             if paper_details:
                 pub_type = paper_details.get('publication_type', 'Research Paper')
@@ -546,19 +509,20 @@ def display_trending_research(df, all_docs):
                 """, unsafe_allow_html=True)
                 
                 # Tags based on paper topics with actual publication year
-                tags = generate_tags_for_paper(df, doc, pub_year)
+                tags = generate_tags_for_paper(corpus, doc, pub_year)
                 tag_html = ""
                 for tag_text, tag_type in tags:
                     tag_html += f'<span class="tag {tag_type}">{tag_text}</span>'
                 
                 st.markdown(f"{tag_html}</div></div>", unsafe_allow_html=True)
                 
-                # Initialize paper-specific session state keys
-                paper_key = f"paper_insights_{i}"
+                # Initialize paper-specific session state keys (per document, so they
+                # stay attached to the right paper when the corpus is reloaded)
+                paper_key = f"paper_insights_{doc}"
                 if paper_key not in st.session_state:
                     st.session_state[paper_key] = False
                 
-                insights_key = f"paper_insights_data_{i}"
+                insights_key = f"paper_insights_data_{doc}"
                 if insights_key not in st.session_state:
                     st.session_state[insights_key] = []
                 
@@ -573,11 +537,12 @@ def display_trending_research(df, all_docs):
                         st.session_state[paper_key] = True
                         with st.spinner("Generating insights..."):
                             # Generate insights using our comprehensive function
-                            insights = generate_comprehensive_paper_insights(df, doc, title, api_key)
+                            insights = generate_comprehensive_paper_insights(corpus, doc, title, api_key)
                             st.session_state[insights_key] = insights
+                            record_insight_sources(st.session_state, insights_key, (doc,))
                 
-                # Display insights if they exist
-                if st.session_state[paper_key]:
+                # Display insights if they exist (they are dropped when the paper changes on reload)
+                if st.session_state[paper_key] and st.session_state[insights_key]:
                     st.subheader("Research Insights")
                     
                     # Create a container with custom styling for the insights
@@ -600,7 +565,7 @@ def display_trending_research(df, all_docs):
             # Paper types distribution
             pub_types = []
             for doc in new_papers:
-                paper_details = get_paper_details(df, doc)
+                paper_details = get_paper_details(corpus, doc)
                 if paper_details and 'publication_type' in paper_details:
                     pub_types.append(paper_details['publication_type'])
             
@@ -624,7 +589,7 @@ def display_trending_research(df, all_docs):
             # Funding source distribution
             funding_data = []
             for doc in new_papers:
-                funding_type = get_value_for_paper(df, doc, "funding_source", "type")
+                funding_type = get_value_for_paper(corpus, doc, "funding_source", "type")
                 if funding_type:
                     funding_data.append(funding_type)
             
@@ -658,28 +623,12 @@ def display_trending_research(df, all_docs):
             for ingredient, details in new_harmful_ingredients.items():
                 papers = details.get('papers', [])
                 
-                # Clean health impact text - remove numbering pattern
-                health_impact = details.get('health_impact', 'Not specified')
-                if health_impact and isinstance(health_impact, str):
-                    # Remove numbering patterns like "1)", "1) ", "1. ", etc.
-                    health_impact = re.sub(r'^\s*\d+[\)\.:\-\s]+\s*', '', health_impact.strip())
-                
-                # Clean evidence strength text - remove numbering pattern
-                evidence = details.get('evidence_strength', 'Not specified')
-                if evidence and isinstance(evidence, str):
-                    # Remove numbering patterns
-                    evidence = re.sub(r'^\s*\d+[\)\.:\-\s]+\s*', '', evidence.strip())
-                
-                # Clean ingredient name - remove numbering pattern
-                clean_ingredient = ingredient
-                if isinstance(ingredient, str):
-                    clean_ingredient = re.sub(r'^\s*\d+[\)\.:\-\s]+\s*', '', ingredient.strip())
-                
+                # Names and details are single list items, already free of numbering
                 ingredients_data.append({
-                    'Ingredient': clean_ingredient,
+                    'Ingredient': ingredient,
                     'Papers': len(papers),
-                    'Health Impact': health_impact,
-                    'Evidence Strength': evidence
+                    'Health Impact': details.get('health_impact', 'Not specified'),
+                    'Evidence Strength': details.get('evidence_strength', 'Not specified')
                 })
             
             ingredients_df = pd.DataFrame(ingredients_data)
@@ -692,38 +641,13 @@ def display_trending_research(df, all_docs):
             
             # Display detailed information for each ingredient
             for ingredient, details in new_harmful_ingredients.items():
-                # Clean ingredient name for display
-                clean_ingredient = ingredient
-                if isinstance(ingredient, str):
-                    clean_ingredient = re.sub(r'^\s*\d+[\)\.:\-\s]+\s*', '', ingredient.strip())
-                
-                with st.expander(f"Details: {clean_ingredient}"):
-                    # Clean and display health impact
-                    health_impact = details.get('health_impact', 'Not specified')
-                    if health_impact and isinstance(health_impact, str):
-                        health_impact = re.sub(r'^\s*\d+[\)\.:\-\s]+\s*', '', health_impact.strip())
-                    st.markdown(f"**Health Impact:** {health_impact}")
-                    
-                    # Clean and display evidence strength
-                    evidence = details.get('evidence_strength', 'Not specified')
-                    if evidence and isinstance(evidence, str):
-                        evidence = re.sub(r'^\s*\d+[\)\.:\-\s]+\s*', '', evidence.strip())
-                    st.markdown(f"**Evidence Strength:** {evidence}")
-                    
-                    # Clean and display comparison
-                    comparison = details.get('comparison_to_cigarettes', 'Not specified')
-                    if comparison and isinstance(comparison, str):
-                        comparison = re.sub(r'^\s*\d+[\)\.:\-\s]+\s*', '', comparison.strip())
-                    st.markdown(f"**Comparison to Traditional Cigarettes:** {comparison}")
+                with st.expander(f"Details: {ingredient}"):
+                    st.markdown(f"**Health Impact:** {details.get('health_impact', 'Not specified')}")
+                    st.markdown(f"**Evidence Strength:** {details.get('evidence_strength', 'Not specified')}")
+                    st.markdown(f"**Comparison to Traditional Cigarettes:** {details.get('comparison_to_cigarettes', 'Not specified')}")
                     
-                    # Display paper titles (also clean them if necessary)
-                    paper_titles = []
-                    for title in details.get('paper_titles', ['Unknown']):
-                        if isinstance(title, str):
-                            clean_title = re.sub(r'^\s*\d+[\)\.:\-\s]+\s*', '', title.strip())
-                            paper_titles.append(clean_title)
-                        else:
-                            paper_titles.append(title)
+                    # Display paper titles (pre-cleaned of any numbering)
+                    paper_titles = [corpus.text.clean(title) for title in details.get('paper_titles', ['Unknown'])]
                             
                     st.markdown(f"**Found in Papers:** {', '.join(paper_titles)}")
         else:
@@ -748,7 +672,7 @@ def display_trending_research(df, all_docs):
             "developmental_effects"
         ]
         
-        health_findings = get_health_findings(df, new_papers, health_categories)
+        health_findings = get_health_findings(corpus, new_papers, health_categories)
         
         if health_findings:
             for category, findings in health_findings.items():
@@ -770,7 +694,7 @@ def display_trending_research(df, all_docs):
         """, unsafe_allow_html=True)
         
         # Get product preferences
-        preference_data = get_feature_data_for_papers(df, new_papers, "product_preferences", 
+        preference_data = get_feature_data_for_papers(corpus, new_papers, "product_preferences", 
                                                     ["device_preferences.most_popular_devices", 
                                                      "flavor_preferences.most_popular_flavors",
                                                      "nicotine_preferences.most_common_concentrations"])
@@ -784,7 +708,7 @@ def display_trending_research(df, all_docs):
                     st.markdown("---")
         
         # Get perceived health improvements
-        health_improvement_data = get_feature_data_for_papers(df, new_papers, "perceived_health_improvements", 
+        health_improvement_data = get_feature_data_for_papers(corpus, new_papers, "perceived_health_improvements", 
                                                             ["sensory.smell.overall_percentage", 
                                                              "sensory.taste.overall_percentage",
                                                              "physical.breathing.overall_percentage"])
@@ -798,7 +722,7 @@ def display_trending_research(df, all_docs):
                     st.markdown("---")
         
         # Get consumer experience factors
-        experience_data = get_feature_data_for_papers(df, new_papers, "consumer_experience_factors", 
+        experience_data = get_feature_data_for_papers(corpus, new_papers, "consumer_experience_factors", 
                                                     ["factor", "health_implication", "optimization_suggestion"])
         
         if experience_data:
@@ -822,7 +746,7 @@ def display_trending_research(df, all_docs):
         """, unsafe_allow_html=True)
         
         # Get comparative benefits vs traditional cigarettes
-        vs_trad_data = get_feature_data_for_papers(df, new_papers, "comparative_benefits", 
+        vs_trad_data = get_feature_data_for_papers(corpus, new_papers, "comparative_benefits", 
                                                  ["vs_traditional_cigarettes.benefit",
                                                   "vs_traditional_cigarettes.magnitude",
                                                   "vs_traditional_cigarettes.evidence_strength"])
@@ -836,7 +760,7 @@ def display_trending_research(df, all_docs):
                     st.markdown("---")
         
         # Get comparative benefits vs other nicotine products
-        vs_other_data = get_feature_data_for_papers(df, new_papers, "comparative_benefits", ["vs_other_nicotine_products"])
+        vs_other_data = get_feature_data_for_papers(corpus, new_papers, "comparative_benefits", ["vs_other_nicotine_products"])
         
         if vs_other_data:
             with st.expander(f"Compared to Other Nicotine Products ({len(vs_other_data)} findings)"):
@@ -845,7 +769,7 @@ def display_trending_research(df, all_docs):
                     st.markdown("---")
         
         # Get harmful ingredients comparison to cigarettes
-        harmful_comp_data = get_feature_data_for_papers(df, new_papers, "harmful_ingredients", ["comparison_to_cigarettes"])
+        harmful_comp_data = get_feature_data_for_papers(corpus, new_papers, "harmful_ingredients", ["comparison_to_cigarettes"])
         
         if harmful_comp_data:
             with st.expander(f"Harmful Ingredients Comparison ({len(harmful_comp_data)} findings)"):
@@ -866,10 +790,10 @@ def display_trending_research(df, all_docs):
         """, unsafe_allow_html=True)
         
         # Get regulatory impact data
-        regulation_effects = get_value_for_papers(df, new_papers, "regulatory_impacts", "regulation_effects")
-        policy_recommendations = get_value_for_papers(df, new_papers, "regulatory_impacts", "policy_recommendations")
-        policy_relevance = get_value_for_papers(df, new_papers, "policy_relevance")
-        specific_recommendations = get_value_for_papers(df, new_papers, "specific_recommendations")
+        regulation_effects = get_value_for_papers(corpus, new_papers, "regulatory_impacts", "regulation_effects")
+        policy_recommendations = get_value_for_papers(corpus, new_papers, "regulatory_impacts", "policy_recommendations")
+        policy_relevance = get_value_for_papers(corpus, new_papers, "policy_relevance")
+        specific_recommendations = get_value_for_papers(corpus, new_papers, "specific_recommendations")
         
         if regulation_effects:
             with st.expander("Regulation Effects"):
@@ -908,16 +832,16 @@ def display_trending_research(df, all_docs):
         """, unsafe_allow_html=True)
         
         # Get study quality data
-        selection_bias = get_value_for_papers(df, new_papers, "selection_bias")
-        measurement_bias = get_value_for_papers(df, new_papers, "measurement_bias")
-        confounding = get_value_for_papers(df, new_papers, "confounding_factors")
+        selection_bias = get_value_for_papers(corpus, new_papers, "selection_bias")
+        measurement_bias = get_value_for_papers(corpus, new_papers, "measurement_bias")
+        confounding = get_value_for_papers(corpus, new_papers, "confounding_factors")
         
         # Use the modified function with the word count filter for conflicts of interest
         # This will exclude entries with 3 or fewer words
-        conflicts = get_value_for_papers(df, new_papers, "conflicts_of_interest", "description", min_word_count=3)
+        conflicts = get_value_for_papers(corpus, new_papers, "conflicts_of_interest", "description", min_word_count=3)
         
-        overall_quality = get_value_for_papers(df, new_papers, "overall_quality_assessment")
-        limitations = get_value_for_papers(df, new_papers, "limitations")
+        overall_quality = get_value_for_papers(corpus, new_papers, "overall_quality_assessment")
+        limitations = get_value_for_papers(corpus, new_papers, "limitations")
         
         if overall_quality:
             with st.expander("Overall Quality Assessment"):
@@ -963,12 +887,12 @@ def display_trending_research(df, all_docs):
 
 # Add these helper functions to your code to support the new tabs:
 
-def get_feature_data_for_papers(df, papers, category, subcategories):
+def get_feature_data_for_papers(corpus, papers, category, subcategories):
     """
     Extract specific feature data for all papers based on category and subcategories
     
     Parameters:
-    - df: The main dataframe
+    - corpus: The shared CorpusSnapshot
     - papers: List of paper column names
     - category: The main category to look for
     - subcategories: List of subcategories to extract
@@ -976,12 +900,12 @@ def get_feature_data_for_papers(df, papers, category, subcategories):
     Returns:
     - List of dictionaries with feature data for each paper
     """
+    plan = [(subcategory, corpus.resolver.feature_candidates(subcategory)) for subcategory in subcategories]
     all_data = []
     
     for doc in papers:
         # Get paper title for reference
-        title_row = df[df['Category'] == 'title']
-        paper_title = title_row[doc].iloc[0] if not title_row.empty else "Unknown paper"
+        paper_title = corpus.value(doc, category='title', default="Unknown paper")
         
         paper_data = {
             'paper': doc,
@@ -990,64 +914,16 @@ def get_feature_data_for_papers(df, papers, category, subcategories):
         
         has_data = False
         
-        for subcategory in subcategories:
-            # First look in SubCategory
-            if subcategory in df['SubCategory'].values:
-                rows = df[df['SubCategory'] == subcategory]
-                if not rows.empty and doc in rows.columns:
-                    value = rows[doc].iloc[0]
-                    if value and not pd.isna(value):
-                        # Clean numbering pattern if present
-                        if isinstance(value, str):
-                            value = re.sub(r'^\s*\d+[\)\.:\-\s]+\s*', '', value.strip())
-                        paper_data[subcategory] = value
-                        has_data = True
-            
-            # Some values might be in Category instead
-            elif subcategory in df['Category'].values:
-                rows = df[df['Category'] == subcategory]
-                if not rows.empty and doc in rows.columns:
-                    value = rows[doc].iloc[0]
-                    if value and not pd.isna(value):
-                        # Clean numbering pattern if present
-                        if isinstance(value, str):
-                            value = re.sub(r'^\s*\d+[\)\.:\-\s]+\s*', '', value.strip())
-                        paper_data[subcategory] = value
-                        has_data = True
-            
-            # For nested subcategories with dots
-            elif '.' in subcategory:
-                parts = subcategory.split('.')
-                base_category = parts[0]
-                sub_parts = '.'.join(parts[1:])
-                
-                # Look for rows where Category contains the base_category
-                category_rows = df[df['Category'].str.contains(base_category, na=False)]
-                if not category_rows.empty:
-                    sub_rows = category_rows[category_rows['SubCategory'].str.contains(sub_parts, na=False, regex=False)]
-                    if not sub_rows.empty and doc in sub_rows.columns:
-                        value = sub_rows[doc].iloc[0]
-                        if value and not pd.isna(value):
-                            # Clean numbering pattern if present
-                            if isinstance(value, str):
-                                value = re.sub(r'^\s*\d+[\)\.:\-\s]+\s*', '', value.strip())
-                            paper_data[subcategory] = value
-                            has_data = True
-                
-                # Try one more approach for nested categories
-                if subcategory not in paper_data:
-                    # Try to match the category containing the base category
-                    cat_match = df[df['Category'].str.contains(base_category, na=False, regex=False)]
-                    if not cat_match.empty:
-                        # And subcategory containing the subparts
-                        subcat_match = cat_match[cat_match['SubCategory'].str.contains(sub_parts, na=False, regex=False)]
-                        if not subcat_match.empty and doc in subcat_match.columns:
-                            value = subcat_match[doc].iloc[0]
-                            if value and not pd.isna(value):
-                                if isinstance(value, str):
-                                    value = re.sub(r'^\s*\d+[\)\.:\-\s]+\s*', '', value.strip())
-                                paper_data[subcategory] = value
-                                has_data = True
+        for subcategory, candidates in plan:
+            # Exact SubCategory, exact Category, or (for dotted names) the
+            # Category/SubCategory contains matches, resolved once above
+            for position in candidates:
+                value = corpus.value_at(doc, position)
+                if value and not pd.isna(value):
+                    # Numbering pattern stripped once at load time
+                    paper_data[subcategory] = corpus.text.clean(value)
+                    has_data = True
+                    break
         
         # Only add this paper if it has at least one data point
         if has_data:
@@ -1056,12 +932,12 @@ def get_feature_data_for_papers(df, papers, category, subcategories):
     return all_data
 
 
-def get_value_for_papers(df, papers, category, subcategory=None, min_word_count=None):
+def get_value_for_papers(corpus, papers, category, subcategory=None, min_word_count=None):
     """
     Get values for a specified category/subcategory for all papers
     
     Parameters:
-    - df: The main dataframe
+    - corpus: The shared CorpusSnapshot
     - papers: List of paper column names
     - category: The category to look for
     - subcategory: Optional subcategory
@@ -1070,77 +946,42 @@ def get_value_for_papers(df, papers, category, subcategory=None, min_word_count=
     Returns:
     - Dictionary with paper titles as keys and values found
     """
+    # Exact match first, then contains matches; resolved once for all papers
+    position = corpus.resolver.value_row(category, subcategory or None)
     results = {}
     
     for doc in papers:
         # Get paper title for reference
-        title_row = df[df['Category'] == 'title']
-        paper_title = title_row[doc].iloc[0] if not title_row.empty else f"Paper {doc}"
+        paper_title = corpus.value(doc, category='title', default=f"Paper {doc}")
         
-        # Look for the value based on whether subcategory is provided
-        if subcategory:
-            # First try exact match on both category and subcategory
-            rows = df[(df['Category'] == category) & (df['SubCategory'] == subcategory)]
-            
-            # If no exact match, try with contains
-            if rows.empty:
-                rows = df[(df['Category'].str.contains(category, na=False)) & 
-                         (df['SubCategory'] == subcategory)]
-            
-            # If still no match, try with contains for both
-            if rows.empty:
-                rows = df[(df['Category'].str.contains(category, na=False)) & 
-                         (df['SubCategory'].str.contains(subcategory, na=False))]
-        else:
-            # Look directly in Category with exact match
-            rows = df[df['Category'] == category]
-            
-            # If no exact match, try with contains
-            if rows.empty:
-                rows = df[df['Category'].str.contains(category, na=False)]
-        
-        # If we found matching rows, get the value
-        if not rows.empty and doc in rows.columns:
-            value = rows[doc].iloc[0]
+        # If we found a matching row, get the value
+        if position is not None:
+            value = corpus.value_at(doc, position)
             if value and not pd.isna(value):
-                # Clean numbering pattern if present
-                if isinstance(value, str):
-                    value = re.sub(r'^\s*\d+[\)\.:\-\s]+\s*', '', value.strip())
-                    
-                    # Apply minimum word count filter if specified
-                    if min_word_count is not None:
-                        word_count = len(value.split())
-                        if word_count <= min_word_count:
-                            # Skip this value as it has too few words
-                            continue
+                # Apply minimum word count filter if specified (word counts
+                # of the cleaned text are precomputed at load time)
+                if isinstance(value, str) and min_word_count is not None:
+                    if corpus.text.word_count(value) <= min_word_count:
+                        # Skip this value as it has too few words
+                        continue
                 
-                results[paper_title] = value
+                # Numbering pattern stripped once at load time
+                results[paper_title] = corpus.text.clean(value)
     
     return results
 
                             
-def get_papers_by_year(df, all_docs, year):
+def get_papers_by_year(corpus, all_docs, year):
     """Get document columns for papers published in the specified year"""
-    matching_papers = []
+    if not corpus.has_category('publication_year'):
+        return []
     
-    for doc_col in all_docs:
-        # Find the year for this document
-        if 'publication_year' in df['Category'].values:
-            year_row = df[df['Category'] == 'publication_year']
-            if not year_row.empty:
-                year_value = year_row[doc_col].iloc[0]
-                if year_value and not pd.isna(year_value):
-                    try:
-                        doc_year = int(float(year_value))
-                        if doc_year == year:
-                            matching_papers.append(doc_col)
-                    except (ValueError, TypeError):
-                        pass
-    
-    return matching_papers
+    # Typed years from the facet table (missing or unparseable years are dropped)
+    doc_years = corpus.facets['year'].dropna().to_dict()
+    return [doc_col for doc_col in all_docs if doc_years.get(doc_col) == year]
 
 
-def get_paper_details(df, doc_col):
+def get_paper_details(corpus, doc_col):
     """Extract key details about a paper from the dataframe"""
     paper_details = {}
     
@@ -1158,126 +999,136 @@ def get_paper_details(df, doc_col):
     
     for field, (cat_type, cat_value) in metadata_fields.items():
         if cat_type == 'Category':
-            rows = df[df['Category'] == cat_value]
+            value = corpus.value(doc_col, category=cat_value)
         else:
-            rows = df[df['SubCategory'] == cat_value]
+            value = corpus.value(doc_col, subcategory=cat_value)
         
-        if not rows.empty:
-            value = rows[doc_col].iloc[0]
-            if value and not pd.isna(value):
-                paper_details[field] = value
+        if value and not pd.isna(value):
+            paper_details[field] = value
     
     return paper_details
 
 
-def get_unique_values_for_papers(df, papers, category_field, subcategory_field=None):
+def get_unique_values_for_papers(corpus, papers, category_field, subcategory_field=None):
     """Get unique values for a specified field across the selected papers"""
     unique_values = set()
     
     for doc in papers:
         if subcategory_field:
-            rows = df[df['SubCategory'] == subcategory_field]
+            value = corpus.value(doc, subcategory=subcategory_field)
         else:
-            rows = df[df['Category'] == category_field]
+            value = corpus.value(doc, category=category_field)
             
-        if not rows.empty:
-            value = rows[doc].iloc[0]
-            if value and not pd.isna(value):
-                unique_values.add(value)
+        if value and not pd.isna(value):
+            unique_values.add(value)
     
     return list(unique_values)
 
 
-def get_value_for_paper(df, doc, category_field, subcategory_field=None):
+def get_value_for_paper(corpus, doc, category_field, subcategory_field=None):
     """Get value for a specified field for a single paper"""
     if subcategory_field:
-        rows = df[df['SubCategory'] == subcategory_field]
+        value = corpus.value(doc, subcategory=subcategory_field)
     else:
-        rows = df[df['Category'] == category_field]
+        value = corpus.value(doc, category=category_field)
         
-    if not rows.empty:
-        value = rows[doc].iloc[0]
-        if value and not pd.isna(value):
-            return value
+    if value and not pd.isna(value):
+        return value
     
     return None
 
 
-def get_new_harmful_ingredients(df, all_docs, new_papers):
-    """
-    Identify harmful ingredients that appear in 2025 papers but not in earlier papers
-    Returns a dictionary of ingredients with their details
+# Fields of harmful_ingredients describing one ingredient (name first)
+HARMFUL_INGREDIENT_FIELDS = ('name', 'health_impact', 'evidence_strength', 'comparison_to_cigarettes')
+
+
+def get_harmful_ingredient_items(corpus, docs):
     """
-    # Get all harmful ingredients from 2025 papers
-    new_ingredients = {}
+    Every harmful ingredient of the given papers, with its details.
     
-    # First find rows related to harmful ingredients
-    ingredient_rows = df[df['SubCategory'] == 'name']
-    impact_rows = df[df['SubCategory'] == 'health_impact']
-    evidence_rows = df[df['SubCategory'] == 'evidence_strength']
-    comparison_rows = df[df['SubCategory'] == 'comparison_to_cigarettes']
+    Numbered-list cells ("1) Nicotine, 2) Acrolein") give one ingredient per
+    item, with the details at the same list position (pre-exploded at load
+    time). A name cell without numbered items is a single ingredient, with
+    the whole cleaned cell of each detail field.
     
-    # Get ingredients from new papers
-    for doc in new_papers:
-        if not ingredient_rows.empty:
-            ingredient = ingredient_rows[doc].iloc[0]
-            if ingredient and not pd.isna(ingredient):
-                # Get paper title for reference
-                title_row = df[df['Category'] == 'title']
-                paper_title = title_row[doc].iloc[0] if not title_row.empty else "Unknown paper"
-                
-                # Get additional details if available
-                health_impact = impact_rows[doc].iloc[0] if not impact_rows.empty else None
-                evidence_strength = evidence_rows[doc].iloc[0] if not evidence_rows.empty else None
-                comparison = comparison_rows[doc].iloc[0] if not comparison_rows.empty else None
-                
-                # Add or update ingredient info
-                if ingredient not in new_ingredients:
-                    new_ingredients[ingredient] = {
-                        'papers': [doc],
-                        'paper_titles': [paper_title],
-                        'health_impact': health_impact,
-                        'evidence_strength': evidence_strength,
-                        'comparison_to_cigarettes': comparison
-                    }
-                else:
-                    new_ingredients[ingredient]['papers'].append(doc)
-                    new_ingredients[ingredient]['paper_titles'].append(paper_title)
+    Returns:
+        list: (doc, name, health_impact, evidence_strength, comparison_to_cigarettes)
+        tuples, by paper in the order of docs
+    """
+    items = corpus.aligned_items('harmful_ingredients', HARMFUL_INGREDIENT_FIELDS, docs)
+    rows = {doc: [] for doc in docs}
+    for row in zip(items['doc'], *(items[field] for field in HARMFUL_INGREDIENT_FIELDS)):
+        rows[row[0]].append(row)
     
-    # Now check if these ingredients appear in older papers
-    old_papers = [doc for doc in all_docs if doc not in new_papers]
-    old_ingredients = set()
+    for doc in docs:
+        if rows[doc]:
+            continue
+        name = corpus.text.clean(corpus.value(doc, path='harmful_ingredients.name'))
+        if pd.isna(name) or not str(name).strip():
+            continue
+        details = tuple(corpus.text.clean(corpus.value(doc, path=f'harmful_ingredients.{field}'))
+                        for field in HARMFUL_INGREDIENT_FIELDS[1:])
+        rows[doc].append((doc, name) + details)
     
-    for doc in old_papers:
-        if not ingredient_rows.empty:
-            ingredient = ingredient_rows[doc].iloc[0]
-            if ingredient and not pd.isna(ingredient):
-                old_ingredients.add(ingredient)
+    return [row for doc in docs for row in rows[doc]]
+
+
+def get_new_harmful_ingredients(corpus, all_docs, new_papers):
+    """
+    Identify harmful ingredients that appear in 2025 papers but not in earlier papers
+    Returns a dictionary of ingredients with their details
+    """
+    # Ingredients already seen in older papers
+    new_paper_set = set(new_papers)
+    old_papers = [doc for doc in all_docs if doc not in new_paper_set]
+    old_ingredients = {row[1] for row in get_harmful_ingredient_items(corpus, old_papers)}
     
-    # Filter to keep only ingredients that are new in 2025
-    truly_new_ingredients = {k: v for k, v in new_ingredients.items() if k not in old_ingredients}
+    # Get all harmful ingredients from 2025 papers that are not in older papers
+    new_ingredients = {}
     
-    return truly_new_ingredients
+    for doc, ingredient, health_impact, evidence_strength, comparison in get_harmful_ingredient_items(
+            corpus, new_papers):
+        if not ingredient or ingredient in old_ingredients:
+            continue
+        
+        # Get paper title for reference
+        paper_title = corpus.value(doc, category='title', default="Unknown paper")
+        
+        # Add or update ingredient info
+        if ingredient not in new_ingredients:
+            new_ingredients[ingredient] = {
+                'papers': [doc],
+                'paper_titles': [paper_title],
+                'health_impact': health_impact if pd.notna(health_impact) else 'Not specified',
+                'evidence_strength': evidence_strength if pd.notna(evidence_strength) else 'Not specified',
+                'comparison_to_cigarettes': comparison if pd.notna(comparison) else 'Not specified'
+            }
+        elif doc not in new_ingredients[ingredient]['papers']:
+            new_ingredients[ingredient]['papers'].append(doc)
+            new_ingredients[ingredient]['paper_titles'].append(paper_title)
+    
+    return new_ingredients
 
 
-def get_health_findings(df, papers, health_categories):
+def get_health_findings(corpus, papers, health_categories):
     """Extract health findings from the papers for each category"""
+    labels = corpus.labels
     findings = {}
     
     for category in health_categories:
         category_findings = []
         
         # Look for description fields within each category
-        description_rows = df[df['SubCategory'].str.contains('description', na=False) & 
-                             df['Category'].str.contains(category, na=False)]
+        description_mask = (labels['SubCategory'].str.contains('description', na=False) & 
+                            labels['Category'].str.contains(category, na=False))
+        description_rows = description_mask.to_numpy().nonzero()[0]
         
         for doc in papers:
-            for _, row in description_rows.iterrows():
-                finding = row[doc]
+            for position in description_rows:
+                finding = corpus.value_at(doc, position)
                 if finding and not pd.isna(finding):
                     # Get paper title
-                    title_row = df[df['Category'] == 'title']
-                    paper_title = title_row[doc].iloc[0] if not title_row.empty else "Unknown paper"
+                    paper_title = corpus.value(doc, category='title', default="Unknown paper")
                     
                     category_findings.append({
                         'paper': doc,
@@ -1291,7 +1142,7 @@ def get_health_findings(df, papers, health_categories):
     return findings
 
 
-def generate_tags_for_paper(df, doc, pub_year=None):
+def generate_tags_for_paper(corpus, doc, pub_year=None):
     """Generate relevant tags for a paper based on its content and publication year"""
     tags_by_type = {
         'year': [],
@@ -1302,10 +1153,7 @@ def generate_tags_for_paper(df, doc, pub_year=None):
     used_values = set()  # Track values we've already added to avoid duplicates
     
     # Get paper title to check for duplicates
-    paper_title = None
-    title_row = df[df['Category'] == 'title']
-    if not title_row.empty:
-        paper_title = title_row[doc].iloc[0]
+    paper_title = corpus.value(doc, category='title')
     
     # Add publication year tag first (instead of fixed "2025")
     if pub_year and not pd.isna(pub_year):
@@ -1363,62 +1211,50 @@ def generate_tags_for_paper(df, doc, pub_year=None):
     
     for category, subcategory, tag_type, priority in tag_checks:
         # First check if subcategory directly exists in SubCategory
-        if subcategory in df['SubCategory'].values:
-            rows = df[df['SubCategory'] == subcategory]
-            if not rows.empty:
-                value = rows[doc].iloc[0]
-                if value and not pd.isna(value):
-                    # Skip if this value matches the paper title
-                    if paper_title and paper_title.strip() == value.strip():
-                        continue
-                        
-                    # Clean numbering patterns for ALL categories now
-                    # Remove numbering patterns like "1)", "2) ", etc.
-                    # First split by comma if there are multiple items
-                    items = value.split(',')
-                    cleaned_items = []
-                    
-                    for item in items:
-                        # Remove numbering pattern (like "1) " or "1. " or "1 - ")
-                        cleaned_item = re.sub(r'^\s*\d+[\)\.:\-\s]+\s*', '', item.strip())
-                        if cleaned_item:
-                            cleaned_items.append(cleaned_item)
-                    
-                    # Join all cleaned items back together with commas
-                    if cleaned_items:
-                        value = ', '.join(cleaned_items)
-                    
-                    # Skip if we've already added this value or a similar one
-                    if value in used_values:
-                        continue
+        if corpus.has_subcategory(subcategory):
+            value = corpus.value(doc, subcategory=subcategory)
+            if value and not pd.isna(value):
+                # Skip if this value matches the paper title
+                if paper_title and paper_title.strip() == value.strip():
+                    continue
                     
-                    # Add to used values to prevent duplicates
-                    used_values.add(value)
-                    tags_by_type[priority].append((value, tag_type))
+                # Numbered lists ("1) X, 2) Y") use their pre-exploded items,
+                # other values their comma-separated parts cleaned at load time
+                cleaned_items = [item for item in corpus.items(doc, subcategory=subcategory) if item]
+                if cleaned_items:
+                    value = ', '.join(cleaned_items)
+                else:
+                    value = corpus.text.clean_list(value)
+                
+                # Skip if we've already added this value or a similar one
+                if value in used_values:
+                    continue
+                
+                # Add to used values to prevent duplicates
+                used_values.add(value)
+                tags_by_type[priority].append((value, tag_type))
         
         # Then check if it's a Category (for fields like 'novel_findings', 'limitations')
-        elif subcategory == '-' and category in df['Category'].values:
-            rows = df[df['Category'] == category]
-            if not rows.empty:
-                value = rows[doc].iloc[0]
-                if value and not pd.isna(value):
-                    # Skip if this value matches the paper title
-                    if paper_title and paper_title.strip() == value.strip():
-                        continue
-                        
-                    # Just take the first ~30 characters for these as they can be lengthy
-                    if len(value) > 30:
-                        short_value = value[:30].strip() + "..."
-                    else:
-                        short_value = value
-                    
-                    # Skip if we've already added this value or a similar one
-                    if short_value in used_values:
-                        continue
+        elif subcategory == '-' and corpus.has_category(category):
+            value = corpus.value(doc, category=category)
+            if value and not pd.isna(value):
+                # Skip if this value matches the paper title
+                if paper_title and paper_title.strip() == value.strip():
+                    continue
                     
-                    # Add to used values to prevent duplicates
-                    used_values.add(short_value)
-                    tags_by_type[priority].append((short_value, tag_type))
+                # Just take the first ~30 characters for these as they can be lengthy
+                if len(value) > 30:
+                    short_value = value[:30].strip() + "..."
+                else:
+                    short_value = value
+                
+                # Skip if we've already added this value or a similar one
+                if short_value in used_values:
+                    continue
+                
+                # Add to used values to prevent duplicates
+                used_values.add(short_value)
+                tags_by_type[priority].append((short_value, tag_type))
     
     # Combine the tags in the specified order
     ordered_tags = []
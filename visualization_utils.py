@@ -1,5 +1,4 @@
 import os
-import re
 import tempfile
 import json
 import random
@@ -16,52 +15,64 @@ from pyecharts import options as opts
 from pyecharts.charts import Sunburst
 from pyecharts.globals import ThemeType
 
+from result_cache import cached_aggregate
+from country_index import CountryIndex, country_name
+
 
 # Function to generate publications by year chart data
-def get_publications_by_year(df, matching_docs):
+def get_publications_by_year(corpus, matching_docs):
     """
     Create a DataFrame with publication counts by year
     
     Parameters:
-    df (pandas.DataFrame): Main DataFrame containing research data
+    corpus (CorpusSnapshot): Shared corpus containing research data
     matching_docs (list): List of document column names that match current filters
     
     Returns:
     pandas.DataFrame: DataFrame with Year and Count columns
     """
-    year_counts = {}
+    year_counts = pd.Series(dtype=int)
     
-    if 'publication_year' in df['Category'].values:
-        year_rows = df[df['Category'] == 'publication_year']
-        
-        for doc_col in matching_docs:
-            year_value = year_rows[doc_col].iloc[0] if not year_rows.empty else None
-            if year_value and not pd.isna(year_value):
-                try:
-                    year = int(float(year_value))
-                    if year in year_counts:
-                        year_counts[year] += 1
-                    else:
-                        year_counts[year] = 1
-                except (ValueError, TypeError):
-                    continue
+    if corpus.has_category('publication_year'):
+        years = corpus.facets.loc[list(matching_docs), 'year'].dropna().astype(int)
+        year_counts = years.value_counts().sort_index()
     
     # Convert to DataFrame
-    if year_counts:
-        years = sorted(year_counts.keys())
-        counts = [year_counts[year] for year in years]
-        return pd.DataFrame({'Year': years, 'Count': counts})
+    if not year_counts.empty:
+        return pd.DataFrame({'Year': year_counts.index.tolist(), 'Count': year_counts.tolist()})
     
     return pd.DataFrame()
 
-def generate_pyecharts_sunburst_data(df, matching_docs):
+
+def get_facet_counts_by_year(corpus, matching_docs, facet):
+    """
+    Count matching documents per publication year and facet value
+    
+    Parameters:
+    corpus (CorpusSnapshot): Shared corpus containing research data
+    matching_docs (list): List of document column names that match current filters
+    facet (str): DocFacets column, e.g. 'publication_type', 'funding_type' or 'study_design'
+    
+    Returns:
+    dict: {year: {facet value: count}}, in order of first appearance in matching_docs
+    """
+    facets = corpus.facets.loc[list(matching_docs), ['year', facet]].dropna()
+    counts = facets.groupby(['year', facet], sort=False, observed=True).size()
+    
+    counts_by_year = {}
+    for (year, value), count in counts.items():
+        counts_by_year.setdefault(int(year), {})[value] = int(count)
+    
+    return counts_by_year
+
+def generate_pyecharts_sunburst_data(corpus, matching_docs):
     """
     Generate hierarchical data structure for pyecharts sunburst chart
     from filtered matching_docs, showing top 5 from each hierarchy level:
     publication type, study design, and funding source
     
     Parameters:
-    df (pandas.DataFrame): Main DataFrame containing research data
+    corpus (CorpusSnapshot): Shared corpus containing research data
     matching_docs (list): List of document column names that match current filters
     
     Returns:
@@ -72,53 +83,38 @@ def generate_pyecharts_sunburst_data(df, matching_docs):
     study_designs = {}
     funding_sources = {}
     
-    # Get rows for each category
-    pub_type_rows = df[df['Category'] == 'publication_type']
-    study_design_rows = df[df['SubCategory'] == 'primary_type']
-    funding_rows = df[df['SubCategory'] == 'type']
+    # Typed publication type, study design and funding source per matching document
+    facets = corpus.facets.loc[list(matching_docs), ['publication_type', 'study_design', 'funding_type']]
     
     # Track document relationships between categories
     relationships = {}
     
     # Count occurrences and track relationships
-    for doc_col in matching_docs:
+    for pub_type, design, funding in facets.itertuples(index=False):
         # Extract publication type
-        if not pub_type_rows.empty:
-            try:
-                pub_type = pub_type_rows[doc_col].iloc[0]
-                if pub_type and not pd.isna(pub_type):
-                    pub_types[pub_type] = pub_types.get(pub_type, 0) + 1
-                    
-                    # Extract study design for this document
-                    if not study_design_rows.empty:
-                        try:
-                            design = study_design_rows[doc_col].iloc[0]
-                            if design and not pd.isna(design):
-                                study_designs[design] = study_designs.get(design, 0) + 1
-                                
-                                # Create relationship key
-                                rel_key = f"{pub_type}|{design}"
-                                if rel_key not in relationships:
-                                    relationships[rel_key] = {'count': 0, 'funding': {}}
-                                relationships[rel_key]['count'] += 1
-                                
-                                # Extract funding source for this document
-                                if not funding_rows.empty:
-                                    try:
-                                        funding = funding_rows[doc_col].iloc[0]
-                                        if funding and not pd.isna(funding):
-                                            funding_sources[funding] = funding_sources.get(funding, 0) + 1
-                                            
-                                            # Add to relationship
-                                            if funding not in relationships[rel_key]['funding']:
-                                                relationships[rel_key]['funding'][funding] = 0
-                                            relationships[rel_key]['funding'][funding] += 1
-                                    except (IndexError, KeyError):
-                                        pass
-                        except (IndexError, KeyError):
-                            pass
-            except (IndexError, KeyError):
-                pass
+        if pd.isna(pub_type):
+            continue
+        pub_types[pub_type] = pub_types.get(pub_type, 0) + 1
+        
+        # Extract study design for this document
+        if pd.isna(design):
+            continue
+        study_designs[design] = study_designs.get(design, 0) + 1
+        
+        # Create relationship key
+        rel_key = f"{pub_type}|{design}"
+        if rel_key not in relationships:
+            relationships[rel_key] = {'count': 0, 'funding': {}}
+        relationships[rel_key]['count'] += 1
+        
+        # Extract funding source for this document
+        if not pd.isna(funding):
+            funding_sources[funding] = funding_sources.get(funding, 0) + 1
+            
+            # Add to relationship
+            if funding not in relationships[rel_key]['funding']:
+                relationships[rel_key]['funding'][funding] = 0
+            relationships[rel_key]['funding'][funding] += 1
     
     # Get top 5 from each category
     top_pub_types = sorted(pub_types.items(), key=lambda x: x[1], reverse=True)[:5]
@@ -268,16 +264,17 @@ def create_pyecharts_sunburst_html(data):
     
     return html_content
 
-def display_pyecharts_sunburst(df, matching_docs):
+def display_pyecharts_sunburst(corpus, matching_docs):
     """
     Generate and display the pyecharts sunburst in Streamlit
     
     Parameters:
-    df (pandas.DataFrame): Main DataFrame containing research data
+    corpus (CorpusSnapshot): Shared corpus containing research data
     matching_docs (list): List of document column names that match current filters
     """
-    # Generate the data
-    sunburst_data = generate_pyecharts_sunburst_data(df, matching_docs)
+    # Generate the data (shared across sessions with the same filters)
+    sunburst_data = cached_aggregate(matching_docs, "sunburst",
+                                     lambda: generate_pyecharts_sunburst_data(corpus, matching_docs))
     
     if not sunburst_data:
         st.warning("Not enough data to generate the chart. Please adjust your filters.")
@@ -289,58 +286,29 @@ def display_pyecharts_sunburst(df, matching_docs):
     # Display in Streamlit
     st.components.v1.html(html_content, height=470, scrolling=False)
 
-def get_countries_by_study(df, matching_docs):
+def get_countries_by_study(corpus, matching_docs):
     """
-    Extract countries mentioned in studies and count their occurrences.
+    Count the studies per country.
     
     Parameters:
-    df (pandas.DataFrame): DataFrame containing the research data
+    corpus (CorpusSnapshot): Shared corpus containing the research data
     matching_docs (list): List of document column names that match current filters
     
     Returns:
-    dict: Dictionary with countries as keys and their mention counts as values
+    dict: Dictionary with ISO alpha-3 country codes as keys and their study counts as values
     """
-    country_data = {}
-    
-    # Find rows where Category is 'country_of_study'
-    if 'Category' in df.columns and 'country_of_study' in df['Category'].values:
-        country_rows = df[df['Category'] == 'country_of_study']
-        
-        for doc_col in matching_docs:
-            country_value = country_rows[doc_col].iloc[0] if not country_rows.empty else None
-            
-            if country_value and not pd.isna(country_value):
-                # Split by comma, semicolon, or 'and' to handle multiple countries in one cell
-                split_countries = re.split(r',|\s+and\s+|;', str(country_value))
-                
-                for country in split_countries:
-                    # Clean up country name
-                    country = country.strip()
-                    if country:
-                        # Handle special cases for country names
-                        if country.lower() in ['usa', 'us', 'u.s.', 'u.s.a.', 'united states']:
-                            country = 'United States of America'
-                        elif country.lower() in ['uk', 'u.k.', 'england', 'britain', 'great britain', 'united kingdon']:
-                            country = 'United Kingdom'
-                        
-                        # Count occurrences
-                        if country in country_data:
-                            country_data[country] += 1
-                        else:
-                            country_data[country] = 1
-    
-    # Filter out 'Global' as it's not a country
-    if 'Global' in country_data:
-        del country_data['Global']
-        
-    return country_data
+    # Countries are parsed and normalized once per corpus in the country index;
+    # entries that are not a country (e.g. 'Global') are left out there
+    if not corpus.has_category('country_of_study'):
+        return {}
+    return CountryIndex.for_corpus(corpus).counts(matching_docs)
 
 def create_country_choropleth(country_data):
     """
     Create a folium choropleth map based on country data.
     
     Parameters:
-    country_data (dict): Dictionary with countries as keys and their mention counts as values
+    country_data (dict): Dictionary with ISO alpha-3 country codes as keys and their study counts as values
     
     Returns:
     folium.Map: A folium map with choropleth visualization
@@ -360,7 +328,7 @@ def create_country_choropleth(country_data):
         name="Country Counts",
         data=df,
         columns=['Country', 'Percentile'],  # Use percentile instead of raw count
-        key_on="feature.properties.name",  # Standard key for country name in GeoJSON
+        key_on="feature.id",  # ISO alpha-3 code of the country in the GeoJSON
         fill_color="YlGn",  # Yellow to Green colormap
         fill_opacity=0.7,
         line_opacity=0.2,
@@ -426,39 +394,20 @@ def create_country_choropleth(country_data):
     
     return m
 
-def display_publication_type_chart(df, matching_docs, pub_df):
+def display_publication_type_chart(corpus, matching_docs, pub_df):
     """
     Create and display stacked chart for Publication Type by year
     
     Parameters:
-    df (pandas.DataFrame): Main DataFrame containing research data
+    corpus (CorpusSnapshot): Shared corpus containing research data
     matching_docs (list): List of document column names that match current filters
     pub_df (pandas.DataFrame): DataFrame with publication data by year
     """
     # Create stacked chart for Publication Type by year
     pub_types_by_year = {}
     
-    if 'publication_type' in df['Category'].values:
-        year_rows = df[df['Category'] == 'publication_year']
-        type_rows = df[df['Category'] == 'publication_type']
-        
-        for doc_col in matching_docs:
-            year_value = year_rows[doc_col].iloc[0] if not year_rows.empty else None
-            pub_type = type_rows[doc_col].iloc[0] if not type_rows.empty else None
-            
-            if year_value and pub_type and not pd.isna(year_value) and not pd.isna(pub_type):
-                try:
-                    year = int(float(year_value))
-                    if year not in pub_types_by_year:
-                        pub_types_by_year[year] = {}
-                    
-                    if pub_type in pub_types_by_year[year]:
-                        pub_types_by_year[year][pub_type] += 1
-                    else:
-                        pub_types_by_year[year][pub_type] = 1
-                        
-                except (ValueError, TypeError):
-                    continue
+    if corpus.has_category('publication_type'):
+        pub_types_by_year = get_facet_counts_by_year(corpus, matching_docs, 'publication_type')
     
     if pub_types_by_year:
         # Get the top 5 publication types
@@ -574,38 +523,19 @@ def display_publication_type_chart(df, matching_docs, pub_df):
     else:
         st.info("Publication type data not available for the filtered documents")
 
-def display_funding_chart(df, matching_docs):
+def display_funding_chart(corpus, matching_docs):
     """
     Create and display stacked chart for Funding Source by year
     
     Parameters:
-    df (pandas.DataFrame): Main DataFrame containing research data
+    corpus (CorpusSnapshot): Shared corpus containing research data
     matching_docs (list): List of document column names that match current filters
     """
     # Create stacked chart for Funding Source by year
     funding_by_year = {}
     
-    if 'type' in df['SubCategory'].values:
-        year_rows = df[df['Category'] == 'publication_year']
-        funding_rows = df[df['SubCategory'] == 'type']
-        
-        for doc_col in matching_docs:
-            year_value = year_rows[doc_col].iloc[0] if not year_rows.empty else None
-            funding = funding_rows[doc_col].iloc[0] if not funding_rows.empty else None
-            
-            if year_value and funding and not pd.isna(year_value) and not pd.isna(funding):
-                try:
-                    year = int(float(year_value))
-                    if year not in funding_by_year:
-                        funding_by_year[year] = {}
-                    
-                    if funding in funding_by_year[year]:
-                        funding_by_year[year][funding] += 1
-                    else:
-                        funding_by_year[year][funding] = 1
-                        
-                except (ValueError, TypeError):
-                    continue
+    if corpus.has_subcategory('type'):
+        funding_by_year = get_facet_counts_by_year(corpus, matching_docs, 'funding_type')
     
     if funding_by_year:
         # Get the top 5 funding sources
@@ -719,38 +649,19 @@ def display_funding_chart(df, matching_docs):
     else:
         st.info("Funding source data not available for the filtered documents")
 
-def display_study_design_chart(df, matching_docs):
+def display_study_design_chart(corpus, matching_docs):
     """
     Create and display stacked chart for Study Design by year
     
     Parameters:
-    df (pandas.DataFrame): Main DataFrame containing research data
+    corpus (CorpusSnapshot): Shared corpus containing research data
     matching_docs (list): List of document column names that match current filters
     """
     # Create stacked chart for Study Design by year
     design_by_year = {}
     
-    if 'primary_type' in df['SubCategory'].values:
-        year_rows = df[df['Category'] == 'publication_year']
-        design_rows = df[df['SubCategory'] == 'primary_type']
-        
-        for doc_col in matching_docs:
-            year_value = year_rows[doc_col].iloc[0] if not year_rows.empty else None
-            design = design_rows[doc_col].iloc[0] if not design_rows.empty else None
-            
-            if year_value and design and not pd.isna(year_value) and not pd.isna(design):
-                try:
-                    year = int(float(year_value))
-                    if year not in design_by_year:
-                        design_by_year[year] = {}
-                    
-                    if design in design_by_year[year]:
-                        design_by_year[year][design] += 1
-                    else:
-                        design_by_year[year][design] = 1
-                        
-                except (ValueError, TypeError):
-                    continue
+    if corpus.has_subcategory('primary_type'):
+        design_by_year = get_facet_counts_by_year(corpus, matching_docs, 'study_design')
     
     if design_by_year:
         # Get the top 5 study designs
@@ -864,16 +775,17 @@ def display_study_design_chart(df, matching_docs):
     else:
         st.info("Study design data not available for the filtered documents")
 
-def display_country_map(df, matching_docs):
+def display_country_map(corpus, matching_docs):
     """
     Create and display a choropleth map showing country data
     
     Parameters:
-    df (pandas.DataFrame): Main DataFrame containing research data
+    corpus (CorpusSnapshot): Shared corpus containing research data
     matching_docs (list): List of document column names that match current filters
     """
     # Extract country data from matching documents
-    country_data = get_countries_by_study(df, matching_docs)
+    country_data = cached_aggregate(matching_docs, "country_counts",
+                                    lambda: get_countries_by_study(corpus, matching_docs))
     
     if country_data:
         # Create and display the map (full width)
@@ -893,7 +805,7 @@ def display_country_map(df, matching_docs):
                 # Calculate percentile rank
                 table_data.append({
                     "Sr. No.": i,
-                    "Country": country,
+                    "Country": country_name(country),
                     "Studies": count
                 })
             
@@ -926,13 +838,13 @@ def display_yearly_chart(pub_df):
     fig.update_layout(height=500)
     st.plotly_chart(fig, use_container_width=True)
 
-def display_publication_distribution(df, matching_docs):
+def display_publication_distribution(corpus, matching_docs):
     """
     Main function to display the publication distribution visualizations
     based on the selected chart type.
     
     Parameters:
-    df (pandas.DataFrame): Main DataFrame containing research data
+    corpus (CorpusSnapshot): Shared corpus containing research data
     matching_docs (list): List of document column names that match current filters
     """
     st.subheader("Publication Distribution")
@@ -945,35 +857,36 @@ def display_publication_distribution(df, matching_docs):
     )
     
     # Get publications by year data
-    pub_df = get_publications_by_year(df, matching_docs)
+    pub_df = cached_aggregate(matching_docs, "year_counts",
+                              lambda: get_publications_by_year(corpus, matching_docs))
     
     if not pub_df.empty:
         if chart_type == "Overall":
-            display_pyecharts_sunburst(df, matching_docs)
+            display_pyecharts_sunburst(corpus, matching_docs)
             
         elif chart_type == "Yearly":
             display_yearly_chart(pub_df)
         
         elif chart_type == "Publication Type":
-            display_publication_type_chart(df, matching_docs, pub_df)
+            display_publication_type_chart(corpus, matching_docs, pub_df)
         
         elif chart_type == "Funding Source":
-            display_funding_chart(df, matching_docs)
+            display_funding_chart(corpus, matching_docs)
         
         elif chart_type == "Study Design":
-            display_study_design_chart(df, matching_docs)
+            display_study_design_chart(corpus, matching_docs)
         
     else:
         st.warning("No documents match the selected filters. Please adjust your filter criteria.")
         
         
         
-def render_harmful_ingredients_visualization(df, matching_docs):
+def render_harmful_ingredients_visualization(corpus, matching_docs):
     """
     Main function to display harmful ingredients visualization in Streamlit.
     
     Args:
-        df: The main dataframe with all the data
+        corpus: The shared CorpusSnapshot with all the data
         matching_docs: List of document columns that match the current filters
     """
     # Create a container for the visualization
@@ -988,7 +901,8 @@ def render_harmful_ingredients_visualization(df, matching_docs):
             st.session_state.selected_ingredient = None
             
         # Extract ingredient data from the dataframe
-        ingredients_data = extract_ingredients_data(df, matching_docs)
+        ingredients_data = cached_aggregate(matching_docs, "ingredient_tallies",
+                                            lambda: extract_ingredients_data(corpus, matching_docs))
         
         if not ingredients_data:
             st.warning("No harmful ingredients data found in the selected documents.")
@@ -1021,71 +935,58 @@ def render_harmful_ingredients_visualization(df, matching_docs):
         )
         
         # Display health impacts below the dropdown
-        display_health_impacts(df, matching_docs, st.session_state.selected_ingredient)
+        display_health_impacts(corpus, matching_docs, st.session_state.selected_ingredient)
 
 def update_selected_ingredient():
     """Callback function for the selectbox to update the selected ingredient"""
     st.session_state.selected_ingredient = st.session_state.ingredient_selector
 
-def extract_ingredients_data(df, matching_docs):
+def extract_ingredients_data(corpus, matching_docs):
     """
     Extract harmful ingredients data from the dataframe with evidence strength breakdown.
     """
-    # Find relevant rows
-    ingredients_name_row = df[df['Category'] == 'harmful_ingredients'].loc[df['SubCategory'] == 'name']
-    evidence_strength_row = df[df['Category'] == 'harmful_ingredients'].loc[df['SubCategory'] == 'evidence_strength']
+    # Ingredients of the matching papers, each paired with the evidence
+    # strength at the same list position (pre-exploded at load time)
+    items = corpus.aligned_items('harmful_ingredients', ('name', 'evidence_strength'), matching_docs)
     
-    if ingredients_name_row.empty:
+    if items.empty:
         return []
     
-    # Function to parse ingredients list
-    def parse_numbered_list(text):
-        if not isinstance(text, str):
-            return []
-        
-        # Split by numbered items pattern (e.g., "1) Item, 2) Item")
-        parts = re.split(r'\d+\)\s+', text)
-        
-        # First part is usually empty because of the split pattern
-        return [part.strip().rstrip(',') for part in parts[1:] if part.strip()]
+    strengths = items['evidence_strength'].fillna('Unknown')
+    counts = strengths.groupby([items['name'], strengths], sort=False).size()
     
-    # Create a mapping of ingredients to their evidence strength by paper
+    # Create a mapping of ingredients to their evidence strength counts,
+    # in order of first appearance
     ingredient_data = {}
+    for ingredient in items['name'].drop_duplicates():
+        ingredient_data[ingredient] = {
+            'name': ingredient,
+            'total': 0,
+            'Strong': 0,
+            'Moderate': 0,
+            'Weak': 0,
+            'Unknown': 0
+        }
     
-    # For each paper column that matches our filters
-    for paper in matching_docs:
-        if paper not in ingredients_name_row.columns:
-            continue
-            
-        ingredients_text = ingredients_name_row[paper].iloc[0] if not ingredients_name_row.empty else None
-        strengths_text = evidence_strength_row[paper].iloc[0] if not evidence_strength_row.empty else None
-        
-        if ingredients_text and pd.notna(ingredients_text):
-            ingredients = parse_numbered_list(ingredients_text)
-            strengths = parse_numbered_list(strengths_text) if strengths_text and pd.notna(strengths_text) else []
-            
-            # Match ingredients with their strengths (assuming they're in the same order)
-            for i, ingredient in enumerate(ingredients):
-                strength = strengths[i] if i < len(strengths) else 'Unknown'
-                
-                if ingredient not in ingredient_data:
-                    ingredient_data[ingredient] = {
-                        'name': ingredient,
-                        'total': 0,
-                        'Strong': 0,
-                        'Moderate': 0,
-                        'Weak': 0,
-                        'Unknown': 0
-                    }
-                
-                ingredient_data[ingredient]['total'] += 1
-                ingredient_data[ingredient][strength] += 1
+    for (ingredient, strength), count in counts.items():
+        ingredient_data[ingredient]['total'] += int(count)
+        ingredient_data[ingredient][strength] = ingredient_data[ingredient].get(strength, 0) + int(count)
     
     # Convert to list and sort by total frequency
     sorted_data = sorted(ingredient_data.values(), key=lambda x: x['total'], reverse=True)
     
     return sorted_data
 
+
+# Chart aggregates shared through the filter cache (see cached_aggregate): name -> builder(corpus, matching_docs).
+# Filter presets materialize these ahead of time.
+CHART_AGGREGATES = {
+    "sunburst": generate_pyecharts_sunburst_data,
+    "country_counts": get_countries_by_study,
+    "year_counts": get_publications_by_year,
+    "ingredient_tallies": extract_ingredients_data,
+}
+
 def create_ingredients_chart(ingredients_data):
     """
     Create a horizontal bar chart with stacked bars for evidence strength using pastel colors.
@@ -1184,54 +1085,24 @@ def create_ingredients_chart(ingredients_data):
     
     return fig
 
-def get_health_impacts(df, matching_docs, ingredient_name):
+def get_health_impacts(corpus, matching_docs, ingredient_name):
     """
     Get health impacts for a specific ingredient.
     """
-    # Find health impact row
-    health_impact_row = df[df['Category'] == 'harmful_ingredients'].loc[df['SubCategory'] == 'health_impact']
-    ingredients_name_row = df[df['Category'] == 'harmful_ingredients'].loc[df['SubCategory'] == 'name']
-    
-    if health_impact_row.empty or ingredients_name_row.empty:
-        return []
-    
-    # Function to parse ingredients and health impacts
-    def parse_numbered_list(text):
-        if not isinstance(text, str):
-            return []
-        
-        parts = re.split(r'\d+\)\s+', text)
-        return [part.strip().rstrip(',') for part in parts[1:] if part.strip()]
+    # Ingredients paired with the health impact at the same list position
+    items = corpus.aligned_items('harmful_ingredients', ('name', 'health_impact'), matching_docs)
     
     # Get all health impacts for the specified ingredient
-    impacts = []
+    impacts = items.loc[items['name'] == ingredient_name, 'health_impact'].dropna()
     
-    for paper in matching_docs:
-        if paper not in ingredients_name_row.columns:
-            continue
-            
-        ingredients_text = ingredients_name_row[paper].iloc[0] if not ingredients_name_row.empty else None
-        impacts_text = health_impact_row[paper].iloc[0] if not health_impact_row.empty else None
-        
-        if ingredients_text and pd.notna(ingredients_text) and impacts_text and pd.notna(impacts_text):
-            ingredients = parse_numbered_list(ingredients_text)
-            health_impacts = parse_numbered_list(impacts_text)
-            
-            # Find the index of the ingredient
-            for i, ingredient in enumerate(ingredients):
-                if ingredient == ingredient_name and i < len(health_impacts):
-                    impact = health_impacts[i]
-                    if impact and impact not in impacts:
-                        impacts.append(impact)
-    
-    return impacts
+    return [impact for impact in impacts.drop_duplicates() if impact]
 
-def display_health_impacts(df, matching_docs, ingredient_name):
+def display_health_impacts(corpus, matching_docs, ingredient_name):
     """
     Display health impacts for the selected ingredient using a minimal approach with bullet points.
     """
     # Get health impacts for the selected ingredient
-    health_impacts = get_health_impacts(df, matching_docs, ingredient_name)
+    health_impacts = get_health_impacts(corpus, matching_docs, ingredient_name)
     
     # Display header
     st.subheader(f"Health Impacts: {ingredient_name}")
@@ -1244,7 +1115,7 @@ def display_health_impacts(df, matching_docs, ingredient_name):
         st.write("No specific health impact data available for this ingredient.")    
         
     
-def render_perceived_benefits_visualization(df, matching_docs):
+def render_perceived_benefits_visualization(corpus, matching_docs):
     st.subheader("Perceived Benefits Visualization")
     
     # Extract perceived health improvements data
@@ -1258,8 +1129,7 @@ def render_perceived_benefits_visualization(df, matching_docs):
     benefit_data = {}
     for benefit in benefits_categories:
         # Find rows with this benefit's overall percentage
-        rows = df[(df['Category'] == 'perceived_health_improvements') & 
-                  (df['SubCategory'] == f"{benefit}.overall_percentage")]
+        rows = corpus.rows(category='perceived_health_improvements', subcategory=f"{benefit}.overall_percentage")
         
         values = []
         for doc_col in matching_docs:
@@ -1309,8 +1179,7 @@ def render_perceived_benefits_visualization(df, matching_docs):
     st.subheader("Smoking Cessation Success Rates")
     
     # Extract smoking cessation success rates
-    cessation_rows = df[(df['Category'] == 'smoking_cessation') & 
-                        (df['SubCategory'] == 'success_rates')]
+    cessation_rows = corpus.rows(category='smoking_cessation', subcategory='success_rates')
     
     cessation_data = {}
     for doc_col in matching_docs:
@@ -1340,37 +1209,12 @@ def render_perceived_benefits_visualization(df, matching_docs):
         
         
 
-def render_research_trends_visualization(df, matching_docs):
+def render_research_trends_visualization(corpus, matching_docs):
     # Extract study design types over time
     st.subheader("Evolution of Research Methodologies")
     
-    # Get primary study types
-    study_type_rows = df[df['SubCategory'] == 'primary_type']
-    
-    # Get publication years for matching documents
-    year_rows = df[df['Category'] == 'publication_year']
-    
-    # Create a dictionary to store study types by year
-    study_types_by_year = {}
-    
-    for doc_col in matching_docs:
-        # Get year for this document
-        year_value = year_rows[doc_col].iloc[0] if not year_rows.empty else None
-        study_type = study_type_rows[doc_col].iloc[0] if not study_type_rows.empty else None
-        
-        if year_value and study_type and not pd.isna(year_value) and not pd.isna(study_type):
-            try:
-                year = int(float(year_value))
-                
-                if year not in study_types_by_year:
-                    study_types_by_year[year] = {}
-                
-                if study_type not in study_types_by_year[year]:
-                    study_types_by_year[year][study_type] = 0
-                    
-                study_types_by_year[year][study_type] += 1
-            except:
-                continue
+    # Count primary study types by publication year for matching documents
+    study_types_by_year = get_facet_counts_by_year(corpus, matching_docs, 'study_design')
     
     if study_types_by_year:
         # Prepare data for stacked bar chart
@@ -1412,12 +1256,11 @@ def render_research_trends_visualization(df, matching_docs):
         st.info("Not enough data to display study design evolution visualization")
         
         
-def render_contradictions_visualization(df, matching_docs):
+def render_contradictions_visualization(corpus, matching_docs):
     st.subheader("Contradiction Analysis")
     
     # Extract data about contradictions
-    contradictions_rows = df[(df['Category'] == 'contradictions') & 
-                            (df['SubCategory'] == 'conflicts_with_literature')]
+    contradictions_rows = corpus.rows(category='contradictions', subcategory='conflicts_with_literature')
     
     # Count documents with contradictions
     contradictions_count = 0
@@ -1468,11 +1311,9 @@ def render_contradictions_visualization(df, matching_docs):
         # Find rows with evidence strength
         if category.startswith('comparative_benefits'):
             category_main, category_sub = category.split('.')
-            rows = df[(df['Category'] == category_main) & 
-                      (df['SubCategory'] == f"{category_sub}.{subcategory}")]
+            rows = corpus.rows(category=category_main, subcategory=f"{category_sub}.{subcategory}")
         else:
-            rows = df[(df['Category'] == category) & 
-                      (df['SubCategory'] == subcategory)]
+            rows = corpus.rows(category=category, subcategory=subcategory)
         
         values = []
         for doc_col in matching_docs:
@@ -1534,7 +1375,7 @@ def render_contradictions_visualization(df, matching_docs):
         
         
         
-def render_bias_visualization(df, matching_docs):
+def render_bias_visualization(corpus, matching_docs):
     st.subheader("Research Methodology Assessment")
     
     # Create radio buttons for switching between visualizations without extra space
@@ -1546,7 +1387,7 @@ def render_bias_visualization(df, matching_docs):
     )
     
     # Extract funding source information
-    funding_rows = df[df['SubCategory'] == 'type']
+    funding_rows = corpus.rows(subcategory='type')
     
     funding_types = {}
     for doc_col in matching_docs:
@@ -1566,7 +1407,7 @@ def render_bias_visualization(df, matching_docs):
     
     for bias_type in bias_categories:
         # Find rows with this bias type
-        rows = df[df['Category'] == bias_type]
+        rows = corpus.rows(category=bias_type)
         
         values = []
         for doc_col in matching_docs:
@@ -1597,7 +1438,7 @@ def render_bias_visualization(df, matching_docs):
             bias_data[bias_type.replace('_', ' ')] = bias_levels
     
     # Extract main conclusions for sentiment analysis
-    conclusions_rows = df[df['Category'] == 'main_conclusions']
+    conclusions_rows = corpus.rows(category='main_conclusions')
     
     # Analyze sentiment of conclusions by funding source
     conclusion_sentiment = {}
@@ -1710,7 +1551,7 @@ def render_bias_visualization(df, matching_docs):
         
 
 
-def render_publication_level_visualization(df, matching_docs):
+def render_publication_level_visualization(corpus, matching_docs):
     st.subheader("Research Distribution by Geography and Type")
     
     # Create radio buttons to toggle between visualizations without extra space
@@ -1723,11 +1564,11 @@ def render_publication_level_visualization(df, matching_docs):
     
     if visualization_type == "Geographic Distribution":
         # Use the provided function
-        display_country_map(df, matching_docs)
+        display_country_map(corpus, matching_docs)
     
     elif visualization_type == "Publication Types":
         # Extract publication types
-        publication_type_rows = df[df['Category'] == 'publication_type']
+        publication_type_rows = corpus.rows(category='publication_type')
         
         publication_types = {}
         for doc_col in matching_docs: